@@ -0,0 +1,165 @@
+# benchmarks/fixtures.py
+
+import gzip
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+LatLon = Tuple[float, float]
+
+# Overpass layers plus the OpenChargeMap stations, as fetched by analysis.fetch_layers
+OVERPASS_LAYERS = ("spaces", "pois", "power", "roads")
+LAYERS = OVERPASS_LAYERS + ("stations",)
+
+# Kochi, the example center of /find-locations
+DEFAULT_CENTER: LatLon = (9.9816, 76.2999)
+
+# How far (degrees) each extra copy of an element is shifted when a fixture is scaled up;
+# small enough that the copies stay inside the 5 km search circle
+SCALE_JITTER_DEG = 0.004
+
+
+class Fixture(NamedTuple):
+    """
+    The upstream answers for one search: Overpass elements per OSM layer and the
+    OpenChargeMap POI list for "stations", exactly as the services return them.
+    """
+    center: LatLon
+    layers: Dict[str, List[Dict]]
+    source: str
+
+
+def synthetic(center: LatLon = DEFAULT_CENTER, seed: int = 5, spaces: int = 400, pois: int = 1500,
+              power: int = 120, roads: int = 150, stations: int = 15) -> Fixture:
+    """
+    A deterministic stand-in for one city-center search, shaped like real Overpass output:
+    closed ways (parking lots and commercial landuse) with their nodes, road ways with
+    their nodes, POI and power nodes, and OCM stations.
+    """
+    rng = random.Random(seed)
+    lat0, lon0 = center
+    next_id = [1000]
+
+    def point(spread: float = 0.035) -> LatLon:
+        return lat0 + rng.uniform(-spread, spread), lon0 + rng.uniform(-spread, spread)
+
+    def node(lat: float, lon: float, tags: Optional[Dict] = None) -> Dict:
+        next_id[0] += 1
+        element = {"type": "node", "id": next_id[0], "lat": round(lat, 7), "lon": round(lon, 7)}
+        if tags:
+            element["tags"] = tags
+        return element
+
+    def way(nodes: List[Dict], tags: Dict, closed: bool) -> Dict:
+        next_id[0] += 1
+        refs = [n["id"] for n in nodes] + ([nodes[0]["id"]] if closed else [])
+        return {"type": "way", "id": next_id[0], "nodes": refs, "tags": tags}
+
+    layers: Dict[str, List[Dict]] = {layer: [] for layer in LAYERS}
+    for _ in range(spaces):
+        lat, lon = point()
+        width, height = rng.uniform(0.0001, 0.0008), rng.uniform(0.0001, 0.0006)
+        corners = [node(lat, lon), node(lat, lon + width), node(lat + height, lon + width), node(lat + height, lon)]
+        tags = rng.choice([{"amenity": "parking"}, {"landuse": "commercial"}, {"landuse": "industrial"}])
+        layers["spaces"].append(way(corners, tags, closed=True))
+        layers["spaces"].extend(corners)
+    for _ in range(roads):
+        lat, lon = point()
+        heading = rng.uniform(-1.0, 1.0)
+        nodes = [node(lat + k * 0.001, lon + k * 0.0013 * heading) for k in range(6)]
+        layers["roads"].append(way(nodes, {"highway": rng.choice(["primary", "secondary", "tertiary"])}, closed=False))
+        layers["roads"].extend(nodes)
+    for _ in range(pois):
+        layers["pois"].append(node(*point(), tags={"amenity": rng.choice(["restaurant", "cafe", "bank", "pharmacy"])}))
+    for _ in range(power):
+        layers["power"].append(node(*point(), tags={"power": rng.choice(["substation", "transformer"])}))
+    for i in range(stations):
+        lat, lon = point()
+        layers["stations"].append({"ID": 100_000 + i, "AddressInfo": {"Latitude": round(lat, 7), "Longitude": round(lon, 7)}})
+    return Fixture(center, layers, f"synthetic(seed={seed})")
+
+
+def _shift(element: Dict, dlat: float, dlon: float, id_offset: int) -> Dict:
+    # Shallow copies: tags are shared between copies, which is fine for serializing
+    element = dict(element)
+    if "AddressInfo" in element:
+        element["ID"] = element.get("ID", 0) + id_offset
+        address = element["AddressInfo"] = dict(element["AddressInfo"])
+        if address.get("Latitude") is not None:
+            address["Latitude"] += dlat
+            address["Longitude"] += dlon
+        return element
+    element["id"] += id_offset
+    if "lat" in element:
+        element["lat"] += dlat
+        element["lon"] += dlon
+    if "center" in element:
+        element["center"] = {"lat": element["center"]["lat"] + dlat, "lon": element["center"]["lon"] + dlon}
+    if "nodes" in element:
+        element["nodes"] = [ref + id_offset for ref in element["nodes"]]
+    return element
+
+
+def scaled(fixture: Fixture, factor: int, seed: int = 7) -> Fixture:
+    """
+    The fixture at `factor` times its element density: every element is repeated with
+    fresh ids and a small random shift, a way and its nodes moving together so the
+    geometry keeps its shape.
+    """
+    if factor <= 1:
+        return fixture
+    rng = random.Random(seed)
+    layers: Dict[str, List[Dict]] = {}
+    for layer, elements in fixture.layers.items():
+        ids = [e.get("ID", 0) if "AddressInfo" in e else e.get("id", 0) for e in elements]
+        stride = max(ids, default=0) + 1
+        # A node takes the shift of the first way that references it
+        owner = {}
+        for index, element in enumerate(elements):
+            for ref in element.get("nodes", ()):
+                owner.setdefault(ref, index)
+        out = list(elements)
+        for c in range(1, factor):
+            shifts = [(rng.uniform(-SCALE_JITTER_DEG, SCALE_JITTER_DEG), rng.uniform(-SCALE_JITTER_DEG, SCALE_JITTER_DEG)) for _ in elements]
+            for index, element in enumerate(elements):
+                if element.get("type") == "node" and element["id"] in owner:
+                    dlat, dlon = shifts[owner[element["id"]]]
+                else:
+                    dlat, dlon = shifts[index]
+                out.append(_shift(element, dlat, dlon, c * stride))
+        layers[layer] = out
+    return Fixture(fixture.center, layers, f"{fixture.source} x{factor}")
+
+
+def encode(fixture: Fixture) -> Dict[str, bytes]:
+    """The response body per layer, as the stand-in serves it."""
+    bodies = {}
+    for layer, elements in fixture.layers.items():
+        payload = elements if layer == "stations" else {"version": 0.6, "generator": "benchmark", "elements": elements}
+        bodies[layer] = json.dumps(payload, separators=(",", ":")).encode()
+    return bodies
+
+
+# --- On-disk fixtures: <dir>/fixture.json plus <layer>.json.gz per layer ---
+
+def save(fixture: Fixture, directory: Path) -> None:
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for layer, body in encode(fixture).items():
+        with gzip.open(directory / f"{layer}.json.gz", "wb") as f:
+            f.write(body)
+    meta = {"center": list(fixture.center), "source": fixture.source, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    (directory / "fixture.json").write_text(json.dumps(meta, indent=2))
+
+
+def load(directory: Path) -> Fixture:
+    directory = Path(directory)
+    meta = json.loads((directory / "fixture.json").read_text())
+    layers = {}
+    for layer in LAYERS:
+        with gzip.open(directory / f"{layer}.json.gz", "rb") as f:
+            payload = json.loads(f.read())
+        layers[layer] = payload if layer == "stations" else payload.get("elements", [])
+    return Fixture(tuple(meta["center"]), layers, meta.get("source", str(directory)))
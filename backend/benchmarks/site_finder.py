@@ -0,0 +1,357 @@
+# benchmarks/site_finder.py
+"""
+Benchmarks the site-finder pipeline against a local stand-in for Overpass and
+OpenChargeMap, so runs are repeatable and independent of the live services.
+
+    python -m benchmarks.site_finder run --out before.json          # 1x, 10x, 100x
+    python -m benchmarks.site_finder run --scales 1 10 --requests 50 --out after.json
+    python -m benchmarks.site_finder compare before.json after.json
+    python -m benchmarks.site_finder record --lat 9.9816 --lon 76.2999 --out benchmarks/fixtures/kochi
+
+Each scale runs in a fresh process so peak memory is its own. The results file records
+the commit, interpreter and fixture, and `compare` exits non-zero when a metric got
+worse by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import fixtures
+
+RESULTS_VERSION = 1
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Metrics `compare` checks, as paths into a scale's results; larger is worse for all of them
+COMPARED_METRICS = (
+    ("latency_ms", "p50"), ("latency_ms", "p90"), ("latency_ms", "p99"),
+    ("phases_ms", "fetch"), ("phases_ms", "geometry"), ("phases_ms", "scoring"),
+    ("memory_mb", "peak_rss"), ("memory_mb", "traced_peak"),
+)
+# Differences below this (ms or MB) are noise, whatever the ratio
+NOISE_FLOOR = 1.0
+# Timed requests a scale keeps even when it runs past its time budget
+MIN_SAMPLES = 3
+
+
+def _mb(n_bytes: float) -> float:
+    return round(n_bytes / (1024 * 1024), 2)
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return _mb(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError):
+        return None
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return _mb(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    samples = np.asarray(samples_ms)
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "p50": round(float(p50), 3), "p90": round(float(p90), 3), "p99": round(float(p99), 3),
+        "mean": round(float(samples.mean()), 3), "min": round(float(samples.min()), 3), "max": round(float(samples.max()), 3),
+        "samples": len(samples),
+    }
+
+
+def _git_revision() -> Dict:
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=30, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(status) if status is not None else None}
+
+
+# --- One scale, in its own process ---
+
+def _configure_settings():
+    """Settings for a run against the stand-in: no caches or local stores, no rate limit."""
+    os.environ.setdefault("OCM_API_KEY", "benchmark")
+    from ev_finder_api.app.config import settings
+
+    settings.TILE_CACHE_ENABLED = False
+    settings.RESULT_CACHE_ENABLED = False
+    settings.OSM_SOURCE = "overpass"
+    settings.STATION_SYNC_REGIONS = {}
+    # The limiter only protects the real Overpass; against the stand-in it would just add sleeps
+    settings.OVERPASS_RATE_PER_S = 1e6
+    settings.OVERPASS_BURST = 1_000_000
+    return settings
+
+
+async def _measure_scale(bodies_dir: Path, center, requests: int, warmup: int, phase_runs: int, top_n: int,
+                         latency_s: float, budget_s: float) -> Dict:
+    settings = _configure_settings()
+    from ev_finder_api.app import analysis, http_clients, scoring
+    from ev_finder_api.app.main import app
+    from .standin import StandInTransport
+
+    bodies = {layer: (bodies_dir / f"{layer}.json").read_bytes() for layer in fixtures.LAYERS}
+    transport = StandInTransport(bodies, latency_s=latency_s)
+    http_clients.use_transport(transport)
+    gc.collect()
+    baseline_rss = _rss_mb()
+
+    params = {"latitude": center[0], "longitude": center[1], "top_n": top_n}
+    latencies: List[float] = []
+    phases: Dict[str, List[float]] = {"fetch": [], "geometry": [], "scoring": []}
+    async with app.router.lifespan_context(app):
+        async with httpx_client(app) as client:
+            # Dense scales can take seconds per request; past the budget, stop once there are enough samples
+            deadline = time.perf_counter() + budget_s
+            for i in range(warmup + requests):
+                if time.perf_counter() > deadline and len(latencies) >= MIN_SAMPLES:
+                    break
+                started = time.perf_counter()
+                response = await client.get("/find-locations", params=params)
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != 200:
+                    raise RuntimeError(f"/find-locations answered {response.status_code}: {response.text[:300]}")
+                if i >= warmup:
+                    latencies.append(elapsed)
+
+            # The phases on their own, with the element counts that drive them
+            for run in range(phase_runs):
+                if run and time.perf_counter() > deadline:
+                    break
+                started = time.perf_counter()
+                layers = await analysis.fetch_layers([center], settings.OCM_API_KEY)
+                fetched = time.perf_counter()
+                job, polygons = analysis.build_scoring_job(center, layers, top_n)
+                built = time.perf_counter()
+                candidates, report = await scoring.score_candidates(job, settings.SCORING_WORKERS, settings.SCORING_CHUNK_SIZE)
+                scored = time.perf_counter()
+                phases["fetch"].append((fetched - started) * 1000)
+                phases["geometry"].append((built - fetched) * 1000)
+                phases["scoring"].append((scored - built) * 1000)
+            counts = {
+                "polygons": polygons,
+                "spaces": len(job.spaces),
+                "pois": len(job.poi_coords),
+                "power": len(job.power_coords),
+                "roads": len(job.road_lines),
+                "stations": len(job.station_coords),
+                "viable": report["viable"],
+            }
+            del layers, job, candidates
+
+            # Python-level allocation peak of one request; traced separately as tracing slows it down
+            gc.collect()
+            tracemalloc.start()
+            response = await client.get("/find-locations", params=params)
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {
+        "payload_mb": {layer: _mb(len(body)) for layer, body in bodies.items()},
+        "counts": counts,
+        "latency_ms": _percentiles(latencies),
+        "phases_ms": {name: round(float(np.median(samples)), 3) for name, samples in phases.items()},
+        "memory_mb": {"baseline_rss": baseline_rss, "peak_rss": _peak_rss_mb(), "traced_peak": _mb(traced_peak)},
+        "upstream_requests": dict(transport.requests),
+    }
+
+
+def httpx_client(app):
+    import httpx
+
+    # In-process ASGI calls: the latency is the app's, without a socket in between
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+
+
+def _run_scale_process(bodies_dir: Path, center, args) -> Dict:
+    command = [
+        sys.executable, "-m", "benchmarks.site_finder", "scale", str(bodies_dir),
+        "--lat", str(center[0]), "--lon", str(center[1]),
+        "--requests", str(args.requests), "--warmup", str(args.warmup), "--phase-runs", str(args.phase_runs),
+        "--top-n", str(args.top_n), "--upstream-latency-ms", str(args.upstream_latency_ms), "--budget-s", str(args.budget_s),
+    ]
+    done = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True)
+    if done.returncode != 0:
+        raise RuntimeError(f"benchmark process failed:\n{done.stderr[-2000:]}")
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def run(args) -> Dict:
+    base = fixtures.load(args.fixture) if args.fixture else fixtures.synthetic(seed=args.seed)
+    results = {
+        "benchmark": "site_finder",
+        "version": RESULTS_VERSION,
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "fixture": base.source, "center": list(base.center), "requests": args.requests, "warmup": args.warmup,
+            "phase_runs": args.phase_runs, "top_n": args.top_n, "upstream_latency_ms": args.upstream_latency_ms,
+            "budget_s": args.budget_s,
+        },
+        "scales": {},
+    }
+    for factor in args.scales:
+        fixture = fixtures.scaled(base, factor, seed=args.seed + factor)
+        elements = {layer: len(items) for layer, items in fixture.layers.items()}
+        with tempfile.TemporaryDirectory(prefix="site-finder-bench-") as tmp:
+            for layer, body in fixtures.encode(fixture).items():
+                (Path(tmp) / f"{layer}.json").write_bytes(body)
+            del fixture
+            result = _run_scale_process(Path(tmp), base.center, args)
+        results["scales"][str(factor)] = {"factor": factor, "elements": elements, **result}
+        latency, phases, memory = result["latency_ms"], result["phases_ms"], result["memory_mb"]
+        print(
+            f"-> {factor}x: p50 {latency['p50']:.1f} ms, p99 {latency['p99']:.1f} ms; "
+            f"geometry {phases['geometry']:.1f} ms, scoring {phases['scoring']:.1f} ms over {result['counts']['polygons']} polygons; "
+            f"peak RSS {memory['peak_rss']:.0f} MB",
+            file=sys.stderr,
+        )
+    return results
+
+
+# --- Comparing two results files ---
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[Dict]:
+    """Per scale and metric: both values and their ratio, flagged when new is worse by more than `threshold`."""
+    rows = []
+    for scale in sorted(set(base["scales"]) & set(new["scales"]), key=int):
+        old_scale, new_scale = base["scales"][scale], new["scales"][scale]
+        same_data = old_scale.get("elements") == new_scale.get("elements")
+        for section, metric in COMPARED_METRICS:
+            old_value = old_scale.get(section, {}).get(metric)
+            new_value = new_scale.get(section, {}).get(metric)
+            if old_value is None or new_value is None:
+                continue
+            ratio = new_value / old_value if old_value else None
+            regressed = ratio is not None and ratio > 1 + threshold and new_value - old_value > NOISE_FLOOR
+            rows.append({
+                "scale": int(scale), "metric": f"{section}.{metric}", "base": old_value, "new": new_value,
+                "ratio": round(ratio, 3) if ratio is not None else None, "regressed": regressed, "same_data": same_data,
+            })
+    return rows
+
+
+def _print_comparison(rows: List[Dict], base: Dict, new: Dict) -> None:
+    print(f"base {base['git'].get('commit') or '?'}  vs  new {new['git'].get('commit') or '?'}")
+    if base.get("config", {}).get("fixture") != new.get("config", {}).get("fixture"):
+        print(f"!! Different fixtures: {base['config']['fixture']} vs {new['config']['fixture']}")
+    for row in rows:
+        flag = "  REGRESSED" if row["regressed"] else ""
+        data = "" if row["same_data"] else "  (element counts differ)"
+        ratio = f"{row['ratio']:.3f}" if row["ratio"] is not None else "-"
+        print(f"{row['scale']:>4}x  {row['metric']:<22} {row['base']:>12.3f} {row['new']:>12.3f}  x{ratio}{flag}{data}")
+
+
+# --- Recording a fixture from the live services ---
+
+async def record(lat: float, lon: float, out: Path) -> None:
+    settings = _configure_settings()
+    settings.OVERPASS_RATE_PER_S, settings.OVERPASS_BURST = 1.0, 2
+    from ev_finder_api.app import analysis, http_clients
+    from .standin import RecordingTransport
+
+    transport = RecordingTransport()
+    http_clients.use_transport(transport)
+    try:
+        await analysis.fetch_layers([(lat, lon)], settings.OCM_API_KEY)
+    finally:
+        await http_clients.shutdown()
+        await transport.aclose()
+    missing = [layer for layer in fixtures.LAYERS if layer not in transport.bodies]
+    if missing:
+        raise SystemExit(f"!! No successful response recorded for: {', '.join(missing)}")
+    layers = {}
+    for layer, body in transport.bodies.items():
+        payload = json.loads(body)
+        layers[layer] = payload if layer == "stations" else payload.get("elements", [])
+    fixtures.save(fixtures.Fixture((lat, lon), layers, f"recorded({lat},{lon})"), out)
+    print(f"-> Recorded {out}: " + ", ".join(f"{layer}:{len(items)}" for layer, items in layers.items()))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /find-locations against a local Overpass/OpenChargeMap stand-in.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(p):
+        p.add_argument("--requests", type=int, default=30, help="Timed /find-locations requests per scale")
+        p.add_argument("--warmup", type=int, default=1, help="Untimed requests first")
+        p.add_argument("--phase-runs", type=int, default=5, help="Runs of the fetch/geometry/scoring phases on their own")
+        p.add_argument("--top-n", type=int, default=3)
+        p.add_argument("--upstream-latency-ms", type=float, default=0.0, help="Delay the stand-in adds to every answer")
+        p.add_argument("--budget-s", type=float, default=120.0, help=f"Seconds per scale after which runs stop (keeping at least {MIN_SAMPLES} requests)")
+
+    p = commands.add_parser("run", help="Run every scale and write the results")
+    p.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="Element density multipliers")
+    p.add_argument("--fixture", type=Path, help="Recorded fixture directory (default: the synthetic one)")
+    p.add_argument("--seed", type=int, default=5)
+    p.add_argument("--out", type=Path, help="Results file (default: stdout)")
+    add_run_options(p)
+
+    p = commands.add_parser("compare", help="Compare two results files")
+    p.add_argument("base", type=Path)
+    p.add_argument("new", type=Path)
+    p.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown or growth reported as a regression")
+    p.add_argument("--json", action="store_true", help="Print the comparison as JSON")
+
+    p = commands.add_parser("record", help="Record a fixture from the live services")
+    p.add_argument("--lat", type=float, required=True)
+    p.add_argument("--lon", type=float, required=True)
+    p.add_argument("--out", type=Path, required=True)
+
+    p = commands.add_parser("scale", help=argparse.SUPPRESS)  # one scale, in the current process
+    p.add_argument("bodies", type=Path)
+    p.add_argument("--lat", type=float, required=True)
+    p.add_argument("--lon", type=float, required=True)
+    add_run_options(p)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = json.dumps(run(args), indent=2)
+        if args.out:
+            args.out.write_text(results + "\n")
+            print(f"-> Wrote {args.out}", file=sys.stderr)
+        else:
+            print(results)
+    elif args.command == "compare":
+        base, new = json.loads(args.base.read_text()), json.loads(args.new.read_text())
+        rows = compare(base, new, args.threshold)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            _print_comparison(rows, base, new)
+        sys.exit(1 if any(row["regressed"] for row in rows) else 0)
+    elif args.command == "record":
+        asyncio.run(record(args.lat, args.lon, args.out))
+    else:
+        result = asyncio.run(_measure_scale(
+            args.bodies, (args.lat, args.lon), args.requests, args.warmup, args.phase_runs, args.top_n,
+            args.upstream_latency_ms / 1000, args.budget_s,
+        ))
+        print(json.dumps(result, separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/standin.py
+
+import asyncio
+import re
+from collections import Counter
+from typing import Dict, Optional
+
+import httpx
+
+from ev_finder_api.app.analysis import LAYER_QUERIES, ocm_api_url, overpass_url
+
+# Overpass request bodies are the layer templates with {area} filled in; match them back
+_LAYER_PATTERNS = {
+    layer: re.compile(re.escape(template).replace(re.escape("{area}"), r"[^)]*") + r"$")
+    for layer, template in LAYER_QUERIES.items()
+}
+
+# Bodies are streamed in slices of this size, roughly what a socket read hands over
+CHUNK_BYTES = 64 * 1024
+
+
+def layer_for(request: httpx.Request) -> Optional[str]:
+    """Which analysis layer an upstream request is fetching, or None if it is not one."""
+    url = str(request.url)
+    if url.startswith(ocm_api_url):
+        return "stations"
+    if url.startswith(overpass_url) and request.method == "POST":
+        query = httpx.QueryParams(request.content.decode()).get("data", "")
+        for layer, pattern in _LAYER_PATTERNS.items():
+            if pattern.match(query):
+                return layer
+    return None
+
+
+async def _chunks(body: bytes):
+    for start in range(0, len(body), CHUNK_BYTES):
+        yield body[start:start + CHUNK_BYTES]
+
+
+class StandInTransport(httpx.AsyncBaseTransport):
+    """
+    Answers Overpass and OpenChargeMap requests from prepared response bodies (layer ->
+    bytes), optionally after `latency_s` to model the network. Anything else is a 404,
+    so a request the benchmark did not expect shows up as a failure rather than leaking
+    to the real service.
+    """
+
+    def __init__(self, bodies: Dict[str, bytes], latency_s: float = 0.0):
+        self.bodies = bodies
+        self.latency_s = latency_s
+        self.requests: Counter = Counter()
+        self.bytes_served = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        layer = layer_for(request)
+        self.requests[layer or "unmatched"] += 1
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        body = self.bodies.get(layer) if layer else None
+        if body is None:
+            return httpx.Response(404, json={"error": f"no stand-in response for {request.method} {request.url}"})
+        self.bytes_served += len(body)
+        return httpx.Response(200, headers={"Content-Type": "application/json"}, content=_chunks(body))
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Sends requests to the real services and keeps the body of each layer's answer."""
+
+    def __init__(self):
+        self.inner = httpx.AsyncHTTPTransport()
+        self.bodies: Dict[str, bytes] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        layer = layer_for(request)
+        if layer is not None and response.status_code == 200:
+            self.bodies[layer] = body
+        # The body is already decoded, so the encoding headers no longer apply
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(response.status_code, headers=headers, content=body)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -1,48 +1,140 @@
-from collections import Counter
-from datetime import datetime, timedelta
-import os
-import random
-import uuid
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
-from dotenv import load_dotenv
-import json
-from io import BytesIO
-from fastapi.middleware.cors import CORSMiddleware
-import base64
-from fastapi.responses import FileResponse, JSONResponse
-import requests
-from typing import Optional, List
-from pydantic import BaseModel
-from fastapi import FastAPI, Query
-import pandas as pd
-import requests
-import os
-import random
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import importlib
 import json
-from dotenv import load_dotenv
-from openai import OpenAI
-import uvicorn
 import math
-from ev_finder_api.app.models import CandidateLocation, Location
-from ev_finder_api.app.analysis import analyze_locations
-from ev_finder_api.app.config import settings
-from fastapi import FastAPI, Query
-import pandas as pd
-import requests
 import os
 import random
-import json
-from dotenv import load_dotenv
-from openai import OpenAI
-import uvicorn
-import math
+import sys
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
 
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
+from ev_finder_api.app.models import PriceCurveRequest
+from ev_finder_api.app.config import settings
+from ev_finder_api.app import http_clients, logs, metrics, routes, scheduler, scoring, station_store
+from ev_finder_api.app.triage import MaintenanceModel, load_maintenance_model, local_verdict
+from ev_finder_api.app.verdict_cache import get_verdict_cache
+from ev_finder_api.app.carbon_cache import ZONE_PATTERN, CarbonIntensityCache, CarbonUpstreamError
+from ev_finder_api.app.carbon_history import (
+    LEVELS as CARBON_LEVELS, PRICES as CARBON_PRICES, UNKNOWN_PRICE,
+    cheapest_windows, classify_levels, get_carbon_history, level_prices,
+)
+# pandas and openai are the slowest imports here; they are loaded on first use (the
+# triage artifact, fleet scans and the OpenAI client) or warmed up after startup
 
 load_dotenv()
+logs.configure(settings.LOG_LEVEL, settings.LOG_FORMAT)
+log = logs.get_logger("boiler_plate")
+
+OCM_API_KEY = os.getenv("OPENCHARGEMAP_API_KEY")
+OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+
+client = None
+llm_slots: Optional[asyncio.Semaphore] = None
+maintenance_model: Optional[MaintenanceModel] = None
+_maintenance_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Async OpenAI client on the shared 'openai' connection pool."""
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+        # Retries are handled per call in complete_with_retry
+        client = AsyncOpenAI(api_key=OPENAI_KEY, http_client=http_clients.get_client("openai"), max_retries=0)
+    return client
+
+
+def get_maintenance_model() -> MaintenanceModel:
+    """
+    The triage model and few-shot examples, loaded once from the precomputed artifact
+    (rebuilt from MAINTENANCE_LOG_PATH when missing or out of date).
+    """
+    global maintenance_model
+    with _maintenance_lock:
+        if maintenance_model is None:
+            model = load_maintenance_model(settings.MAINTENANCE_LOG_PATH, settings.MAINTENANCE_ARTIFACT_PATH,
+                                           settings.MAINTENANCE_TRIAGE_MIN_CONFIDENCE)
+            origin = "artifact" if model.from_artifact else "log"
+            log.info("maintenance triage loaded", extra={"origin": origin, "sessions": model.sessions, "accuracy": round(model.triage.accuracy, 3)})
+            maintenance_model = model
+    return maintenance_model
+
+
+def require_maintenance_model() -> MaintenanceModel:
+    try:
+        return get_maintenance_model()
+    except (FileNotFoundError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=f"Maintenance model unavailable: {e}")
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process (Linux), in MB."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def warm_up():
+    """Loads what the first maintenance request would otherwise wait for."""
+    started = time.perf_counter()
+    try:
+        get_maintenance_model()
+    except (FileNotFoundError, ValueError) as e:
+        log.warning("maintenance endpoints disabled until the log or artifact is present", extra={"error": str(e)})
+    for module in ("pandas", "openai"):
+        importlib.import_module(module)
+    STARTUP["warm_up_s"] = round(time.perf_counter() - started, 3)
+    STARTUP["rss_mb_after_warm_up"] = rss_mb()
+
+
+def get_llm_slots() -> asyncio.Semaphore:
+    """Bounds the LLM calls in flight across every request this worker is serving."""
+    global llm_slots
+    if llm_slots is None:
+        llm_slots = asyncio.Semaphore(settings.MAINTENANCE_LLM_CONCURRENCY)
+    return llm_slots
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per upstream for the life of the worker
+    global client, llm_slots
+    started = time.perf_counter()
+    async with http_clients.lifespan(app), station_store.lifespan(app), carbon_cache.running():
+        backfill = asyncio.create_task(backfill_carbon_history(settings.CARBON_ZONES))
+        # Serve right away; the model and the OpenAI SDK load in a thread meanwhile
+        warm = asyncio.create_task(asyncio.to_thread(warm_up))
+        STARTUP["lifespan_s"] = round(time.perf_counter() - started, 3)
+        STARTUP["rss_mb_at_ready"] = rss_mb()
+        log.info("startup", extra={"import_s": STARTUP["import_s"], "lifespan_s": STARTUP["lifespan_s"], "rss_mb": STARTUP["rss_mb_at_ready"]})
+        yield
+        backfill.cancel()
+        warm.cancel()
+        await scheduler.shutdown()
+        client = None
+        llm_slots = None
+    scoring.shutdown_process_pool()
+
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+metrics.install(app, timing_header=settings.METRICS_TIMING_HEADER)
+app.include_router(routes.router)
 
 # Enable CORS
 app.add_middleware(
@@ -53,16 +145,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-OCM_API_KEY = os.getenv("OPENCHARGEMAP_API_KEY")
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-
-client = OpenAI(api_key=OPENAI_KEY)
-
-# === LOAD DATASET ON STARTUP ===
-df = pd.read_csv("smart_charging_log.csv")
-healthy_example = df[df["is_healthy"] == 1].iloc[0]
-faulty_example = df[df["is_healthy"] == 0].iloc[0]
-
 
 def format_log(row, include_label=True):
     text = (
@@ -96,23 +178,57 @@ def generate_fake_session():
         "is_short_duration": 1 if duration < 0.2 else 0
     }
 
+def _maintenance_fields(result):
+    return {
+        'needs_maintenance': bool(result['needs_maintenance']),
+        'reason': result.get('reason', 'No reason provided'),
+        'estimated_life_months': result.get('estimated_life_months', None)
+    }
+
+def parse_json_maintenance_response(response):
+    """The verdict in a single-station reply; raises ValueError or KeyError if there is none."""
+    response = response.strip()
+    start = response.find('{')
+    end = response.rfind('}') + 1
+    if start == -1 or end == 0:
+        raise ValueError('Malformed JSON')
+    return _maintenance_fields(json.loads(response[start:end]))
+
 def safe_parse_json_maintenance_response(response):
     try:
-        response = response.strip()
-        start = response.find('{')
-        end = response.rfind('}') + 1
-        if start != -1 and end != 0:
-            json_str = response[start:end]
-            result = json.loads(json_str)
-            return {
-                'needs_maintenance': bool(result['needs_maintenance']),
-                'reason': result.get('reason', 'No reason provided'),
-                'estimated_life_months': result.get('estimated_life_months', None)
-            }
-        else:
-            return {'needs_maintenance': True, 'reason': 'Malformed JSON', 'estimated_life_months': None}
+        return parse_json_maintenance_response(response)
     except Exception as e:
-        return {'needs_maintenance': True, 'reason': f'Parsing error: {str(e)}', 'estimated_life_months': None}
+        reason = 'Malformed JSON' if str(e) == 'Malformed JSON' else f'Parsing error: {str(e)}'
+        return {'needs_maintenance': True, 'reason': reason, 'estimated_life_months': None}
+
+def safe_parse_json_batch_response(response, count):
+    """
+    Splits a batched reply into one verdict per station index. Stations whose item is
+    missing, duplicated or malformed come back as None so the caller can ask again for
+    just those stations.
+    """
+    verdicts = [None] * count
+    try:
+        response = response.strip()
+        start = response.find('[')
+        end = response.rfind(']') + 1
+        items = json.loads(response[start:end]) if start != -1 and end != 0 else []
+    except ValueError:
+        return verdicts
+    if not isinstance(items, list):
+        return verdicts
+    seen = set()
+    for item in items:
+        try:
+            i = int(item['station'])
+            verdict = _maintenance_fields(item)
+        except (TypeError, KeyError, ValueError):
+            continue
+        if 0 <= i < count:
+            # Two answers for one station means the model lost track; trust neither
+            verdicts[i] = None if i in seen else verdict
+            seen.add(i)
+    return verdicts
 
 def generate_random_coordinates(center_lat, center_lon, radius_km):
     r = radius_km / 111  # ~111 km per degree
@@ -123,178 +239,552 @@ def generate_random_coordinates(center_lat, center_lon, radius_km):
     dy = w * math.sin(t)
     return center_lat + dy, center_lon + dx
 
-async def predict_for_station(lat, lon):
-    session = generate_fake_session()
-    test_prompt = format_log(pd.Series(session), include_label=False)
-    few_shot_prompt = (
-        "Example 1:\n" + format_log(healthy_example) + "\n\n" +
-        "Example 2:\n" + format_log(faulty_example) + "\n\n"
+def few_shot_prompt():
+    model = get_maintenance_model()
+    return (
+        "Example 1:\n" + format_log(model.healthy_example) + "\n\n" +
+        "Example 2:\n" + format_log(model.faulty_example) + "\n\n"
     )
-    full_prompt = (
-        few_shot_prompt +
+REASON_SPEC = '"Brief, varied reason (max 50 chars). Use different styles: "Low efficiency detected", "Connection issues", "Performance degradation", "Component wear", etc."'
+LIFE_SPEC = 'If needs_maintenance is true, provide your best estimate (as an integer) of how many months the station can continue to operate before critical failure, based on the provided data. If not, use null.'
+
+def station_description(session, lat, lon):
+    return format_log(session, include_label=False) + f"\nLocation: lat {lat}, lon {lon}"
+
+def single_station_prompt(session, lat, lon):
+    return (
+        few_shot_prompt() +
         "Now analyze this station:\n" +
-        test_prompt +
-        f"\nLocation: lat {lat}, lon {lon}\n\n" +
+        station_description(session, lat, lon) + "\n\n" +
         "👉 Question: Should this EV charger be flagged for maintenance?\n\n" +
         "IMPORTANT: Respond with valid JSON only in this format:\n" +
         "{\n" +
         '  "needs_maintenance": true/false,\n' +
-        '  "reason": "Brief, varied reason (max 50 chars). Use different styles: "Low efficiency detected", "Connection issues", "Performance degradation", "Component wear", etc.",\n' +
-        '  "estimated_life_months": If needs_maintenance is true, provide your best estimate (as an integer) of how many months the station can continue to operate before critical failure, based on the provided data. If not, use null.\n' +
+        f'  "reason": {REASON_SPEC},\n' +
+        f'  "estimated_life_months": {LIFE_SPEC}\n' +
         "}"
     )
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": full_prompt}],
-        temperature=0.7
+
+def batch_station_prompt(stations):
+    listing = "\n\n".join(
+        f"Station {i}:\n" + station_description(session, lat, lon)
+        for i, (session, lat, lon) in enumerate(stations)
+    )
+    return (
+        few_shot_prompt() +
+        f"Now analyze each of these {len(stations)} stations independently:\n\n" +
+        listing + "\n\n" +
+        "👉 Question: Should each EV charger be flagged for maintenance?\n\n" +
+        f"IMPORTANT: Respond with a valid JSON array only, with exactly one object per station ({len(stations)} in total), in this format:\n" +
+        "[\n" +
+        "  {\n" +
+        '    "station": the station number as an integer,\n' +
+        '    "needs_maintenance": true/false,\n' +
+        f'    "reason": {REASON_SPEC},\n' +
+        f'    "estimated_life_months": {LIFE_SPEC}\n' +
+        "  }\n" +
+        "]"
     )
-    raw_answer = response.choices[0].message.content
-    maintenance = safe_parse_json_maintenance_response(raw_answer)
+
+class LLMUsage:
+    """Token and call counts for the LLM calls behind one request."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.bucket_followers = 0
+        self.local = None
+
+    def add(self, response):
+        self.calls += 1
+        if response.usage is not None:
+            self.prompt_tokens += response.usage.prompt_tokens
+            self.completion_tokens += response.usage.completion_tokens
+
+    def report(self, stations, batch_size, elapsed_s):
+        total = self.prompt_tokens + self.completion_tokens
+        return {
+            "stations": stations,
+            "local": self.local,
+            "batch_size": batch_size,
+            "llm_calls": self.calls,
+            "single_station_fallbacks": self.fallbacks,
+            "cache_hits": self.cache_hits,
+            "bucket_followers": self.bucket_followers,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_per_station": round(total / stations, 1) if stations else 0.0,
+            "wall_time_s": round(elapsed_s, 3),
+        }
+
+def result_for(session, lat, lon, maintenance, source="llm", cached=False):
     return {
         "lat": lat,
         "lon": lon,
         "El_kWh": session['El_kWh'],
         "Duration_hours": session['Duration_hours'],
-        **maintenance
+        **_maintenance_fields(maintenance),
+        "source": source,
+        "cached": cached
     }
 
+async def cached_verdicts(sessions):
+    """The cached verdict for each session's feature bucket, or None."""
+    cache = get_verdict_cache()
+    if cache is None or not sessions:
+        return [None] * len(sessions)
+    keys = [cache.key(session) for session in sessions]
+    # The SQLite tier blocks, so it runs in a thread; the in-memory tier answers inline
+    found = await asyncio.to_thread(cache.get_many, keys) if cache.path else cache.get_many(keys)
+    hits = sum(1 for key in keys if key in found)
+    metrics.count_cache("verdicts", hits=hits, misses=len(keys) - hits)
+    return [found.get(key) for key in keys]
+
+async def remember_verdicts(pairs):
+    """Caches (session, verdict) pairs that came back from the LLM cleanly."""
+    cache = get_verdict_cache()
+    if cache is None or not pairs:
+        return
+    entries = {cache.key(session): verdict for session, verdict in pairs}
+    if cache.path:
+        await asyncio.to_thread(cache.put_many, entries)
+    else:
+        cache.put_many(entries)
+
+async def station_verdict(session, lat, lon, usage=None):
+    """
+    The verdict for one station and whether the LLM answered it cleanly; a failed call
+    or an unparsable reply comes back as a fallback verdict with False.
+    """
+    try:
+        response = await complete_with_retry(single_station_prompt(session, lat, lon))
+        if usage is not None:
+            usage.add(response)
+        raw_answer = response.choices[0].message.content
+        try:
+            maintenance = parse_json_maintenance_response(raw_answer)
+        except Exception:
+            return safe_parse_json_maintenance_response(raw_answer), False
+        await remember_verdicts([(session, maintenance)])
+        return maintenance, True
+    except Exception as e:
+        return {'needs_maintenance': True, 'reason': f'LLM error: {str(e)[:80]}', 'estimated_life_months': None}, False
+
+async def predict_for_station(lat, lon, session=None, usage=None):
+    session = session or generate_fake_session()
+    maintenance, _ = await station_verdict(session, lat, lon, usage)
+    return result_for(session, lat, lon, maintenance)
+
+async def batch_verdicts(stations, usage):
+    """
+    One prompt for several (session, lat, lon) stations, sharing the few-shot prefix.
+    Stations the batched reply does not answer cleanly are retried on their own.
+    Returns (verdict, clean) per station in input order.
+    """
+    try:
+        response = await complete_with_retry(batch_station_prompt(stations))
+        usage.add(response)
+        verdicts = safe_parse_json_batch_response(response.choices[0].message.content, len(stations))
+    except Exception as e:
+        log.warning("batched LLM call failed; asking per station", extra={"error": repr(e), "stations": len(stations)})
+        verdicts = [None] * len(stations)
+
+    await remember_verdicts([(stations[i][0], verdict) for i, verdict in enumerate(verdicts) if verdict is not None])
+    missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    usage.fallbacks += len(missing)
+    singles = await asyncio.gather(*(station_verdict(*stations[i], usage=usage) for i in missing))
+    outcomes = [None if verdict is None else (verdict, True) for verdict in verdicts]
+    for i, outcome in zip(missing, singles):
+        outcomes[i] = outcome
+    return outcomes
+
+async def predict_for_batch(stations, usage):
+    """Results for several (session, lat, lon) stations, asked in one prompt; see batch_verdicts."""
+    outcomes = await batch_verdicts(stations, usage)
+    return [result_for(*station, verdict) for station, (verdict, _) in zip(stations, outcomes)]
+
+def retryable_llm_errors():
+    """Failures worth another attempt; anything else (bad key, bad request) fails the station at once."""
+    import openai
+    return (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+            openai.RateLimitError, openai.InternalServerError)
+
+async def complete_with_retry(prompt: str):
+    """
+    One chat completion under the worker-wide concurrency limit, with a per-call timeout
+    and jittered exponential backoff between attempts. The slot is released while backing
+    off so a rate-limited call does not hold up the others.
+    """
+    import openai
+
+    attempts = max(1, settings.MAINTENANCE_LLM_RETRIES)
+    for attempt in range(attempts):
+        try:
+            async with get_llm_slots():
+                started = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        get_openai_client().chat.completions.create(
+                            model="gpt-3.5-turbo",
+                            messages=[{"role": "user", "content": prompt}],
+                            temperature=0.7
+                        ),
+                        timeout=settings.MAINTENANCE_LLM_TIMEOUT_S,
+                    )
+                except BaseException as e:
+                    outcome = "rate_limited" if isinstance(e, openai.RateLimitError) else "timeout" if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)) else "error"
+                    metrics.LLM_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+                    if outcome == "rate_limited":
+                        metrics.UPSTREAM_RATE_LIMITED.inc(upstream="openai")
+                    raise
+            metrics.LLM_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+            if response.usage is not None:
+                metrics.LLM_TOKENS.inc(response.usage.prompt_tokens, kind="prompt")
+                metrics.LLM_TOKENS.inc(response.usage.completion_tokens, kind="completion")
+            return response
+        except retryable_llm_errors() as e:
+            if attempt == attempts - 1:
+                raise
+            wait_time = settings.MAINTENANCE_LLM_BACKOFF_S * (2 ** attempt) * random.uniform(0.5, 1.5)
+            metrics.UPSTREAM_RETRIES.inc(upstream="openai")
+            log.info("LLM call failed, retrying", extra={"error": type(e).__name__, "wait_s": round(wait_time, 1)})
+            await asyncio.sleep(wait_time)
+
+async def predict_nearby(count, radius_km, center_lat, center_lon, batch_size, usage):
+    """
+    Yields (index, result) for each station as its prediction completes. The local
+    classifier decides every station it is confident about straight away; the rest are
+    grouped into prompts of `batch_size` (1 sends one prompt per station) and all prompts
+    run concurrently. Stations whose feature bucket already has a verdict, cached or
+    from another station in this request, reuse it with `cached` set; a verdict the LLM
+    did not answer cleanly is never shared, and the followers are asked on their own.
+    Each result carries the classifier's `confidence` and its `source`.
+    """
+    stations = [(generate_fake_session(), *generate_random_coordinates(center_lat, center_lon, radius_km)) for _ in range(count)]
+    verdicts = get_maintenance_model().triage.classify([session for session, _, _ in stations])
+    usage.local = verdicts.report()
+    escalated = [i for i in range(count) if not verdicts.confident[i]]
+
+    def with_confidence(i, result):
+        return i, {**result, "confidence": round(float(verdicts.confidence[i]), 3)}
+
+    for i in range(count):
+        if verdicts.confident[i]:
+            session = stations[i][0]
+            yield with_confidence(i, result_for(*stations[i], local_verdict(session, bool(verdicts.needs_maintenance[i])), source="local"))
+
+    hits = await cached_verdicts([stations[i][0] for i in escalated])
+    usage.cache_hits = sum(1 for verdict in hits if verdict is not None)
+    for i, verdict in zip(escalated, hits):
+        if verdict is not None:
+            yield with_confidence(i, result_for(*stations[i], verdict, cached=True))
+
+    # One LLM answer per feature bucket; the other stations in the bucket follow it
+    cache = get_verdict_cache()
+    followers = {}
+    pending = []
+    for i, verdict in zip(escalated, hits):
+        if verdict is not None:
+            continue
+        key = cache.key(stations[i][0]) if cache is not None else i
+        if key in followers:
+            followers[key].append(i)
+        else:
+            followers[key] = []
+            pending.append((i, key))
+    followers_of = {i: followers[key] for i, key in pending}
+
+    async def run(batch):
+        chunk = [stations[i] for i in batch]
+        if len(chunk) == 1:
+            return batch, [await station_verdict(*chunk[0], usage=usage)]
+        return batch, await batch_verdicts(chunk, usage)
+
+    lead = [i for i, _ in pending]
+    tasks = {asyncio.create_task(run(lead[start:start + batch_size])) for start in range(0, len(lead), batch_size)}
+    try:
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                batch, outcomes = task.result()
+                for i, (verdict, clean) in zip(batch, outcomes):
+                    yield with_confidence(i, result_for(*stations[i], verdict))
+                    following = followers_of.pop(i, [])
+                    if clean:
+                        usage.bucket_followers += len(following)
+                        for j in following:
+                            yield with_confidence(j, result_for(*stations[j], verdict, cached=True))
+                    else:
+                        tasks |= {asyncio.create_task(run([j])) for j in following}
+    finally:
+        # The client went away mid-stream: stop paying for calls nobody will read
+        for task in tasks:
+            task.cancel()
+
 @app.get("/maintenance/nearby")
-async def maintenance_nearby(count: int = Query(15, ge=15, le=25), radius_km: float = 5.0,
-                             center_lat: float = 28.6139, center_lon: float = 77.2090):
-    results = []
-    for _ in range(count):
-        lat, lon = generate_random_coordinates(center_lat, center_lon, radius_km)
-        result = await predict_for_station(lat, lon)
-        results.append(result)
-    return {"stations_checked": count, "results": results}
+async def maintenance_nearby(request: Request, count: int = Query(15, ge=15, le=25), radius_km: float = 5.0,
+                             center_lat: float = 28.6139, center_lon: float = 77.2090,
+                             stream: bool = Query(False, description="Stream one NDJSON line per station as it completes"),
+                             batch_size: Optional[int] = Query(None, ge=1, le=25, description="Stations per LLM prompt; defaults to MAINTENANCE_BATCH_SIZE")):
+    """
+    Maintenance predictions for `count` stations around a center. A local classifier
+    settles the clear-cut stations and the verdict cache answers repeats; the rest are
+    packed several to a prompt and the prompts run concurrently, so the request takes
+    about as long as the slowest call. With `stream=true` (or `Accept: application/x-ndjson`)
+    each station is sent as soon as it is ready, tagged with its `index`, followed by a
+    final `{"usage": ...}` line; otherwise the full list is returned in order with `usage`.
+    """
+    await asyncio.to_thread(require_maintenance_model)
+    batch_size = batch_size or max(1, settings.MAINTENANCE_BATCH_SIZE)
+    usage = LLMUsage()
+    started = time.perf_counter()
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        async def lines():
+            async for i, result in predict_nearby(count, radius_km, center_lat, center_lon, batch_size, usage):
+                yield json.dumps({"index": i, **result}) + "\n"
+            yield json.dumps({"usage": usage.report(count, batch_size, time.perf_counter() - started)}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results = [None] * count
+    async for i, result in predict_nearby(count, radius_km, center_lat, center_lon, batch_size, usage):
+        results[i] = result
+    report = usage.report(count, batch_size, time.perf_counter() - started)
+    log.debug("maintenance/nearby finished", extra=report)
+    return {"stations_checked": count, "results": results, "usage": report}
+
+FLEET_UPLOAD_WRITE_BYTES = 1024 * 1024
+
+@app.post("/maintenance/fleet-scan")
+async def maintenance_fleet_scan(request: Request,
+                                 station_column: Optional[str] = Query(None, description="Log column naming the station; defaults to FLEET_STATION_COLUMN"),
+                                 top: int = Query(50, ge=1, le=1000)):
+    """
+    Ranks every station in a session log by how many of its sessions need maintenance,
+    using the local triage model. Send the CSV as the request body (any size; it is spooled
+    to disk and read in chunks), or an empty body to scan FLEET_LOG_PATH.
+    """
+    from ev_finder_api.app.fleet_scan import scan_log  # pulls in pandas
+
+    model = await asyncio.to_thread(require_maintenance_model)
+    station_column = station_column or settings.FLEET_STATION_COLUMN
+    with tempfile.TemporaryFile() as upload:
+        # Disk writes run in a thread, about a megabyte at a time, so the event loop never waits on the disk
+        pending, pending_bytes = [], 0
+        async for chunk in request.stream():
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= FLEET_UPLOAD_WRITE_BYTES:
+                await asyncio.to_thread(upload.writelines, pending)
+                pending, pending_bytes = [], 0
+        if pending:
+            await asyncio.to_thread(upload.writelines, pending)
+        source = settings.FLEET_LOG_PATH
+        if upload.tell():
+            upload.seek(0)
+            source = upload
+        elif not settings.FLEET_LOG_PATH.exists():
+            raise HTTPException(status_code=404, detail=f"No log uploaded and {settings.FLEET_LOG_PATH} does not exist")
+        try:
+            report = await asyncio.to_thread(scan_log, source, station_column, settings.FLEET_SCAN_CHUNK_ROWS, model.triage, top)
+        except ValueError as e:  # includes pandas' ParserError
+            raise HTTPException(status_code=422, detail=str(e))
+    log.info("fleet scan finished", extra={"rows": report["rows_scanned"], "stations": report["stations_seen"], "seconds": report["seconds"]})
+    return report
 
 # Electricity Maps API
 API_TOKEN = os.getenv("API_TOKEN")
-ZONE = "IN-SO"
-URL = f"https://api.electricitymap.org/v3/carbon-intensity/latest?zone={ZONE}"
+URL = "https://api.electricitymap.org/v3/carbon-intensity/latest"
+HISTORY_URL = "https://api.electricitymap.org/v3/carbon-intensity/history"
 headers = {
     "auth-token": API_TOKEN
 }
 
-# Classification logic
+async def fetch_carbon_intensity(zone):
+    """Latest reading for a zone from Electricity Maps; errors map to the status the endpoint returns."""
+    started = time.perf_counter()
+    try:
+        response = await http_clients.get_client("electricity_maps").get(URL, params={"zone": zone}, headers=headers, timeout=10)
+    except httpx.TimeoutException:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="electricity_maps", outcome="network_error")
+        raise CarbonUpstreamError(504, "API request timed out after 10 seconds")
+    except httpx.HTTPError as e:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="electricity_maps", outcome="network_error")
+        raise CarbonUpstreamError(502, f"API request failed: {e}")
+    outcome = "ok" if response.status_code == 200 else "rate_limited" if response.status_code == 429 else "http_error"
+    metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="electricity_maps", outcome=outcome)
+    if response.status_code == 429:
+        metrics.UPSTREAM_RATE_LIMITED.inc(upstream="electricity_maps")
+    log.debug("carbon intensity fetched", extra={"zone": zone, "status": response.status_code})
+    if response.status_code != 200:
+        raise CarbonUpstreamError(response.status_code, response.text)
+    data = response.json()
+    if data.get("carbonIntensity") is None:
+        raise CarbonUpstreamError(502, "Carbon intensity not found in API response")
+    await record_carbon_readings(zone, [data])
+    return data
+
+async def record_carbon_readings(zone, readings):
+    """Appends Electricity Maps readings ({"datetime", "carbonIntensity"}) to the zone's history."""
+    readings = [r for r in readings if r.get("carbonIntensity") is not None and r.get("datetime")]
+    if not readings:
+        return
+    times = [int(datetime.fromisoformat(r["datetime"].replace("Z", "+00:00")).timestamp()) for r in readings]
+    values = [r["carbonIntensity"] for r in readings]
+    try:
+        await asyncio.to_thread(get_carbon_history().append, zone, times, values)
+    except OSError as e:
+        log.warning("could not record carbon history", extra={"zone": zone, "error": str(e)})
+
+async def backfill_carbon_history(zones):
+    """Seeds the history with the last 24 hours Electricity Maps keeps, once per startup."""
+    for zone in zones:
+        try:
+            response = await http_clients.get_client("electricity_maps").get(HISTORY_URL, params={"zone": zone}, headers=headers, timeout=30)
+            response.raise_for_status()
+            await record_carbon_readings(zone, response.json().get("history", []))
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning("carbon history backfill failed", extra={"zone": zone, "error": str(e)})
+
+carbon_cache = CarbonIntensityCache(
+    fetch_carbon_intensity,
+    zones=settings.CARBON_ZONES,
+    max_age_s=settings.CARBON_MAX_AGE_S,
+    max_stale_s=settings.CARBON_MAX_STALE_S,
+    refresh_interval_s=settings.CARBON_REFRESH_INTERVAL_S,
+    max_requested_zones=settings.CARBON_MAX_REQUESTED_ZONES,
+)
+
+# Classification logic (thresholds shared with the bulk pricing in carbon_history)
 def classify_carbon_intensity(intensity: float) -> str:
-    if intensity <= 430.83:
-        return "Very Low"
-    elif intensity <= 471.44:
-        return "Low"
-    elif intensity <= 508.25:
-        return "Moderate"
-    elif intensity <= 558.47:
-        return "High"
-    else:
-        return "Very High"
+    return CARBON_LEVELS[int(classify_levels(intensity))]
 
 # Dynamic pricing based on renewable availability
+CARBON_PRICING = dict(zip(CARBON_LEVELS, CARBON_PRICES.tolist()))
+
 def get_dynamic_price(level: str) -> float:
-    pricing = {
-        "Very Low": 5.00,
-        "Low": 6.50,
-        "Moderate": 8.50,
-        "High": 11.00,
-        "Very High": 14.00
-    }
-    return pricing.get(level, 8.50)
+    return CARBON_PRICING.get(level, UNKNOWN_PRICE)
 
 # Root route
 @app.get("/")
 def root():
     return {"message": "⚡ FastAPI EV pricing service is running."}
 
+@app.get("/metrics/startup")
+def startup_metrics():
+    """Import and startup timings and memory, and which lazily loaded parts are in so far."""
+    return {
+        **STARTUP,
+        "rss_mb_now": rss_mb(),
+        "loaded": {
+            "maintenance_model": maintenance_model is not None,
+            "openai": "openai" in sys.modules,
+            "pandas": "pandas" in sys.modules,
+        },
+    }
+
+@app.get("/metrics/verdict-cache")
+def verdict_cache_metrics():
+    cache = get_verdict_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
 # Main endpoint for real-time carbon & price data
 @app.get("/carbon-intensity")
-def get_carbon_intensity():
+async def get_carbon_intensity(zone: Optional[str] = Query(None, description="Electricity Maps zone; defaults to CARBON_DEFAULT_ZONE")):
+    """
+    Latest carbon intensity, its class and the suggested price for a zone, served from the
+    background-refreshed cache. `age_s` and `stale` say how old the reading is; a stale
+    reading is being refreshed and `refresh_error` holds the last refresh failure, if any.
+    """
+    zone = (zone or settings.CARBON_DEFAULT_ZONE).upper()
+    if not ZONE_PATTERN.match(zone):
+        return JSONResponse(status_code=422, content={"error": f"Invalid zone '{zone}'"})
     try:
-        print("⚡ Sending API request...")
-        response = requests.get(URL, headers=headers, timeout=10)
-        print(f"✅ Status Code: {response.status_code}")
-        print(f"📦 Response Preview: {response.text[:200]}")
-
-        if response.status_code == 200:
-            data = response.json()
-            carbon_intensity = data.get("carbonIntensity")
-            timestamp = data.get("datetime")
-
-            if carbon_intensity is not None:
-                classification = classify_carbon_intensity(carbon_intensity)
-                price = get_dynamic_price(classification)
-
-                return {
-                    "zone": ZONE,
-                    "timestamp": timestamp,
-                    "carbon_intensity": carbon_intensity,
-                    "classification": classification,
-                    "suggested_price_per_kWh": price
-                }
-            else:
-                return JSONResponse(
-                    status_code=502,
-                    content={"error": "Carbon intensity not found in API response"}
-                )
-        else:
-            return JSONResponse(
-                status_code=response.status_code,
-                content={"error": response.text}
-            )
-
-    except requests.exceptions.Timeout:
-        return JSONResponse(
-            status_code=504,
-            content={"error": "API request timed out after 10 seconds"}
-        )
+        data, meta = await carbon_cache.get(zone)
+    except CarbonUpstreamError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        log.exception("carbon intensity lookup failed", extra={"zone": zone})
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+    carbon_intensity = data["carbonIntensity"]
+    classification = classify_carbon_intensity(carbon_intensity)
+    return {
+        "zone": zone,
+        "timestamp": data.get("datetime"),
+        "carbon_intensity": carbon_intensity,
+        "classification": classification,
+        "suggested_price_per_kWh": get_dynamic_price(classification),
+        "fetched_at": datetime.fromtimestamp(meta["fetched_at"], timezone.utc).isoformat(),
+        "age_s": meta["age_s"],
+        "stale": meta["stale"],
+        "refresh_error": meta["refresh_error"],
+    }
 
-@app.get("/find-locations", response_model=List[CandidateLocation])
-async def find_ev_locations(
-    latitude: float = Query(..., ge=-90, le=90, description="The latitude of the search center."),
-    longitude: float = Query(..., ge=-180, le=180, description="The longitude of the search center.")
-):
+@app.post("/carbon-intensity/prices")
+async def carbon_price_curve(request: PriceCurveRequest):
     """
-    Analyze a geographic area to find the top 3 optimal locations for new EV charging stations.
+    Carbon intensity, class and price at every step from `start` to `end`, taken from the
+    recorded history (the reading in effect at each step; null where there is none within
+    CARBON_HISTORY_MAX_GAP_S). With `energy_kwh`, also the cheapest non-overlapping
+    windows to deliver it at `charger_kw`. Everything is computed in a few array passes.
     """
-    if not settings.is_configured:
-        raise HTTPException(status_code=500, detail="Server is not configured with a valid OpenChargeMap API key.")
-    try:
-        print(f"Starting analysis for lat={latitude}, lon={longitude}")
-        all_candidates = await analyze_locations(latitude, longitude, settings.OCM_API_KEY)
-        print(f"Analysis completed successfully, found {len(all_candidates)} candidates")
-    except Exception as e:
-        import traceback
-        print(f"ERROR in /find-locations: {e}")
-        print("Full traceback:")
-        traceback.print_exc()
-        raise HTTPException(status_code=503, detail=f"An error occurred during analysis: {e}")
-    results = []
-    for i, candidate in enumerate(all_candidates[:3]):
-        tags = candidate['tags']
-        site_type_val = tags.get('landuse', tags.get('amenity', 'N/A'))
-        if 'landuse' in tags:
-            site_type = f"landuse={site_type_val}"
-        elif 'amenity' in tags:
-            site_type = f"amenity={site_type_val}"
-        else:
-            site_type = 'N/A'
-        formatted_candidate = CandidateLocation(
-            rank=i + 1,
-            site_type=site_type,
-            location=Location(lat=candidate['center'][0], lon=candidate['center'][1]),
-            area_m2=round(candidate['area'], 2),
-            score_nearby_pois=candidate['pois_nearby'],
-            market_gap_m=round(candidate['distance_from_existing_m'], 1) if candidate.get('distance_from_existing_m') else None,
-            access_to_road_m=round(candidate['distance_to_road_m'], 1) if candidate.get('distance_to_road_m') else None,
-            access_to_power_m=round(candidate['distance_to_power_m'], 1) if candidate.get('distance_to_power_m') else None,
-            google_maps_url=f"https://www.google.com/maps?q={candidate['center'][0]},{candidate['center'][1]}"
-        )
-        results.append(formatted_candidate)
-    return results
+    zone = (request.zone or settings.CARBON_DEFAULT_ZONE).upper()
+    if not ZONE_PATTERN.match(zone):
+        return JSONResponse(status_code=422, content={"error": f"Invalid zone '{zone}'"})
+    start, end = request.start, request.end
+    step_s = request.step_minutes * 60.0
+    points = int(np.ceil((end - start).total_seconds() / step_s))
+    if points > settings.CARBON_PRICE_MAX_POINTS:
+        return JSONResponse(status_code=422, content={"error": f"{points} steps requested; at most {settings.CARBON_PRICE_MAX_POINTS} are allowed."})
+
+    def compute():
+        started = time.perf_counter()
+        times = start.timestamp() + step_s * np.arange(points)
+        intensity = get_carbon_history().lookup(zone, times, settings.CARBON_HISTORY_MAX_GAP_S)
+        levels = classify_levels(intensity)
+        prices = level_prices(levels)
+        result = {
+            "zone": zone,
+            "start": start.isoformat(),
+            "step_s": step_s,
+            "points": points,
+            "known_points": int((levels >= 0).sum()),
+            "levels": list(CARBON_LEVELS),
+        }
+        if request.energy_kwh is not None:
+            windows = cheapest_windows(prices, step_s, request.energy_kwh, request.charger_kw, request.windows)
+            for window in windows:
+                first, n = window["start_step"], window["steps"]
+                window["start"] = datetime.fromtimestamp(times[first], timezone.utc).isoformat()
+                window["end"] = datetime.fromtimestamp(times[first] + n * step_s, timezone.utc).isoformat()
+                window["avg_price_per_kWh"] = round(window["cost"] / request.energy_kwh, 3)
+                window["avg_carbon_intensity"] = round(float(intensity[first:first + n].mean()), 1)
+            result["windows"] = windows
+        if request.include_series:
+            result["series"] = {
+                "timestamps": times.astype(np.int64).tolist(),
+                "carbon_intensity": np.where(np.isnan(intensity), None, np.round(intensity, 2)).tolist(),
+                "level": levels.tolist(),  # index into `levels`, -1 where unknown
+                "price_per_kWh": np.where(np.isnan(prices), None, prices).tolist(),
+            }
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    # Plain JSONResponse: FastAPI's encoder walks every element, which dominates at 100k points
+    return JSONResponse(content=await asyncio.to_thread(compute))
+
+@app.get("/carbon-intensity/zones")
+def carbon_intensity_zones():
+    """Cache state per zone: age, staleness and last refresh error."""
+    return carbon_cache.snapshot()
+
+
+# Measured once the module body has run; the lifespan and warm-up add their own entries
+STARTUP = {"import_s": round(time.perf_counter() - IMPORT_STARTED, 3), "rss_mb_after_import": rss_mb()}
 
 # ✅ Fixed __main__ block
 if __name__ == "__main__":
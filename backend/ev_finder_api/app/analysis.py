@@ -1,14 +1,29 @@
 # app/analysis.py (Updated with Async aiohttp)
 
 import asyncio
-import httpx # Use httpx for async requests
-import sys
-from typing import List, Dict
+import hashlib
+import math
 import time
+import httpx # Use httpx for async requests
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .config import settings
+from .elements import ElementStore, stream_ocm_stations
+from .geometry import distance_to_ring, points_in_ring, ring_areas, ring_centroids
+from .http_clients import get_client
+from .logs import get_logger
+from .osm_extract import OSM_LAYERS, ExtractStore
+from .scheduler import PRIORITY_BATCH, get_scheduler, priority
+from .scoring import ScoringJob, ScoringParams, merge_stage_reports, merge_top_k, score_candidates
+from .station_store import StationStore, get_station_store
+from .spatial import LatLon, LocalProjection
+from .tile_cache import Tile, circle_bounds, clip_to_circles, get_tile_cache, haversine_m, merge_tiles, split_by_tile, tiles_covering, union_bounds
 
-from geojson import Polygon, Feature, LineString
-from turfpy.measurement import area, centroid, point_to_line_distance
-from geopy.distance import geodesic
+log = get_logger("analysis")
 
 # Analysis Parameters
 SEARCH_RADIUS_M = 5000
@@ -19,140 +34,457 @@ MIN_POIS_NEARBY = 3
 POI_SEARCH_RADIUS_M = 250
 MIN_DISTANCE_FROM_EXISTING_STATION_M = 1000
 
+# Grid cell size for the station and power-asset indexes (the POI index uses POI_SEARCH_RADIUS_M)
+NEAREST_INDEX_CELL_M = 500
+
+# A polygon's grid may hold this many times BATCH_MAX_CENTERS points before the ones
+# whose circle misses the polygon are dropped; larger grids are refused unbuilt
+BATCH_GRID_OVERSHOOT = 4
+
+SCORING_PARAMS = ScoringParams(
+    max_distance_to_power_m=MAX_DISTANCE_TO_POWER_M,
+    max_distance_to_road_m=MAX_DISTANCE_TO_ROAD_M,
+    min_pois_nearby=MIN_POIS_NEARBY,
+    poi_search_radius_m=POI_SEARCH_RADIUS_M,
+    min_distance_from_existing_station_m=MIN_DISTANCE_FROM_EXISTING_STATION_M,
+    nearest_index_cell_m=NEAREST_INDEX_CELL_M,
+)
+
 overpass_url = "https://overpass-api.de/api/interpreter"
 ocm_api_url = "https://api.openchargemap.io/v3/poi/"
 
-# Rate limiting
-last_request_time = 0
-MIN_REQUEST_INTERVAL = 1.0  # 1 second between requests
-
-async def run_async_query(client: httpx.AsyncClient, query: str, name: str):
-    """Helper to run a single async Overpass query with rate limiting and retry."""
-    global last_request_time
-    
-    # Rate limiting
-    current_time = time.time()
-    time_since_last = current_time - last_request_time
-    if time_since_last < MIN_REQUEST_INTERVAL:
-        await asyncio.sleep(MIN_REQUEST_INTERVAL - time_since_last)
-    
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            print(f"  -> Starting query for: {name} (attempt {attempt + 1})")
-            last_request_time = time.time()
-            response = await client.post(overpass_url, data={"data": query}, timeout=120.0)
-            
+# Overpass query per layer; {area} is either an around: filter or a south,west,north,east bbox
+LAYER_QUERIES = {
+    "spaces": """[out:json][timeout:90];(way({area})["landuse"~"commercial|industrial"];way({area})["amenity"="parking"];);out body;>;out skel qt;""",
+    "pois": """[out:json][timeout:60];(node({area})["amenity"~"restaurant|cafe|fast_food|bar|pub|cinema|marketplace|hospital|clinic|pharmacy|bank|fuel|mall|supermarket"];node({area})["shop"~"supermarket|convenience|mall"];);out center;""",
+    "power": """[out:json][timeout:60];(node({area})["power"~"substation|transformer"];way({area})["power"~"substation"];);out center;""",
+    "roads": """[out:json][timeout:60];way({area})["highway"~"primary|secondary|tertiary|trunk"];out body;>;out skel qt;""",
+}
+LAYER_NAMES = {"spaces": "Spaces", "pois": "POIs", "power": "Power", "roads": "Roads", "stations": "Stations"}
+
+# OpenChargeMap result cap for a radius search, and per tile when filling the tile cache
+OCM_MAX_RESULTS = 200
+OCM_MAX_RESULTS_PER_TILE = 200
+
+# Tile cache key per layer: the layer plus a hash of what is asked upstream for it, so
+# tiles cached for an edited query are never served (they expire with the TTL)
+def _tile_cache_key(layer: str) -> str:
+    asked = LAYER_QUERIES.get(layer) or f"{ocm_api_url}?maxresults={OCM_MAX_RESULTS_PER_TILE}"
+    return f"{layer}:{hashlib.blake2b(asked.encode(), digest_size=6).hexdigest()}"
+
+
+TILE_CACHE_KEYS = {layer: _tile_cache_key(layer) for layer in LAYER_NAMES}
+
+async def run_async_query(query: str, name: str):
+    """
+    Runs a single Overpass query through the process-wide scheduler, which handles
+    rate limiting, retries and coalescing of identical in-flight queries.
+    Returns None if the query failed, so callers can tell a failure from an empty area.
+    """
+    return await get_scheduler().run(query, name)
+
+
+async def fetch_ocm_stations(params: Dict, api_key: str) -> Optional[ElementStore]:
+    """Runs one OpenChargeMap POI search, streamed into a point store. Returns None on a network error."""
+    started = time.perf_counter()
+    try:
+        ocm_params = {'output': 'json', **params, 'key': api_key}
+        async with get_client("ocm").stream("GET", ocm_api_url, params=ocm_params, timeout=30.0) as response:
             if response.status_code == 429:
-                wait_time = (attempt + 1) * 2  # Exponential backoff: 2s, 4s, 6s
-                print(f"  !! Rate limited for: {name}, waiting {wait_time}s...")
-                await asyncio.sleep(wait_time)
-                continue
-                
+                metrics.UPSTREAM_RATE_LIMITED.inc(upstream="ocm")
             response.raise_for_status()
-            print(f"  <- Finished query for: {name}")
-            return response.json().get("elements", [])
-            
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429 and attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 2
-                print(f"  !! Rate limited for: {name}, waiting {wait_time}s...")
-                await asyncio.sleep(wait_time)
-                continue
+            stations = await metrics.parse_stream(stream_ocm_stations, response.aiter_text())
+    except httpx.HTTPStatusError as e:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="ocm", outcome="rate_limited" if e.response.status_code == 429 else "http_error")
+        raise
+    except httpx.RequestError as e:
+        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="ocm", outcome="network_error")
+        log.warning("openchargemap request failed", extra={"error": repr(e)})
+        return None
+    metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="ocm", outcome="ok")
+    return stations
+
+
+async def fetch_ocm_tiles(tiles: List[Tile], zoom: int, api_key: str) -> Tuple[Optional[ElementStore], List[Tile]]:
+    """
+    Stations for a set of cache tiles, and the tiles whose answer may be cut off. One
+    bbox query covers them all; if it comes back with as many results as were allowed,
+    OCM truncated it, so each tile is asked for on its own instead. A tile that still
+    hits the cap is returned as truncated and must not be cached as complete.
+    """
+    limit = OCM_MAX_RESULTS_PER_TILE * len(tiles)
+    south, west, north, east = union_bounds(tiles, zoom)
+    elements = await fetch_ocm_stations({'boundingbox': f"({north},{west}),({south},{east})", 'maxresults': limit}, api_key)
+    if elements is None or len(elements) < limit:
+        return elements, []
+    if len(tiles) == 1:
+        return elements, list(tiles)
+    log.debug("openchargemap answer truncated, fetching per tile", extra={"tiles": len(tiles)})
+    parts = await asyncio.gather(*(fetch_ocm_tiles([tile], zoom, api_key) for tile in tiles))
+    if any(part is None for part, _ in parts):
+        return None, []
+    return merge_tiles(part for part, _ in parts), [t for _, truncated in parts for t in truncated]
+
+
+async def fetch_layer(layer: str, centers: List[LatLon], api_key: str) -> Tuple[ElementStore, bool]:
+    """
+    Fetches one layer ("spaces", "pois", "power", "roads" or "stations") for the union of
+    the search circles around `centers`, and whether every upstream call for it succeeded.
+
+    With the tile cache enabled, fresh tiles are served from disk and only the missing
+    ones are requested upstream, as a single bbox query over their union. Without it a
+    single center uses an around: query and several centers one bbox query over all circles.
+    """
+    cache = get_tile_cache()
+    if cache is None:
+        if len(centers) == 1:
+            center_lat, center_lon = centers[0]
+            if layer == "stations":
+                elements = await fetch_ocm_stations({'latitude': center_lat, 'longitude': center_lon, 'distance': SEARCH_RADIUS_M / 1000, 'distanceunit': 'km', 'maxresults': OCM_MAX_RESULTS}, api_key)
             else:
-                print(f"  !! FAILED query for: {name} - {e}")
-                return []
-        except httpx.RequestError as e:
-            print(f"  !! FAILED query for: {name} - {e}")
-            return []
-    
-    print(f"  !! FAILED query for: {name} after {max_retries} attempts")
-    return []
+                elements = await run_async_query(LAYER_QUERIES[layer].format(area=f"around:{SEARCH_RADIUS_M},{center_lat},{center_lon}"), LAYER_NAMES[layer])
+            return (elements, True) if elements is not None else (ElementStore.empty(), False)
+
+        bounds = [circle_bounds(lat, lon, SEARCH_RADIUS_M) for lat, lon in centers]
+        south, west = min(b[0] for b in bounds), min(b[1] for b in bounds)
+        north, east = max(b[2] for b in bounds), max(b[3] for b in bounds)
+        if layer == "stations":
+            elements = await fetch_ocm_stations({'boundingbox': f"({north},{west}),({south},{east})", 'maxresults': OCM_MAX_RESULTS * len(centers)}, api_key)
+        else:
+            elements = await run_async_query(LAYER_QUERIES[layer].format(area=f"{south},{west},{north},{east}"), LAYER_NAMES[layer])
+        return (clip_to_circles(elements, centers, SEARCH_RADIUS_M), True) if elements is not None else (ElementStore.empty(), False)
+
+    tiles = list(dict.fromkeys(t for lat, lon in centers for t in tiles_covering(lat, lon, SEARCH_RADIUS_M, cache.zoom)))
+    cached = await asyncio.to_thread(cache.get_many, TILE_CACHE_KEYS[layer], tiles)
+    missing = [t for t in tiles if t not in cached]
+    metrics.count_cache("tiles", hits=len(cached), misses=len(tiles) - len(cached))
+    log.debug("tile cache lookup", extra={"layer": layer, "cached": len(cached), "tiles": len(tiles)})
+
+    truncated: List[Tile] = []
+    if missing:
+        if layer == "stations":
+            fetched, truncated = await fetch_ocm_tiles(missing, cache.zoom, api_key)
+        else:
+            south, west, north, east = union_bounds(missing, cache.zoom)
+            fetched = await run_async_query(LAYER_QUERIES[layer].format(area=f"{south},{west},{north},{east}"), LAYER_NAMES[layer])
+        # Failed fetches are not cached; the request carries on with whatever tiles it has.
+        # Truncated tiles are used for this request only.
+        if fetched is not None:
+            fresh = split_by_tile(fetched, missing, cache.zoom)
+            await asyncio.to_thread(cache.put_many, TILE_CACHE_KEYS[layer], {t: store for t, store in fresh.items() if t not in truncated})
+            cached.update(fresh)
+
+    elements = merge_tiles(cached[t] for t in tiles if t in cached)
+    return clip_to_circles(elements, centers, SEARCH_RADIUS_M), len(cached) == len(tiles) and not truncated
+
+
+# --- Layer providers ---
+
+class LayerProvider(ABC):
+    """A source of analysis layers for a set of search circles."""
+    layers: Tuple[str, ...] = ()
+
+    @abstractmethod
+    async def fetch(self, layer: str, centers: List[LatLon], api_key: str) -> Tuple[ElementStore, bool]:
+        """The layer's elements, and False if part of it could not be fetched."""
+
+
+class UpstreamProvider(LayerProvider):
+    """The live Overpass and OpenChargeMap APIs, through the tile cache when it is enabled."""
+    layers = tuple(LAYER_NAMES)
+
+    async def fetch(self, layer: str, centers: List[LatLon], api_key: str) -> Tuple[ElementStore, bool]:
+        return await fetch_layer(layer, centers, api_key)
+
+
+class ExtractProvider(LayerProvider):
+    """The OSM layers from a local extract store (see osm_extract), without any HTTP."""
+    layers = OSM_LAYERS
+
+    def __init__(self, store: ExtractStore):
+        self.store = store
+
+    async def fetch(self, layer: str, centers: List[LatLon], api_key: str) -> Tuple[ElementStore, bool]:
+        return await asyncio.to_thread(self.store.query, layer, centers, SEARCH_RADIUS_M), True
+
+
+class StationStoreProvider(LayerProvider):
+    """
+    Stations from the locally synced OCM store (see station_store) when a synced region
+    covers every search circle; live OpenChargeMap otherwise.
+    """
+    layers = ("stations",)
+
+    def __init__(self, store: StationStore):
+        self.store = store
+
+    async def fetch(self, layer: str, centers: List[LatLon], api_key: str) -> Tuple[ElementStore, bool]:
+        bounds = [circle_bounds(lat, lon, SEARCH_RADIUS_M) for lat, lon in centers]
+        union = (min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds))
+        if await asyncio.to_thread(self.store.covers, union):
+            return await asyncio.to_thread(self.store.within, centers, SEARCH_RADIUS_M), True
+        return await UPSTREAM_PROVIDER.fetch(layer, centers, api_key)
+
+
+UPSTREAM_PROVIDER = UpstreamProvider()
+_extract_provider: Optional[ExtractProvider] = None
+_station_provider: Optional[StationStoreProvider] = None
+
 
+def get_extract_provider() -> Optional[ExtractProvider]:
+    """The local extract provider when OSM_SOURCE is "extract" and the store has been ingested."""
+    global _extract_provider
+    if settings.OSM_SOURCE != "extract":
+        return None
+    if _extract_provider is None:
+        store = ExtractStore(settings.OSM_EXTRACT_DIR)
+        if not store.exists:
+            log.warning("OSM_SOURCE=extract but nothing has been ingested; using Overpass", extra={"extract_dir": str(settings.OSM_EXTRACT_DIR)})
+            return None
+        _extract_provider = ExtractProvider(store)
+    return _extract_provider
 
-async def analyze_locations(center_lat: float, center_lon: float, api_key: str) -> List[Dict]:
+
+def get_station_provider() -> Optional[StationStoreProvider]:
+    """The station store provider when STATION_SYNC_REGIONS is configured."""
+    global _station_provider
+    store = get_station_store()
+    if store is None:
+        return None
+    if _station_provider is None or _station_provider.store is not store:
+        _station_provider = StationStoreProvider(store)
+    return _station_provider
+
+
+def provider_for(layer: str) -> LayerProvider:
+    if layer == "stations":
+        return get_station_provider() or UPSTREAM_PROVIDER
+    extract = get_extract_provider()
+    return extract if extract is not None and layer in extract.layers else UPSTREAM_PROVIDER
+
+
+async def fetch_layers(centers: List[LatLon], api_key: str, failed: Optional[List[str]] = None) -> Dict[str, ElementStore]:
+    """
+    Every layer for the given search circles, fetched concurrently; the scheduler keeps
+    Overpass within its rate limit. A layer that could not be (fully) fetched comes back
+    empty or partial, and if `failed` is passed its name is appended to it.
+    """
+    async def fetch(layer: str) -> Tuple[ElementStore, bool]:
+        with metrics.layer_fetch(layer):
+            return await provider_for(layer).fetch(layer, centers, api_key)
+
+    results = await asyncio.gather(*(fetch(layer) for layer in LAYER_NAMES))
+    layers = {name: store for name, (store, _) in zip(LAYER_NAMES, results)}
+    incomplete = [name for name, (_, complete) in zip(LAYER_NAMES, results) if not complete]
+    if incomplete:
+        log.warning("analysis continues without part of its layers", extra={"layers": incomplete})
+        if failed is not None:
+            failed.extend(incomplete)
+    log.debug("all layers fetched", extra={name: len(store) for name, store in layers.items()})
+    return layers
+
+
+def build_scoring_job(origin: LatLon, layers: Dict[str, ElementStore], top_k: Optional[int]) -> Tuple[ScoringJob, int]:
+    """
+    Turns the fetched layers into a scoring job, building geometry straight from the
+    element arrays. Also returns how many polygons were assembled before the area filter.
+    """
+    spaces_elements = layers["spaces"]
+
+    # Area and centroid for every polygon in one vectorized pass, then keep the big enough ones
+    space_ways, rings = spaces_elements.closed_rings(min_coords=3)
+    areas = ring_areas(rings)
+    centroid_lons, centroid_lats = ring_centroids(rings)
+    big_enough = np.flatnonzero(areas >= MIN_AREA_M2)
+    spaces = [((float(centroid_lats[i]), float(centroid_lons[i])), float(areas[i]), spaces_elements.way_tags[space_ways[i]]) for i in big_enough]
+
+    job = ScoringJob(
+        origin=origin,
+        params=SCORING_PARAMS,
+        station_coords=layers["stations"].point_coords(),
+        poi_coords=layers["pois"].point_coords(),
+        power_coords=layers["power"].point_coords(),
+        road_lines=layers["roads"].polylines(min_refs=2),
+        spaces=spaces,
+        top_k=top_k,
+    )
+    return job, len(space_ways)
+
+
+async def _score(job: ScoringJob, polygons: int) -> Tuple[List[Dict], Dict]:
+    """Scores off the event loop (thread, or process pool split into chunks) and completes the stage report."""
+    with metrics.stage("scoring"):
+        candidates, report = await score_candidates(job, settings.SCORING_WORKERS, settings.SCORING_CHUNK_SIZE)
+    report["polygons"] = polygons
+    report["dropped"]["area"] = polygons - len(job.spaces)
+    log.debug("scoring complete", extra={"viable": report["viable"], "polygons": report["polygons"], "dropped": report["dropped"]})
+    return candidates, report
+
+
+async def analyze_locations(center_lat: float, center_lon: float, api_key: str, top_k: Optional[int] = None,
+                            stage_report: Optional[Dict] = None) -> List[Dict]:
     """
     Performs data fetching and analysis using ASYNCHRONOUS network calls for performance.
+    Returns the viable candidates best first, only the first `top_k` if given.
+    If `stage_report` is passed it is filled with how many polygons each filter stage dropped,
+    and with "failed_layers" if some layer could not be fetched.
     """
-    print("--- Starting Async Analysis ---")
-
-    # --- 1. Define all queries ---
-    free_spaces_query = f"""[out:json][timeout:90];(way(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["landuse"~"commercial|industrial"];way(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["amenity"="parking"];);out body;>;out skel qt;"""
-    poi_query = f"""[out:json][timeout:60];(node(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["amenity"~"restaurant|cafe|fast_food|bar|pub|cinema|marketplace|hospital|clinic|pharmacy|bank|fuel|mall|supermarket"];node(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["shop"~"supermarket|convenience|mall"];);out center;"""
-    power_query = f"""[out:json][timeout:60];(node(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["power"~"substation|transformer"];way(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["power"~"substation"];);out center;"""
-    major_roads_query = f"""[out:json][timeout:60];way(around:{SEARCH_RADIUS_M},{center_lat},{center_lon})["highway"~"primary|secondary|tertiary|trunk"];out body;>;out skel qt;"""
-
-    # --- 2. Run all Overpass queries SEQUENTIALLY to avoid rate limiting ---
-    async with httpx.AsyncClient() as client:
-        # Run queries sequentially instead of in parallel to avoid rate limiting
-        print("-> Running queries sequentially to avoid rate limiting...")
-        spaces_elements = await run_async_query(client, free_spaces_query, "Spaces")
-        await asyncio.sleep(1)  # Wait between requests
-        
-        poi_elements = await run_async_query(client, poi_query, "POIs")
-        await asyncio.sleep(1)  # Wait between requests
-        
-        power_elements = await run_async_query(client, power_query, "Power")
-        await asyncio.sleep(1)  # Wait between requests
-        
-        road_elements = await run_async_query(client, major_roads_query, "Roads")
-
-    print(f"-> All Overpass queries complete. Spaces:{len(spaces_elements)}, POIs:{len(poi_elements)}, Power:{len(power_elements)}, Roads:{len(road_elements)}")
-    
-    # --- 3. Fetch OCM data (can also be run in parallel, but it's fast anyway) ---
-    print("-> Fetching existing stations from OpenChargeMap...")
-    try:
-        async with httpx.AsyncClient() as client:
-            ocm_params = {'output': 'json', 'latitude': center_lat, 'longitude': center_lon, 'distance': SEARCH_RADIUS_M / 1000, 'distanceunit': 'km', 'maxresults': 200, 'key': api_key}
-            response = await client.get(ocm_api_url, params=ocm_params, timeout=30.0)
-            response.raise_for_status()
-            existing_stations_data = response.json()
-    except httpx.RequestError:
-        existing_stations_data = []
-
-    # --- 4. Process and Analyze (this part is synchronous and fast) ---
-    print("-> Processing all data and finding candidates...")
-    
-    poi_coords = [(p['lat'], p['lon']) for p in poi_elements if 'lat' in p]
-    power_coords = [p for p in [(el.get('center', {}).get('lat', el.get('lat')), el.get('center', {}).get('lon', el.get('lon'))) for el in power_elements] if p[0] is not None]
-    
-    all_road_nodes = {el["id"]: (el["lon"], el["lat"]) for el in road_elements if el["type"] == "node"}
-    major_road_lines = [Feature(geometry=LineString([all_road_nodes.get(nid) for nid in el.get("nodes", []) if nid in all_road_nodes])) for el in road_elements if el["type"] == "way" and len(el.get("nodes", [])) >= 2]
-    
-    existing_stations_coords = [(s['AddressInfo']['Latitude'], s['AddressInfo']['Longitude']) for s in existing_stations_data if s.get('AddressInfo', {}).get('Latitude')]
-    
-    space_nodes = {el["id"]: (el["lon"], el["lat"]) for el in spaces_elements if el["type"] == "node"}
-    top_candidates = []
-    
-    for el in spaces_elements:
-        if el["type"] == "way" and "nodes" in el:
-            coords = [space_nodes.get(nid) for nid in el["nodes"] if nid in space_nodes]
-            if len(coords) < 3: continue
-            if coords[0] != coords[-1]: coords.append(coords[0])
-
-            feature = Feature(geometry=Polygon([coords]))
-            surface_area = area(feature)
-
-            if surface_area >= MIN_AREA_M2:
-                center_point_feature = centroid(feature)
-                center_lon_calc, center_lat_calc = center_point_feature['geometry']['coordinates']
-                space_center = (center_lat_calc, center_lon_calc)
-
-                min_dist_to_existing_station = min(geodesic(space_center, s).meters for s in existing_stations_coords) if existing_stations_coords else None
-
-                if min_dist_to_existing_station is None or min_dist_to_existing_station >= MIN_DISTANCE_FROM_EXISTING_STATION_M:
-                    pois_nearby_count = sum(1 for p in poi_coords if geodesic(space_center, p).meters <= POI_SEARCH_RADIUS_M)
-                    min_dist_to_power = min(geodesic(space_center, p).meters for p in power_coords) if power_coords else None
-                    min_dist_to_road = min(point_to_line_distance(center_point_feature, line, units='m') for line in major_road_lines) if major_road_lines else None
-                    
-                    if (pois_nearby_count >= MIN_POIS_NEARBY and
-                        (min_dist_to_power is None or min_dist_to_power <= MAX_DISTANCE_TO_POWER_M) and
-                        (min_dist_to_road is None or min_dist_to_road <= MAX_DISTANCE_TO_ROAD_M)):
-                        
-                        candidate = {"center": space_center, "area": surface_area, "pois_nearby": pois_nearby_count, "distance_to_power_m": min_dist_to_power, "distance_to_road_m": min_dist_to_road, "distance_from_existing_m": min_dist_to_existing_station, "tags": el.get("tags", {})}
-                        top_candidates.append(candidate)
-
-    print(f"   ...Processing complete! Found {len(top_candidates)} viable candidates before sorting.")
-    print("--- Analysis Finished ---")
-    top_candidates.sort(key=lambda x: (-x['pois_nearby'], -(x['distance_from_existing_m'] or -1), (x['distance_to_road_m'] or sys.maxsize), (x['distance_to_power_m'] or sys.maxsize)))
-    return top_candidates
\ No newline at end of file
+    log.debug("analysis started", extra={"lat": center_lat, "lon": center_lon})
+
+    # --- 1-3. Fetch every layer ---
+    failed: List[str] = []
+    layers = await fetch_layers([(center_lat, center_lon)], api_key, failed)
+
+    # --- 4. Build geometry and the scoring job ---
+    with metrics.stage("geometry"):
+        job, polygons = build_scoring_job((center_lat, center_lon), layers, top_k)
+
+    # --- 5. Score ---
+    top_candidates, report = await _score(job, polygons)
+    if failed:
+        report["failed_layers"] = failed
+    if stage_report is not None:
+        stage_report.update(report)
+
+    log.debug("analysis finished", extra={"candidates": len(top_candidates)})
+    return top_candidates
+
+
+# --- Result cache support (see result_cache) ---
+
+def parameters_fingerprint() -> str:
+    """Short hash of everything besides the center that decides an analysis' result."""
+    params = (SEARCH_RADIUS_M, MIN_AREA_M2, tuple(SCORING_PARAMS), settings.OSM_SOURCE)
+    return hashlib.blake2b(repr(params).encode(), digest_size=6).hexdigest()
+
+
+async def data_expires_at(centers: List[LatLon]) -> Optional[float]:
+    """
+    When the layer data an analysis of `centers` used goes stale: RESULT_CACHE_TTL_S from
+    now at the latest, sooner if a cached tile it was built from expires first or the
+    station store is due to sync. None when a tile it needed is not cached; results of
+    an analysis with failed layers are not kept either (see analyze_locations).
+    """
+    expires = time.time() + settings.RESULT_CACHE_TTL_S
+    upstream = [layer for layer in LAYER_NAMES if provider_for(layer) is UPSTREAM_PROVIDER]
+    cache = get_tile_cache()
+    if cache is not None and upstream:
+        tiles = list(dict.fromkeys(t for lat, lon in centers for t in tiles_covering(lat, lon, SEARCH_RADIUS_M, cache.zoom)))
+        for layer in upstream:
+            layer_expires = await asyncio.to_thread(cache.expires_at, TILE_CACHE_KEYS[layer], tiles)
+            if layer_expires is None:
+                return None
+            expires = min(expires, layer_expires)
+    if get_station_provider() is not None and settings.STATION_SYNC_INTERVAL_S > 0:
+        expires = min(expires, time.time() + settings.STATION_SYNC_INTERVAL_S)
+    return expires
+
+
+# --- Batch analysis over many centers ---
+
+def centers_covering(polygon: List[LatLon], spacing_m: Optional[float] = None, max_grid_points: Optional[int] = None) -> List[LatLon]:
+    """
+    Search centers whose circles cover a polygon given as (lat, lon) vertices. A square
+    grid with spacing SEARCH_RADIUS_M·√2 leaves no point farther than the radius from a
+    grid point; only grid points whose circle reaches the polygon are kept.
+    Raises ValueError, before building anything, if the grid over the polygon's bounding
+    box would have more than `max_grid_points` points.
+    """
+    spacing_m = spacing_m or SEARCH_RADIUS_M * math.sqrt(2)
+    projection = LocalProjection((sum(p[0] for p in polygon) / len(polygon), sum(p[1] for p in polygon) / len(polygon)))
+    ring_x, ring_y = map(np.array, zip(*(projection.project(lat, lon) for lat, lon in polygon)))
+    # Same point counts np.arange gives below
+    columns = math.ceil((float(ring_x.max() - ring_x.min()) + spacing_m) / spacing_m)
+    rows = math.ceil((float(ring_y.max() - ring_y.min()) + spacing_m) / spacing_m)
+    if max_grid_points is not None and columns * rows > max_grid_points:
+        raise ValueError(f"A {spacing_m:.0f} m grid over this polygon has {columns * rows} points; at most {max_grid_points} are allowed.")
+    xs = np.arange(ring_x.min(), ring_x.max() + spacing_m, spacing_m)
+    ys = np.arange(ring_y.min(), ring_y.max() + spacing_m, spacing_m)
+    grid_x, grid_y = (a.ravel() for a in np.meshgrid(xs, ys))
+    keep = points_in_ring(grid_x, grid_y, ring_x, ring_y) | (distance_to_ring(grid_x, grid_y, ring_x, ring_y) <= SEARCH_RADIUS_M)
+    return [projection.unproject(x, y) for x, y in zip(grid_x[keep].tolist(), grid_y[keep].tolist())]
+
+
+def cluster_centers(centers: List[LatLon], radius_m: float) -> List[List[LatLon]]:
+    """
+    Groups centers so every one lies within `radius_m` of its group's first center;
+    each center joins the first group close enough, in input order.
+    """
+    clusters: List[List[LatLon]] = []
+    for center in centers:
+        for cluster in clusters:
+            if haversine_m(cluster[0][0], cluster[0][1], center[0], center[1]) <= radius_m:
+                cluster.append(center)
+                break
+        else:
+            clusters.append([center])
+    return clusters
+
+
+async def _analyze_cluster(centers: List[LatLon], api_key: str, failed: List[str]) -> Tuple[List[Dict], Dict]:
+    layers = await fetch_layers(centers, api_key, failed)
+    origin = (sum(c[0] for c in centers) / len(centers), sum(c[1] for c in centers) / len(centers))
+    with metrics.stage("geometry"):
+        job, polygons = build_scoring_job(origin, layers, top_k=None)
+    return await _score(job, polygons)
+
+
+async def analyze_batch(centers: List[LatLon], api_key: str, top_n: int = 3, polygon: Optional[List[LatLon]] = None) -> Dict:
+    """
+    Runs the site analysis for many centers at once, e.g. the grid points of a city rollout.
+
+    Centers are grouped into clusters no wider than BATCH_CLUSTER_RADIUS_KM. Per cluster
+    the layers are fetched once for the union of its search circles and every space is
+    scored once against indexes built over that area, so a neighbour just outside one
+    center's circle still counts; far apart clusters never share one huge upstream query
+    or a projection stretched beyond its accuracy. Each viable site is then assigned to
+    its nearest center only, so overlapping circles never recommend the same site twice,
+    and each center gets its best `top_n`. With a `polygon`, sites outside it are left out.
+    Its Overpass queries are queued at PRIORITY_BATCH.
+    """
+    clusters = cluster_centers(centers, settings.BATCH_CLUSTER_RADIUS_KM * 1000)
+    log.debug("batch analysis started", extra={"centers": len(centers), "clusters": len(clusters)})
+    failed: List[str] = []
+    # Single searches waiting on Overpass go ahead of the batch's queries
+    with priority(PRIORITY_BATCH):
+        parts = await asyncio.gather(*(_analyze_cluster(cluster, api_key, failed) for cluster in clusters))
+    # A site inside circles of two clusters is scored by both; keep its better ranking
+    seen = set()
+    candidates = []
+    for candidate in merge_top_k([c for c, _ in parts], None):
+        if candidate["center"] not in seen:
+            seen.add(candidate["center"])
+            candidates.append(candidate)
+    report = merge_stage_reports([r for _, r in parts]) if len(parts) > 1 else parts[0][1]
+    if len(parts) > 1:
+        report["clusters"] = len(parts)
+    if failed:
+        report["failed_layers"] = sorted(set(failed))
+
+    if polygon is not None and candidates:
+        projection = LocalProjection((sum(p[0] for p in polygon) / len(polygon), sum(p[1] for p in polygon) / len(polygon)))
+        ring_x, ring_y = map(np.array, zip(*(projection.project(lat, lon) for lat, lon in polygon)))
+        cand_x, cand_y = map(np.array, zip(*(projection.project(*c["center"]) for c in candidates)))
+        inside = points_in_ring(cand_x, cand_y, ring_x, ring_y)
+        candidates = [c for c, keep in zip(candidates, inside.tolist()) if keep]
+
+    # Distance from every site to every center; sites reachable from several centers are "shared"
+    per_center: List[List[Dict]] = [[] for _ in centers]
+    shared = 0
+    if candidates:
+        site_lat = np.array([c["center"][0] for c in candidates])[:, None]
+        site_lon = np.array([c["center"][1] for c in candidates])[:, None]
+        distances = haversine_m(site_lat, site_lon, np.array([c[0] for c in centers]), np.array([c[1] for c in centers]))
+        shared = int(((distances <= SEARCH_RADIUS_M).sum(axis=1) > 1).sum())
+        # Candidates are already best first, so appending keeps every center's list ranked
+        for candidate, nearest in zip(candidates, distances.argmin(axis=1).tolist()):
+            if len(per_center[nearest]) < top_n:
+                per_center[nearest].append(candidate)
+
+    log.debug("batch analysis finished", extra={"sites": len(candidates), "shared_sites": shared})
+    return {
+        "centers": [{"center": center, "candidates": ranked} for center, ranked in zip(centers, per_center)],
+        "sites": len(candidates),
+        "shared_sites": shared,
+        "stage_report": report,
+    }
@@ -0,0 +1,153 @@
+# app/carbon_cache.py
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+from . import metrics
+from .logs import get_logger
+
+log = get_logger("carbon_cache")
+
+# Electricity Maps zone identifiers, e.g. "IN-SO", "DE", "US-CAL-CISO"
+ZONE_PATTERN = re.compile(r"^[A-Z]{2}(-[A-Z0-9]+)*$")
+
+
+class CarbonUpstreamError(Exception):
+    """Electricity Maps could not provide a value and nothing usable is cached."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class CarbonIntensityCache:
+    """
+    Latest carbon intensity per zone, kept warm by a background task so requests never
+    wait on Electricity Maps once a zone has been seen. A value younger than `max_age_s`
+    is fresh; an older one is still served (flagged stale) for up to `max_stale_s` while
+    a refresh runs behind it. Concurrent misses for a zone share one upstream call.
+    `fetch(zone)` returns the upstream JSON or raises CarbonUpstreamError.
+
+    Zones outside `zones` are only kept (and refreshed) once upstream has answered for
+    them, and at most `max_requested_zones` of them, least recently requested first out,
+    so clients cannot grow the cache or the refresh traffic with made-up zone codes.
+    """
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Dict]], zones: Iterable[str],
+                 max_age_s: float, max_stale_s: float, refresh_interval_s: float, max_requested_zones: int = 100):
+        self.fetch = fetch
+        self.zones = set(zones)
+        self.max_age_s = max_age_s
+        self.max_stale_s = max_stale_s
+        self.refresh_interval_s = refresh_interval_s
+        self.max_requested_zones = max_requested_zones
+        self._entries: Dict[str, Tuple[float, Dict]] = {}
+        self._errors: Dict[str, str] = {}
+        # Zone -> last request time, least recently requested first
+        self._requested: "OrderedDict[str, float]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def refresh(self, zone: str) -> asyncio.Task:
+        """The in-flight refresh for `zone`, starting one if none is running."""
+        task = self._inflight.get(zone)
+        if task is None or task.done():
+            task = self._inflight[zone] = asyncio.create_task(self._refresh(zone))
+            task.add_done_callback(lambda t: self._inflight.pop(zone, None) if self._inflight.get(zone) is t else None)
+        return task
+
+    def _tracked(self, zone: str) -> bool:
+        return zone in self.zones or zone in self._requested
+
+    async def _refresh(self, zone: str) -> Tuple[float, Dict]:
+        try:
+            data = await self.fetch(zone)
+        except CarbonUpstreamError as e:
+            if self._tracked(zone):
+                self._errors[zone] = e.detail
+            raise
+        entry = self._entries[zone] = (time.time(), data)
+        self._errors.pop(zone, None)
+        return entry
+
+    def _touch(self, zone: str, now: float) -> None:
+        """Records a request for a zone upstream has answered for, evicting the least recently requested."""
+        if zone in self.zones:
+            return
+        self._requested[zone] = now
+        self._requested.move_to_end(zone)
+        while len(self._requested) > self.max_requested_zones:
+            evicted, _ = self._requested.popitem(last=False)
+            self._entries.pop(evicted, None)
+            self._errors.pop(evicted, None)
+
+    async def get(self, zone: str) -> Tuple[Dict, Dict]:
+        """(upstream data, cache metadata) for a zone."""
+        now = time.time()
+        entry = self._entries.get(zone)
+        if entry is not None and now - entry[0] > self.max_stale_s:
+            entry = None
+        if entry is None:
+            # Nothing servable: wait for the (shared) refresh
+            metrics.count_cache("carbon_intensity", hits=0, misses=1)
+            entry = await asyncio.shield(self.refresh(zone))
+            now = time.time()
+        elif now - entry[0] > self.max_age_s:
+            metrics.count_cache("carbon_intensity", hits=0, misses=0, stale=1)
+            refresh = self.refresh(zone)
+            # Consume the outcome so a failed background refresh is not reported as unretrieved
+            refresh.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            metrics.count_cache("carbon_intensity", hits=1, misses=0)
+
+        self._touch(zone, now)
+        fetched_at, data = entry
+        age = now - fetched_at
+        return data, {
+            "fetched_at": fetched_at,
+            "age_s": round(age, 3),
+            "stale": age > self.max_age_s,
+            "refresh_error": self._errors.get(zone),
+        }
+
+    async def refresh_all(self) -> None:
+        """Refreshes the configured zones and any requested within the stale window."""
+        now = time.time()
+        # Zones nobody asked for within the stale window are dropped rather than kept warm
+        self._requested = OrderedDict((z, at) for z, at in self._requested.items() if now - at <= self.max_stale_s)
+        for zone in [z for z in self._entries if z not in self.zones and z not in self._requested]:
+            del self._entries[zone]
+        zones = sorted(self.zones | set(self._requested))
+        results = await asyncio.gather(*(self.refresh(z) for z in zones), return_exceptions=True)
+        for zone, result in zip(zones, results):
+            if isinstance(result, Exception):
+                log.warning("carbon intensity refresh failed", extra={"zone": zone, "error": str(result)})
+
+    async def run(self) -> None:
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.refresh_interval_s)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        now = time.time()
+        return {
+            zone: {"age_s": round(now - fetched_at, 3), "stale": now - fetched_at > self.max_age_s, "refresh_error": self._errors.get(zone)}
+            for zone, (fetched_at, _) in self._entries.items()
+        }
+
+    @asynccontextmanager
+    async def running(self):
+        """Keeps the cache refreshed in the background while the app is up."""
+        task = asyncio.create_task(self.run()) if self.refresh_interval_s > 0 else None
+        try:
+            yield self
+        finally:
+            if task is not None:
+                task.cancel()
+            for inflight in self._inflight.values():
+                inflight.cancel()
+            self._inflight.clear()
@@ -0,0 +1,169 @@
+# app/carbon_history.py
+
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Upper bounds (inclusive) of each carbon-intensity class in gCO2eq/kWh, and the price per
+# kWh charged in each class; a reading above the last bound is "Very High"
+THRESHOLDS = np.array([430.83, 471.44, 508.25, 558.47])
+LEVELS = ("Very Low", "Low", "Moderate", "High", "Very High")
+PRICES = np.array([5.00, 6.50, 8.50, 11.00, 14.00])
+UNKNOWN_PRICE = 8.50
+
+
+def classify_levels(intensity: np.ndarray) -> np.ndarray:
+    """Index into LEVELS per reading (-1 where the reading is missing), in one pass."""
+    intensity = np.asarray(intensity, dtype=float)
+    levels = np.searchsorted(THRESHOLDS, intensity, side="left")
+    return np.where(np.isnan(intensity), -1, levels)
+
+
+def level_prices(levels: np.ndarray) -> np.ndarray:
+    return np.where(levels >= 0, PRICES[np.clip(levels, 0, len(PRICES) - 1)], np.nan)
+
+
+class CarbonHistoryStore:
+    """
+    Append-only carbon-intensity readings per zone, as two raw little-endian columns
+    (`<zone>/time.i8`, epoch seconds, and `<zone>/intensity.f4`) that are memory-mapped
+    for reads. Readings must arrive in time order; older or duplicate ones are ignored. A
+    lock file serializes appends from several workers, and readers only trust the rows
+    both columns have, so a half-written append is never seen.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+
+    def _paths(self, zone: str) -> Tuple[Path, Path]:
+        directory = self.root / zone
+        return directory / "time.i8", directory / "intensity.f4"
+
+    @contextmanager
+    def _zone_lock(self, zone: str):
+        directory = self.root / zone
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def zones(self) -> List[str]:
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def series(self, zone: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(epoch seconds, intensity) for every stored reading of a zone, memory-mapped."""
+        time_path, value_path = self._paths(zone)
+        if not time_path.exists() or not value_path.exists():
+            return np.empty(0, dtype="<i8"), np.empty(0, dtype="<f4")
+        rows = min(time_path.stat().st_size // 8, value_path.stat().st_size // 4)
+        with self._lock:
+            cached = self._maps.get(zone)
+            if cached is not None and cached[0] == rows:
+                return cached[1], cached[2]
+        if rows == 0:
+            return np.empty(0, dtype="<i8"), np.empty(0, dtype="<f4")
+        times = np.memmap(time_path, dtype="<i8", mode="r", shape=(rows,))
+        values = np.memmap(value_path, dtype="<f4", mode="r", shape=(rows,))
+        with self._lock:
+            self._maps[zone] = (rows, times, values)
+        return times, values
+
+    def append(self, zone: str, times: np.ndarray, values: np.ndarray) -> int:
+        """Appends the readings newer than the last stored one. Returns how many were kept."""
+        times = np.asarray(times, dtype="<i8")
+        values = np.asarray(values, dtype="<f4")
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+        with self._zone_lock(zone):
+            stored, _ = self.series(zone)
+            last = int(stored[-1]) if len(stored) else None
+            keep = np.ones(len(times), dtype=bool)
+            keep[1:] = times[1:] != times[:-1]
+            if last is not None:
+                keep &= times > last
+            times, values = times[keep], values[keep]
+            if not len(times):
+                return 0
+            time_path, value_path = self._paths(zone)
+            # Trim a torn tail (one column longer than the other) before appending
+            rows = len(stored)
+            for path, width in ((time_path, 8), (value_path, 4)):
+                if path.exists() and path.stat().st_size != rows * width:
+                    os.truncate(path, rows * width)
+            with open(value_path, "ab") as f:
+                f.write(values.tobytes())
+            with open(time_path, "ab") as f:
+                f.write(times.tobytes())
+        return int(len(times))
+
+    def lookup(self, zone: str, query_times: np.ndarray, max_gap_s: float) -> np.ndarray:
+        """
+        Intensity in effect at each query time: the latest reading at or before it, or nan
+        when there is none within `max_gap_s`. One searchsorted over the whole query.
+        """
+        times, values = self.series(zone)
+        query_times = np.asarray(query_times, dtype=float)
+        if not len(times):
+            return np.full(len(query_times), np.nan)
+        idx = np.searchsorted(times, query_times, side="right") - 1
+        safe = np.clip(idx, 0, len(times) - 1)
+        found = (idx >= 0) & (query_times - times[safe] <= max_gap_s)
+        return np.where(found, values[safe].astype(float), np.nan)
+
+
+def cheapest_windows(prices: np.ndarray, step_s: float, energy_kwh: float, charger_kw: float, count: int) -> List[Dict]:
+    """
+    The `count` cheapest non-overlapping runs of consecutive steps that deliver
+    `energy_kwh` at `charger_kw`, priced per step (the last step only for the energy still
+    missing). Windows touching a step with no price are skipped. Returns step offsets and
+    cost, cheapest first.
+    """
+    per_step = charger_kw * step_s / 3600.0
+    steps = max(1, int(np.ceil(energy_kwh / per_step - 1e-9)))
+    n = len(prices)
+    if steps > n:
+        return []
+    last_kwh = energy_kwh - per_step * (steps - 1)
+    known = ~np.isnan(prices)
+    filled = np.where(known, prices, 0.0)
+    csum = np.concatenate([[0.0], np.cumsum(filled)])
+    cknown = np.concatenate([[0], np.cumsum(known)])
+    starts = np.arange(n - steps + 1)
+    full = csum[starts + steps - 1] - csum[starts]
+    cost = per_step * full + last_kwh * filled[starts + steps - 1]
+    complete = (cknown[starts + steps] - cknown[starts]) == steps
+    cost = np.where(complete, cost, np.inf)
+
+    windows: List[Dict] = []
+    taken = np.zeros(n, dtype=bool)
+    for start in np.argsort(cost, kind="stable"):
+        if len(windows) >= count or not np.isfinite(cost[start]):
+            break
+        if taken[start:start + steps].any():
+            continue
+        taken[start:start + steps] = True
+        windows.append({"start_step": int(start), "steps": steps, "cost": round(float(cost[start]), 2)})
+    return windows
+
+
+_store: Optional[CarbonHistoryStore] = None
+
+
+def get_carbon_history() -> CarbonHistoryStore:
+    global _store
+    from .config import settings
+
+    if _store is None:
+        _store = CarbonHistoryStore(settings.CARBON_HISTORY_DIR)
+    return _store
@@ -3,6 +3,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 from pathlib import Path # Import the Path object
+from typing import Dict, List, Optional
 
 # --- THIS IS THE KEY CHANGE ---
 # 1. Find the project's root directory by going up one level from this file's directory.
@@ -24,6 +25,94 @@ class Settings(BaseSettings):
 
     OCM_API_KEY: str = Field(..., description="API key for OpenChargeMap")
 
+    # Tile cache for Overpass / OpenChargeMap responses, shared by all workers on the host
+    TILE_CACHE_ENABLED: bool = Field(True, description="Serve upstream layers from the on-disk tile cache")
+    TILE_CACHE_PATH: Path = Field(BASE_DIR / "cache" / "tiles.sqlite3", description="SQLite file backing the tile cache")
+    TILE_CACHE_TTL_S: float = Field(24 * 3600, description="Seconds before a cached tile is refetched")
+    TILE_CACHE_MAX_MB: int = Field(512, description="Compressed size above which least recently used tiles are evicted")
+    TILE_CACHE_ZOOM: int = Field(14, description="Slippy-map zoom level of the cache tiles (14 is ~2.4 km at the equator)")
+
+    # Process-wide Overpass scheduler
+    OVERPASS_RATE_PER_S: float = Field(1.0, description="Sustained Overpass requests per second across all API requests")
+    OVERPASS_BURST: int = Field(2, description="Requests that may be sent back to back before the rate applies")
+    OVERPASS_MAX_CONCURRENCY: int = Field(2, description="Overpass requests in flight at once")
+    OVERPASS_MAX_RETRIES: int = Field(3, description="Attempts per query when Overpass answers 429")
+    OVERPASS_MAX_BACKOFF_S: float = Field(60.0, description="Longest wait before retrying a 429, whatever Retry-After asks for")
+
+    # Shared outbound HTTP pools (one per upstream, see http_clients.UPSTREAMS)
+    HTTP_MAX_CONNECTIONS: int = Field(20, description="Open connections per upstream pool")
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(10, description="Idle connections kept alive per upstream pool")
+    HTTP_KEEPALIVE_EXPIRY_S: float = Field(30.0, description="Seconds an idle connection is kept before closing")
+    HTTP_DEFAULT_TIMEOUT_S: float = Field(30.0, description="Default request timeout; individual calls may override it")
+    HTTP2_ENABLED: bool = Field(False, description="Negotiate HTTP/2 where the upstream supports it (needs the 'h2' package)")
+
+    # Candidate scoring
+    SCORING_WORKERS: int = Field(0, description="Processes in the scoring pool; 0 scores in a thread of the API worker")
+    SCORING_CHUNK_SIZE: int = Field(2000, description="Candidate polygons per process-pool task")
+
+    # Where the OSM layers come from: the live Overpass API, or a local extract loaded with
+    # `python -m ev_finder_api.app.osm_extract <file>` (stations always come from OpenChargeMap)
+    OSM_SOURCE: str = Field("overpass", description='"overpass" or "extract"')
+    OSM_EXTRACT_DIR: Path = Field(BASE_DIR / "data" / "osm_extract", description="Directory of the local OSM extract store")
+
+    # Local OpenChargeMap station store, kept in sync in the background
+    STATION_SYNC_REGIONS: Dict[str, List[float]] = Field({}, description='Regions to sync, e.g. {"kochi": [9.8, 76.1, 10.2, 76.5]} as [south, west, north, east]; empty disables the store')
+    STATION_STORE_PATH: Path = Field(BASE_DIR / "data" / "stations.sqlite3", description="SQLite file backing the station store")
+    STATION_SYNC_INTERVAL_S: float = Field(3600.0, description="Seconds between incremental syncs; 0 leaves syncing to the CLI")
+    STATION_SYNC_FULL_INTERVAL_S: float = Field(7 * 24 * 3600.0, description="Seconds between full syncs, which also prune removed stations")
+    STATION_SYNC_PAGE_SIZE: int = Field(1000, description="Stations per OCM request while paging")
+
+    # /maintenance/nearby LLM fan-out
+    MAINTENANCE_LLM_CONCURRENCY: int = Field(20, description="LLM calls in flight at once across all maintenance requests")
+    MAINTENANCE_LLM_TIMEOUT_S: float = Field(20.0, description="Seconds before a single LLM call is abandoned and retried")
+    MAINTENANCE_LLM_RETRIES: int = Field(3, description="Attempts per station on timeouts, rate limits and 5xx")
+    MAINTENANCE_LLM_BACKOFF_S: float = Field(0.5, description="Base of the jittered exponential backoff between attempts")
+    MAINTENANCE_LOG_PATH: Path = Field(Path("smart_charging_log.csv"), description="Labelled session log the triage model and few-shot examples come from")
+    MAINTENANCE_ARTIFACT_PATH: Optional[Path] = Field(None, description="Precomputed triage artifact; defaults to the log path with a .triage.json suffix")
+    MAINTENANCE_TRIAGE_MIN_CONFIDENCE: float = Field(0.9, description="Local classifier confidence needed to skip the LLM; above 1 sends every station to the LLM")
+    MAINTENANCE_BATCH_SIZE: int = Field(5, description="Stations packed into one prompt (sharing the few-shot examples); 1 sends one prompt per station")
+
+    # Cache of LLM maintenance verdicts per feature bucket (binned kWh and hours + the three flags)
+    VERDICT_CACHE_ENABLED: bool = Field(True, description="Reuse LLM verdicts for sessions in the same feature bucket")
+    VERDICT_CACHE_KWH_BIN: float = Field(0.5, description="Width of the energy bins, in kWh")
+    VERDICT_CACHE_HOURS_BIN: float = Field(0.25, description="Width of the session duration bins, in hours")
+    VERDICT_CACHE_TTL_S: float = Field(24 * 3600, description="Seconds a cached verdict stays valid")
+    VERDICT_CACHE_MAX_ENTRIES: int = Field(10_000, description="Least recently used verdicts are evicted beyond this many")
+    VERDICT_CACHE_PATH: Optional[Path] = Field(None, description="SQLite file to persist verdicts in and share them between workers; memory only if unset")
+
+    # Carbon intensity per Electricity Maps zone, refreshed in the background
+    CARBON_ZONES: List[str] = Field(["IN-SO"], description="Zones kept warm from startup; other valid zones are cached once requested")
+    CARBON_DEFAULT_ZONE: str = Field("IN-SO", description="Zone used when /carbon-intensity is called without one")
+    CARBON_MAX_AGE_S: float = Field(900.0, description="Seconds a value is served as fresh")
+    CARBON_MAX_STALE_S: float = Field(6 * 3600.0, description="Seconds a value may still be served, flagged stale, while it is refreshed")
+    CARBON_REFRESH_INTERVAL_S: float = Field(600.0, description="Seconds between background refreshes; 0 refreshes only on demand")
+    CARBON_MAX_REQUESTED_ZONES: int = Field(100, description="Zones besides CARBON_ZONES kept cached and refreshed; the least recently requested are dropped beyond this")
+    CARBON_HISTORY_DIR: Path = Field(BASE_DIR / "data" / "carbon_history", description="Append-only per-zone reading history")
+    CARBON_HISTORY_MAX_GAP_S: float = Field(2 * 3600.0, description="Longest a reading is assumed to hold when pricing later timestamps")
+    CARBON_PRICE_MAX_POINTS: int = Field(200_000, description="Most steps one /carbon-intensity/prices query may ask for")
+
+    # Fleet maintenance scan over a full session log
+    FLEET_LOG_PATH: Path = Field(Path("smart_charging_log.csv"), description="Session log scanned by POST /maintenance/fleet-scan when no file is uploaded")
+    FLEET_STATION_COLUMN: str = Field("station_id", description="Log column identifying the charger each session belongs to")
+    FLEET_SCAN_CHUNK_ROWS: int = Field(200_000, description="Rows parsed per chunk; bounds the scan's memory")
+
+    # Batch site search
+    BATCH_MAX_CENTERS: int = Field(64, description="Most search centers one batch request may cover, given or derived from a polygon")
+    BATCH_CLUSTER_RADIUS_KM: float = Field(15.0, description="Centers are fetched and projected in groups lying within this distance of the group's first center, keeping bbox queries small and the local projection accurate")
+
+    # /find-locations result cache
+    RESULT_CACHE_ENABLED: bool = Field(True, description="Serve repeated /find-locations searches from memory; searches run from the center of their geohash cell")
+    RESULT_CACHE_GEOHASH_PRECISION: int = Field(7, ge=1, le=12, description="Geohash length the search center is snapped to (7 is a cell of about 150 m)")
+    RESULT_CACHE_TTL_S: float = Field(3600.0, description="Longest a result is kept; with the tile cache on, it expires with the oldest tile it used if that is sooner")
+    RESULT_CACHE_MAX_ENTRIES: int = Field(1024, description="Least recently used results are evicted beyond this many")
+    RESULT_CACHE_MAX_MB: int = Field(32, description="Least recently used results are evicted beyond this much response body")
+
+    # Logging and metrics
+    LOG_LEVEL: str = Field("INFO", description="Lowest level logged; DEBUG adds a record per upstream query and LLM call")
+    LOG_FORMAT: str = Field("text", description='"text" (one line per record) or "json"')
+    METRICS_ENABLED: bool = Field(True, description="Serve Prometheus metrics at /metrics")
+    METRICS_TIMING_HEADER: bool = Field(False, description="Return each request's stage timings in a Server-Timing header")
+
     @property
     def is_configured(self) -> bool:
         return self.OCM_API_KEY not in [None, "", "PASTE_YOUR_REAL_API_KEY_HERE"]
@@ -0,0 +1,326 @@
+# app/elements.py
+
+import io
+import json
+from array import array
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .geometry import PackedRings
+
+
+class ElementStore:
+    """
+    Compact, read-only column store for one layer of OSM elements.
+
+    Nodes are three parallel arrays (id, lon, lat). Ways keep their node refs in one
+    flat int64 array indexed by `way_offsets` (CSR), the optional `out center` point and
+    their tags. Geometry is assembled by looking refs up in the sorted node ids rather
+    than through one dict per element, so a layer costs a few bytes per coordinate.
+    """
+
+    def __init__(self, node_id, node_lon, node_lat, way_id, way_offsets, way_refs, way_center_lon, way_center_lat, way_tags):
+        self.node_id = np.asarray(node_id, dtype=np.int64)
+        self.node_lon = np.asarray(node_lon, dtype=np.float64)
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.way_id = np.asarray(way_id, dtype=np.int64)
+        self.way_offsets = np.asarray(way_offsets, dtype=np.int64)
+        self.way_refs = np.asarray(way_refs, dtype=np.int64)
+        self.way_center_lon = np.asarray(way_center_lon, dtype=np.float64)
+        self.way_center_lat = np.asarray(way_center_lat, dtype=np.float64)
+        self.way_tags: List[Dict] = list(way_tags)
+        self._order = np.argsort(self.node_id, kind="stable")
+        self._sorted_ids = self.node_id[self._order]
+        self._ref_index: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls) -> "ElementStore":
+        return ElementStoreBuilder().build()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_id)
+
+    @property
+    def way_count(self) -> int:
+        return len(self.way_id)
+
+    def __len__(self) -> int:
+        return self.node_count + self.way_count
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.node_id, self.node_lon, self.node_lat, self.way_id, self.way_offsets, self.way_refs, self.way_center_lon, self.way_center_lat)
+        return sum(a.nbytes for a in arrays)
+
+    # --- Lookups ---
+
+    def node_index(self, ids: np.ndarray) -> np.ndarray:
+        """Position of each node id in the node arrays, -1 where the node is not in the store."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == ids, self._order[pos], -1)
+
+    @property
+    def ref_index(self) -> np.ndarray:
+        """node_index(way_refs), computed once."""
+        if self._ref_index is None:
+            self._ref_index = self.node_index(self.way_refs)
+        return self._ref_index
+
+    @property
+    def way_of_ref(self) -> np.ndarray:
+        """Way index owning each entry of way_refs."""
+        return np.repeat(np.arange(self.way_count), np.diff(self.way_offsets))
+
+    def referenced_nodes(self) -> np.ndarray:
+        """Mask of nodes that belong to some way."""
+        mask = np.zeros(self.node_count, dtype=bool)
+        idx = self.ref_index
+        mask[idx[idx >= 0]] = True
+        return mask
+
+    def point_coords(self) -> List[Tuple[float, float]]:
+        """(lat, lon) of every node plus every way that carries an `out center` point."""
+        centered = ~np.isnan(self.way_center_lat)
+        lats = np.concatenate([self.node_lat, self.way_center_lat[centered]])
+        lons = np.concatenate([self.node_lon, self.way_center_lon[centered]])
+        return list(zip(lats.tolist(), lons.tolist()))
+
+    def _resolved_refs(self, min_refs: int = 0, min_resolved: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        The ways with at least `min_refs` refs of which at least `min_resolved` are nodes
+        in this store, and the node index of those resolved refs in CSR layout:
+        (way indices, node indices, offsets).
+        """
+        idx = self.ref_index
+        way_of_ref = self.way_of_ref
+        resolved = idx >= 0
+        counts = np.bincount(way_of_ref[resolved], minlength=self.way_count)
+        keep = (np.diff(self.way_offsets) >= min_refs) & (counts >= min_resolved)
+        node_idx = idx[resolved & keep[way_of_ref]]
+        offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        np.cumsum(counts[keep], out=offsets[1:])
+        return np.flatnonzero(keep), node_idx, offsets
+
+    def polylines(self, min_refs: int = 2) -> List[List[Tuple[float, float]]]:
+        """A (lon, lat) line per way with at least `min_refs` refs, skipping refs not in the store."""
+        _, node_idx, offsets = self._resolved_refs(min_refs=min_refs)
+        lon = self.node_lon[node_idx].tolist()
+        lat = self.node_lat[node_idx].tolist()
+        return [list(zip(lon[s:e], lat[s:e])) for s, e in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    def closed_rings(self, min_coords: int = 3) -> Tuple[np.ndarray, PackedRings]:
+        """
+        Every way with at least `min_coords` resolved refs as a closed ring, written straight
+        into CSR arrays (the first coordinate is appended to rings that are not already
+        closed). Returns the way index of each ring along with the rings.
+        """
+        ways, node_idx, offsets = self._resolved_refs(min_resolved=min_coords)
+        first, last = node_idx[offsets[:-1]], node_idx[offsets[1:] - 1]
+        is_open = (self.node_lon[first] != self.node_lon[last]) | (self.node_lat[first] != self.node_lat[last])
+        node_idx = np.insert(node_idx, offsets[1:][is_open], first[is_open])
+        offsets[1:] += np.cumsum(is_open)
+        return ways, PackedRings(self.node_lon[node_idx], self.node_lat[node_idx], offsets)
+
+    # --- Subsets, merging and serialization (used by the tile cache) ---
+
+    def subset(self, node_mask: np.ndarray, way_mask: np.ndarray) -> "ElementStore":
+        lengths = np.diff(self.way_offsets)
+        offsets = np.zeros(int(way_mask.sum()) + 1, dtype=np.int64)
+        np.cumsum(lengths[way_mask], out=offsets[1:])
+        return ElementStore(
+            self.node_id[node_mask], self.node_lon[node_mask], self.node_lat[node_mask],
+            self.way_id[way_mask], offsets, self.way_refs[np.repeat(way_mask, lengths)],
+            self.way_center_lon[way_mask], self.way_center_lat[way_mask],
+            [t for t, keep in zip(self.way_tags, way_mask.tolist()) if keep],
+        )
+
+    def nodes_of_ways(self, way_mask: np.ndarray) -> np.ndarray:
+        """Mask of nodes referenced by the selected ways."""
+        idx = self.ref_index[way_mask[self.way_of_ref]]
+        mask = np.zeros(self.node_count, dtype=bool)
+        mask[idx[idx >= 0]] = True
+        return mask
+
+    @classmethod
+    def concat(cls, stores: List["ElementStore"]) -> "ElementStore":
+        """Concatenates stores, keeping the first copy of a node or way that appears in several."""
+        stores = [s for s in stores if len(s)]
+        if not stores:
+            return cls.empty()
+        if len(stores) == 1:
+            return stores[0]
+        node_id = np.concatenate([s.node_id for s in stores])
+        _, nodes = np.unique(node_id, return_index=True)
+        nodes.sort()
+        way_id = np.concatenate([s.way_id for s in stores])
+        _, ways = np.unique(way_id, return_index=True)
+        ways.sort()
+
+        lengths = np.concatenate([np.diff(s.way_offsets) for s in stores])
+        way_mask = np.zeros(len(way_id), dtype=bool)
+        way_mask[ways] = True
+        offsets = np.zeros(len(ways) + 1, dtype=np.int64)
+        np.cumsum(lengths[ways], out=offsets[1:])
+        tags = [t for s in stores for t in s.way_tags]
+        return cls(
+            node_id[nodes], np.concatenate([s.node_lon for s in stores])[nodes], np.concatenate([s.node_lat for s in stores])[nodes],
+            way_id[ways], offsets, np.concatenate([s.way_refs for s in stores])[np.repeat(way_mask, lengths)],
+            np.concatenate([s.way_center_lon for s in stores])[ways], np.concatenate([s.way_center_lat for s in stores])[ways],
+            [tags[i] for i in ways.tolist()],
+        )
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        tags = json.dumps(self.way_tags, separators=(",", ":")).encode()
+        np.savez_compressed(
+            buf,
+            node_id=self.node_id, node_lon=self.node_lon, node_lat=self.node_lat,
+            way_id=self.way_id, way_offsets=self.way_offsets, way_refs=self.way_refs,
+            way_center_lon=self.way_center_lon, way_center_lat=self.way_center_lat,
+            way_tags=np.frombuffer(tags, dtype=np.uint8),
+        )
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "ElementStore":
+        with np.load(io.BytesIO(payload), allow_pickle=False) as data:
+            return cls(
+                data["node_id"], data["node_lon"], data["node_lat"],
+                data["way_id"], data["way_offsets"], data["way_refs"],
+                data["way_center_lon"], data["way_center_lat"],
+                json.loads(data["way_tags"].tobytes()),
+            )
+
+
+class ElementStoreBuilder:
+    """Appends elements into typed arrays as they are parsed, then hands the buffers to a store."""
+
+    def __init__(self):
+        self.node_id = array("q")
+        self.node_lon = array("d")
+        self.node_lat = array("d")
+        self.way_id = array("q")
+        self.way_offsets = array("q", [0])
+        self.way_refs = array("q")
+        self.way_center_lon = array("d")
+        self.way_center_lat = array("d")
+        self.way_tags: List[Dict] = []
+
+    def add_node(self, node_id: int, lon: float, lat: float) -> None:
+        self.node_id.append(node_id)
+        self.node_lon.append(lon)
+        self.node_lat.append(lat)
+
+    def add_way(self, way_id: int, refs: List[int], tags: Dict, center: Optional[Dict] = None) -> None:
+        self.way_id.append(way_id)
+        self.way_refs.extend(refs)
+        self.way_offsets.append(len(self.way_refs))
+        self.way_center_lon.append(center["lon"] if center else float("nan"))
+        self.way_center_lat.append(center["lat"] if center else float("nan"))
+        self.way_tags.append(tags)
+
+    def add(self, el: Dict) -> None:
+        """Adds one Overpass element. Node tags are dropped; nothing downstream reads them."""
+        kind = el.get("type")
+        if kind == "node" and "lat" in el:
+            self.add_node(el["id"], el["lon"], el["lat"])
+        elif kind == "way":
+            self.add_way(el["id"], el.get("nodes", []), el.get("tags", {}), el.get("center"))
+
+    def build(self) -> ElementStore:
+        return ElementStore(
+            np.frombuffer(self.node_id, dtype=np.int64), np.frombuffer(self.node_lon), np.frombuffer(self.node_lat),
+            np.frombuffer(self.way_id, dtype=np.int64), np.frombuffer(self.way_offsets, dtype=np.int64), np.frombuffer(self.way_refs, dtype=np.int64),
+            np.frombuffer(self.way_center_lon), np.frombuffer(self.way_center_lat), self.way_tags,
+        )
+
+
+# --- Streaming JSON ---
+
+class JSONArrayStream:
+    """
+    Yields the objects of one JSON array as the text arrives in arbitrary chunks, so a
+    response is never held as one string or one parsed document. `key` names the array
+    inside the top-level object (Overpass "elements"); None means the body is the array.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self._marker = f'"{key}"' if key else None
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._in_array = False
+        self.done = False
+
+    @property
+    def truncated(self) -> bool:
+        return self._in_array and not self.done
+
+    def _enter_array(self) -> bool:
+        start = 0
+        if self._marker is not None:
+            start = self._buf.find(self._marker)
+            if start == -1:
+                # Keep enough of the tail for a key split across chunks
+                self._buf = self._buf[-len(self._marker):]
+                return False
+        bracket = self._buf.find("[", start)
+        if bracket == -1:
+            self._buf = self._buf[start:]
+            return False
+        self._buf = self._buf[bracket + 1:]
+        self._in_array = True
+        return True
+
+    def feed(self, text: str) -> Iterator[Dict]:
+        if self.done:
+            return  # whatever follows the array (e.g. an Overpass "remark") is not kept
+        self._buf += text
+        if not self._in_array and not self._enter_array():
+            return
+        buf, pos, end = self._buf, 0, len(self._buf)
+        while True:
+            while pos < end and buf[pos] in " \t\n\r,":
+                pos += 1
+            if pos == end:
+                break
+            if buf[pos] == "]":
+                self.done = True
+                break
+            try:
+                obj, pos_after = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # the object continues in the next chunk
+            pos = pos_after
+            yield obj
+        self._buf = "" if self.done else buf[pos:]
+
+
+async def stream_elements(text_chunks: AsyncIterator[str], key: Optional[str] = "elements") -> ElementStore:
+    """Builds an ElementStore from a streamed Overpass JSON body."""
+    parser = JSONArrayStream(key)
+    builder = ElementStoreBuilder()
+    async for chunk in text_chunks:
+        for el in parser.feed(chunk):
+            builder.add(el)
+    if parser.truncated:
+        raise ValueError("response ended inside the elements array")
+    return builder.build()
+
+
+async def stream_ocm_stations(text_chunks: AsyncIterator[str]) -> ElementStore:
+    """Builds a point store from a streamed OpenChargeMap POI array, skipping stations without a location."""
+    parser = JSONArrayStream(None)
+    builder = ElementStoreBuilder()
+    async for chunk in text_chunks:
+        for poi in parser.feed(chunk):
+            address = poi.get("AddressInfo") or {}
+            if address.get("Latitude"):
+                builder.add_node(poi.get("ID", 0), address["Longitude"], address["Latitude"])
+    if parser.truncated:
+        raise ValueError("response ended inside the POI array")
+    return builder.build()
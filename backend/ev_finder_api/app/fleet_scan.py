@@ -0,0 +1,142 @@
+# app/fleet_scan.py
+
+import argparse
+import json
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .triage import FEATURES, MaintenanceTriage
+
+# Session thresholds, the same ones the synthetic sessions in boiler_plate use
+LOW_KWH = 0.5
+SHORT_DURATION_HOURS = 0.2
+FREQUENT_DISCONNECTS = 2
+
+FLAG_COLUMNS = ("is_low_kwh", "is_short_duration", "is_frequent_connect_disconnect")
+
+
+def session_flags(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    The per-session features for a chunk of the log, computed column-wise. The disconnect
+    flag is taken from the log when present, otherwise derived from a `disconnects` count.
+    """
+    energy = chunk["El_kWh"].to_numpy(dtype=float)
+    hours = chunk["Duration_hours"].to_numpy(dtype=float)
+    if "is_frequent_connect_disconnect" in chunk:
+        disconnect = chunk["is_frequent_connect_disconnect"].fillna(0).to_numpy() > 0
+    elif "disconnects" in chunk:
+        disconnect = chunk["disconnects"].fillna(0).to_numpy() >= FREQUENT_DISCONNECTS
+    else:
+        disconnect = np.zeros(len(chunk), dtype=bool)
+    return pd.DataFrame({
+        "El_kWh": energy,
+        "Duration_hours": hours,
+        "is_frequent_connect_disconnect": disconnect.astype(np.int8),
+        "is_low_kwh": (energy < LOW_KWH).astype(np.int8),
+        "is_short_duration": (hours < SHORT_DURATION_HOURS).astype(np.int8),
+    }, index=chunk.index)
+
+
+def scan_log(source, station_column: str, chunksize: int = 200_000, triage: Optional[MaintenanceTriage] = None,
+             top: int = 50) -> Dict:
+    """
+    Streams a session log (path or file object) in chunks and ranks stations by how many
+    of their sessions look faulty: the triage model's verdict when one is given, any raised
+    flag otherwise. Only the columns needed are parsed, and per-station totals are folded in
+    chunk by chunk, so memory grows with the number of stations, never with the log.
+    """
+    started = time.perf_counter()
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, "seek"):
+        source.seek(0)
+    if station_column not in header:
+        raise ValueError(f"Station column '{station_column}' not in the log (columns: {', '.join(header)})")
+    missing = [c for c in ("El_kWh", "Duration_hours") if c not in header]
+    if missing:
+        raise ValueError(f"Log is missing required columns: {', '.join(missing)}")
+    wanted = [station_column, "El_kWh", "Duration_hours"] + [c for c in ("is_frequent_connect_disconnect", "disconnects") if c in header]
+
+    totals: Optional[pd.DataFrame] = None
+    rows = chunks = 0
+    reader = pd.read_csv(
+        source, usecols=wanted, chunksize=chunksize,
+        dtype={station_column: "string", "El_kWh": "float32", "Duration_hours": "float32"},
+    )
+    for chunk in reader:
+        chunk = chunk.dropna(subset=[station_column, "El_kWh", "Duration_hours"])
+        if chunk.empty:
+            continue
+        flags = session_flags(chunk)
+        if triage is not None:
+            risk = triage.probability(flags.loc[:, list(FEATURES)].to_numpy(dtype=float))
+            flagged = risk >= 0.5
+        else:
+            flagged = flags.loc[:, list(FLAG_COLUMNS)].to_numpy().any(axis=1)
+            risk = flagged.astype(float)
+        part = pd.DataFrame({
+            "sessions": 1,
+            "energy_kwh": flags["El_kWh"],
+            "hours": flags["Duration_hours"],
+            # Widened before summing: a busy station overflows int8 within one chunk
+            **{c: flags[c].astype(np.int64) for c in FLAG_COLUMNS},
+            "flagged": flagged.astype(np.int64),
+            "risk": risk,
+        }, index=chunk.index).groupby(chunk[station_column].to_numpy()).sum()
+        totals = part if totals is None else totals.add(part, fill_value=0)
+        rows += len(chunk)
+        chunks += 1
+
+    elapsed = time.perf_counter() - started
+    stations = [] if totals is None else rank_stations(totals, top)
+    return {
+        "rows_scanned": rows,
+        "chunks": chunks,
+        "stations_seen": 0 if totals is None else len(totals),
+        "model": "triage" if triage is not None else "flags",
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed) if elapsed > 0 else None,
+        "stations": stations,
+    }
+
+
+def rank_stations(totals: pd.DataFrame, top: int):
+    """Top `top` stations by share of flagged sessions, then mean model risk, then volume."""
+    sessions = totals["sessions"]
+    report = pd.DataFrame({
+        "sessions": sessions.astype(int),
+        "flagged_sessions": totals["flagged"].astype(int),
+        "flagged_rate": totals["flagged"] / sessions,
+        "mean_risk": totals["risk"] / sessions,
+        "low_kwh_rate": totals["is_low_kwh"] / sessions,
+        "short_duration_rate": totals["is_short_duration"] / sessions,
+        "frequent_disconnect_rate": totals["is_frequent_connect_disconnect"] / sessions,
+        "mean_kwh": totals["energy_kwh"] / sessions,
+        "mean_hours": totals["hours"] / sessions,
+    })
+    report = report.sort_values(["flagged_rate", "mean_risk", "sessions"], ascending=False).head(top).round(4)
+    return [
+        {"rank": rank, "station": str(station), **record}
+        for rank, (station, record) in enumerate(zip(report.index, report.to_dict("records")), start=1)
+    ]
+
+
+def main(argv=None) -> None:
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Rank the stations in a charging-session log by how likely they need maintenance.")
+    parser.add_argument("log", help="Session log CSV (any size; read in chunks)")
+    parser.add_argument("--station-column", default=settings.FLEET_STATION_COLUMN)
+    parser.add_argument("--chunksize", type=int, default=settings.FLEET_SCAN_CHUNK_ROWS)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--train", help="Labelled log (with is_healthy) to fit the triage model on; flags only if omitted")
+    args = parser.parse_args(argv)
+
+    triage = MaintenanceTriage.fit(pd.read_csv(args.train, usecols=[*FEATURES, "is_healthy"])) if args.train else None
+    print(json.dumps(scan_log(args.log, args.station_column, args.chunksize, triage, args.top), indent=2))
+
+
+if __name__ == "__main__":
+    main()
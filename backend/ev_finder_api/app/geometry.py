@@ -0,0 +1,107 @@
+# app/geometry.py
+
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# Same sphere turfpy's area() uses
+TURF_AREA_RADIUS_M = 6378137.0
+
+
+class PackedRings(NamedTuple):
+    """
+    Closed polygon rings in CSR layout: ring i owns lon/lat[offsets[i]:offsets[i + 1]].
+    """
+    lon: np.ndarray
+    lat: np.ndarray
+    offsets: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+
+def pack_rings(rings: Sequence[Sequence[Tuple[float, float]]]) -> PackedRings:
+    """Packs a list of (lon, lat) rings into flat coordinate arrays plus offsets."""
+    lengths = np.fromiter((len(r) for r in rings), dtype=np.int64, count=len(rings))
+    offsets = np.zeros(len(rings) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.array([c for r in rings for c in r], dtype=np.float64).reshape(-1, 2)
+    return PackedRings(np.ascontiguousarray(flat[:, 0]), np.ascontiguousarray(flat[:, 1]), offsets)
+
+
+def ring_areas(rings: PackedRings) -> np.ndarray:
+    """
+    Spherical area in m² of every ring in one vectorized pass.
+
+    Same formula as turfpy's ring_area (each vertex pairs the longitude span of its
+    neighbours with the sine of its own latitude, wrapping around the ring, closing
+    vertex included), so the result matches area(Feature(Polygon([ring]))). Rings
+    with fewer than 3 coordinates have zero area, as in turfpy.
+    """
+    if len(rings) == 0:
+        return np.zeros(0)
+    lengths = rings.lengths
+    starts = np.repeat(rings.offsets[:-1], lengths)
+    sizes = np.repeat(lengths, lengths)
+    pos = np.arange(len(rings.lon)) - starts
+    middle = starts + (pos + 1) % sizes
+    upper = starts + (pos + 2) % sizes
+
+    lon = np.radians(rings.lon)
+    terms = (lon[upper] - lon) * np.sin(np.radians(rings.lat[middle]))
+    sums = np.zeros(len(rings))
+    nonempty = lengths > 0
+    sums[nonempty] = np.add.reduceat(terms, rings.offsets[:-1][nonempty])
+    sums[lengths <= 2] = 0.0
+    return np.abs(sums) * TURF_AREA_RADIUS_M * TURF_AREA_RADIUS_M / 2
+
+
+def ring_centroids(rings: PackedRings) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean of every vertex per ring (closing vertex included), matching turfpy's centroid()."""
+    lengths = rings.lengths
+    starts = rings.offsets[:-1]
+    lon = np.full(len(rings), np.nan)
+    lat = np.full(len(rings), np.nan)
+    nonempty = lengths > 0
+    lon[nonempty] = np.add.reduceat(rings.lon, starts[nonempty]) / lengths[nonempty]
+    lat[nonempty] = np.add.reduceat(rings.lat, starts[nonempty]) / lengths[nonempty]
+    return lon, lat
+
+
+def points_in_ring(x: np.ndarray, y: np.ndarray, ring_x: np.ndarray, ring_y: np.ndarray) -> np.ndarray:
+    """Even-odd point-in-polygon test of many planar points against one ring (open or closed)."""
+    x, y = np.asarray(x, dtype=np.float64)[:, None], np.asarray(y, dtype=np.float64)[:, None]
+    ax, ay = ring_x, ring_y
+    bx, by = np.roll(ring_x, 1), np.roll(ring_y, 1)
+    crosses = (ay > y) != (by > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_at_y = (bx - ax) * (y - ay) / (by - ay) + ax
+    return (crosses & (x < x_at_y)).sum(axis=1) % 2 == 1
+
+
+def distance_to_ring(x: np.ndarray, y: np.ndarray, ring_x: np.ndarray, ring_y: np.ndarray) -> np.ndarray:
+    """Planar distance from each point to the nearest edge of a ring."""
+    x, y = np.asarray(x, dtype=np.float64)[:, None], np.asarray(y, dtype=np.float64)[:, None]
+    ax, ay = ring_x, ring_y
+    dx, dy = np.roll(ring_x, -1) - ax, np.roll(ring_y, -1) - ay
+    length2 = dx * dx + dy * dy
+    t = np.clip(((x - ax) * dx + (y - ay) * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+    return np.hypot(ax + t * dx - x, ay + t * dy - y).min(axis=1)
+
+
+def turf_area_and_centroid(ring: Sequence[Tuple[float, float]]) -> Tuple[float, Tuple[float, float]]:
+    """
+    Reference implementation for a single ring through geojson/turfpy, the way
+    analyze_locations used to do it. Useful for checking the vectorized kernel; expect
+    small differences on tiny polygons since geojson rounds coordinates to 6 decimals (~0.1 m).
+    """
+    from geojson import Feature, Polygon
+    from turfpy.measurement import area, centroid
+
+    feature = Feature(geometry=Polygon([list(ring)]))
+    lon, lat = centroid(feature)['geometry']['coordinates']
+    return area(feature), (lon, lat)
@@ -0,0 +1,104 @@
+# app/http_clients.py
+
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import httpx
+
+from .logs import get_logger
+
+log = get_logger("http_clients")
+
+# One pooled client per upstream service
+UPSTREAMS = ("overpass", "ocm", "electricity_maps", "openai")
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+# When set, every client sends its requests through this transport instead of the network
+_transport: Optional[httpx.AsyncBaseTransport] = None
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """
+    Routes all upstream traffic through `transport` (a stand-in or recorder for
+    benchmarks), or back to the network with None. Clients built before the call keep
+    their transport, so call it before startup.
+    """
+    global _transport
+    _transport = transport
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_client(name: str) -> httpx.AsyncClient:
+    """A keep-alive client with the pool limits from Settings."""
+    from .config import settings
+
+    http2 = settings.HTTP2_ENABLED
+    if http2 and not _http2_available():
+        log.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1", extra={"upstream": name})
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_S,
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=httpx.Timeout(settings.HTTP_DEFAULT_TIMEOUT_S), transport=_transport)
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """
+    The shared client for an upstream. Normally created in the app lifespan; built on
+    first use otherwise (scripts, tests) so callers never have to check.
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = build_client(name)
+    return client
+
+
+async def startup() -> None:
+    for name in UPSTREAMS:
+        get_client(name)
+
+
+async def shutdown() -> None:
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan that opens the pools on startup and drains them on shutdown."""
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
+
+
+def pool_stats() -> Dict[str, Dict]:
+    """Connections per upstream pool: open, busy (serving a request) and idle (kept alive)."""
+    stats = {}
+    for name, client in _clients.items():
+        entry = {"closed": client.is_closed}
+        # httpx does not expose the pool publicly; read the httpcore pool behind the default transport
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        entry.update({
+            "open": len(connections),
+            "idle": idle,
+            "busy": len(connections) - idle,
+            "max_connections": getattr(pool, "_max_connections", None),
+            "queued_requests": sum(1 for r in getattr(pool, "_requests", []) if r.is_queued()),
+        })
+        stats[name] = entry
+    return stats
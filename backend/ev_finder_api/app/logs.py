@@ -0,0 +1,64 @@
+# app/logs.py
+
+import json
+import logging
+import sys
+import time
+
+ROOT = "ev_finder"
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under the application's root, e.g. get_logger("scheduler") -> ev_finder.scheduler."""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def _fields(record: logging.LogRecord):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD}
+
+
+class TextFormatter(logging.Formatter):
+    """`<time> <LEVEL> <logger> <message> key=value ...`, one line per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        fields = " ".join(f"{key}={value}" for key, value in _fields(record).items())
+        line = f"{stamp} {record.levelname:<7} {record.name} {record.getMessage()}" + (f" {fields}" if fields else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the `extra` fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level: str = "INFO", fmt: str = "text") -> None:
+    """
+    Sends the application's records at `level` and above to stderr, as text or JSON.
+    Per-query and per-call records are DEBUG, so at the default level they cost a level
+    check and nothing else.
+    """
+    root = logging.getLogger(ROOT)
+    root.setLevel(level.upper())
+    root.propagate = False
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else TextFormatter())
+    root.addHandler(handler)
@@ -0,0 +1,296 @@
+# app/metrics.py
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough for a cached tile read and a slow LLM call alike
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    @abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) for every series."""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labels, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """A value read at scrape time from `collect`, which returns (label values, value) pairs."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self):
+        return [("", _format_labels(self.labels, key), value) for key, value in self.collect() if value is not None]
+
+
+class Histogram(_Metric):
+    """Observations per label set, counted into cumulative buckets, with their sum."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        out = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append(("_bucket", _format_labels(self.labels, key, f'le="{_format_value(bound)}"'), cumulative))
+            out.append(("_sum", _format_labels(self.labels, key), total))
+            out.append(("_count", _format_labels(self.labels, key), cumulative))
+        return out
+
+
+def render() -> str:
+    """Every registered metric, in the Prometheus text format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Request-scoped timings, for the Server-Timing header ---
+
+# Seconds per stage name for the request being served; None outside a timed request
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timing() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[Dict[str, float]]:
+    return _timings.get()
+
+
+def use_timings(timings: Optional[Dict[str, float]]) -> None:
+    """Points the current context at another request's timings, e.g. in a worker serving it."""
+    _timings.set(timings)
+
+
+def add_timing(name: str, seconds: float) -> None:
+    # Tasks and threads started by the request copy the context, so they see the same dict;
+    # long-lived tasks must be started with a clean context and use_timings instead
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+# --- The application's metrics ---
+
+STAGE_SECONDS = Histogram(
+    "ev_finder_stage_seconds",
+    "Time spent in each pipeline stage (parse, geometry, scoring, serialization)",
+    ("stage",),
+)
+LAYER_FETCH_SECONDS = Histogram(
+    "ev_finder_layer_fetch_seconds",
+    "Time to get one analysis layer for a request, from whichever source serves it",
+    ("layer",),
+)
+UPSTREAM_SECONDS = Histogram(
+    "ev_finder_upstream_request_seconds",
+    "Upstream HTTP calls including reading the body, by outcome (ok, rate_limited, http_error, network_error)",
+    ("upstream", "outcome"),
+)
+UPSTREAM_RATE_LIMITED = Counter("ev_finder_upstream_rate_limited_total", "HTTP 429 answers from an upstream", ("upstream",))
+UPSTREAM_RETRIES = Counter("ev_finder_upstream_retries_total", "Upstream calls retried after a rate limit, timeout or server error", ("upstream",))
+CACHE_LOOKUPS = Counter("ev_finder_cache_lookups_total", "Cache lookups by cache and result (hit, stale, coalesced, miss)", ("cache", "result"))
+LLM_SECONDS = Histogram("ev_finder_llm_request_seconds", "LLM chat completions, by outcome", ("outcome",))
+LLM_TOKENS = Counter("ev_finder_llm_tokens_total", "LLM tokens used, by kind (prompt, completion)", ("kind",))
+HTTP_SECONDS = Histogram(
+    "ev_finder_http_request_seconds",
+    "API requests, by method, route template and status code",
+    ("method", "route", "status"),
+)
+
+
+def _cache_hit_ratios():
+    with CACHE_LOOKUPS._lock:
+        values = dict(CACHE_LOOKUPS._values)
+    for cache in sorted({key[0] for key in values}):
+        lookups = sum(v for key, v in values.items() if key[0] == cache)
+        # Anything but a miss (a stale answer, a coalesced wait) was served without new work
+        served = lookups - values.get((cache, "miss"), 0.0)
+        yield (cache,), served / lookups if lookups else None
+
+
+CACHE_HIT_RATIO = Gauge("ev_finder_cache_hit_ratio", "Share of lookups answered from the cache since startup", ("cache",), _cache_hit_ratios)
+
+
+def count_cache(cache: str, hits: int, misses: int, stale: int = 0) -> None:
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+    if stale:
+        CACHE_LOOKUPS.inc(stale, cache=cache, result="stale")
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    add_timing(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the block as pipeline stage `name`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def layer_fetch(layer: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        LAYER_FETCH_SECONDS.observe(elapsed, layer=layer)
+        add_timing(f"fetch-{layer}", elapsed)
+
+
+class TimedChunks:
+    """
+    Wraps a streamed body's chunk iterator and adds up the time spent waiting for chunks,
+    so the time spent consuming them (parsing) is the total minus `waited`.
+    """
+
+    def __init__(self, chunks: AsyncIterator[str]):
+        self._chunks = chunks.__aiter__()
+        self.waited = 0.0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        started = time.perf_counter()
+        try:
+            return await self._chunks.__anext__()
+        finally:
+            self.waited += time.perf_counter() - started
+
+
+async def parse_stream(parse, chunks: AsyncIterator[str]):
+    """Runs `parse` over a streamed body, recording the time not spent waiting on the network as the parse stage."""
+    timed = TimedChunks(chunks)
+    started = time.perf_counter()
+    try:
+        return await parse(timed)
+    finally:
+        observe_stage("parse", time.perf_counter() - started - timed.waited)
+
+
+# --- FastAPI wiring ---
+
+def install(app, timing_header: bool) -> None:
+    """
+    Times every request into HTTP_SECONDS and, with `timing_header`, returns that request's
+    stage timings in a Server-Timing header.
+    """
+
+    @app.middleware("http")
+    async def record_request(request, call_next):
+        timings = start_request_timing()
+        started = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(elapsed, method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code)
+        if timing_header:
+            timings["total"] = elapsed
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, TypeAdapter, field_validator, model_validator
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
 class Location(BaseModel):
     lat: float = Field(..., example=9.9816, description="Latitude of the location")
@@ -14,4 +15,74 @@ class CandidateLocation(BaseModel):
     market_gap_m: Optional[float] = Field(None, example=1250.5, description="Distance in meters to the nearest existing charging station.")
     access_to_road_m: Optional[float] = Field(None, example=45.2, description="Distance in meters to the nearest major road.")
     access_to_power_m: Optional[float] = Field(None, example=110.0, description="Distance in meters to the nearest power grid asset.")
-    google_maps_url: str = Field(..., example="https://www.google.com/maps?q=9.9816,76.2999")
\ No newline at end of file
+    google_maps_url: str = Field(..., example="https://www.google.com/maps?q=9.9816,76.2999")
+
+    @classmethod
+    def from_candidate(cls, rank: int, candidate: Dict) -> "CandidateLocation":
+        """Formats one scored candidate from analysis.analyze_locations / analyze_batch."""
+        tags = candidate['tags']
+        site_type_val = tags.get('landuse', tags.get('amenity', 'N/A'))
+        if 'landuse' in tags: site_type = f"landuse={site_type_val}"
+        elif 'amenity' in tags: site_type = f"amenity={site_type_val}"
+        else: site_type = 'N/A'
+
+        return cls(
+            rank=rank,
+            site_type=site_type,
+            location=Location(lat=candidate['center'][0], lon=candidate['center'][1]),
+            area_m2=round(candidate['area'], 2),
+            score_nearby_pois=candidate['pois_nearby'],
+            market_gap_m=round(candidate['distance_from_existing_m'], 1) if candidate.get('distance_from_existing_m') else None,
+            access_to_road_m=round(candidate['distance_to_road_m'], 1) if candidate.get('distance_to_road_m') else None,
+            access_to_power_m=round(candidate['distance_to_power_m'], 1) if candidate.get('distance_to_power_m') else None,
+            google_maps_url=f"https://www.google.com/maps?q={candidate['center'][0]},{candidate['center'][1]}"
+        )
+
+# Serializes a /find-locations answer straight to JSON bytes
+CANDIDATE_LIST = TypeAdapter(List[CandidateLocation])
+
+class BatchSearchRequest(BaseModel):
+    centers: Optional[List[Location]] = Field(None, description="Search centers, e.g. the grid points of a city rollout.")
+    polygon: Optional[List[Location]] = Field(None, min_length=3, max_length=1000, description="Vertices of an area to cover with a grid of search centers instead of listing them.")
+    top_n: int = Field(3, ge=1, le=50, example=3, description="Candidates to return per center.")
+    # A tenth of analysis.SEARCH_RADIUS_M; closer grid points would search the same area
+    grid_spacing_m: Optional[float] = Field(None, ge=500, example=7071.0, description="Spacing of the grid laid over `polygon`, at least 500 m; defaults to the search radius times sqrt(2), which leaves no gaps.")
+
+    @model_validator(mode="after")
+    def one_area(self) -> "BatchSearchRequest":
+        if (self.centers is None) == (self.polygon is None):
+            raise ValueError("Give either `centers` or `polygon`.")
+        if self.centers is not None and not self.centers:
+            raise ValueError("`centers` must not be empty.")
+        return self
+
+class CenterCandidates(BaseModel):
+    center: Location = Field(..., description="The search center.")
+    candidates: List[CandidateLocation] = Field(..., description="Best sites whose nearest center this is, ranked.")
+
+class BatchSearchResponse(BaseModel):
+    centers: List[CenterCandidates]
+    sites: int = Field(..., example=42, description="Distinct viable sites across the whole area.")
+    shared_sites: int = Field(..., example=7, description="Sites within the search radius of more than one center; each is listed only under its nearest center.")
+
+class PriceCurveRequest(BaseModel):
+    zone: Optional[str] = Field(None, example="IN-SO", description="Electricity Maps zone; defaults to CARBON_DEFAULT_ZONE.")
+    start: datetime = Field(..., example="2026-10-10T00:00:00Z", description="First step of the curve.")
+    end: datetime = Field(..., example="2026-10-17T00:00:00Z", description="End of the curve (exclusive).")
+    step_minutes: float = Field(60.0, gt=0, example=15, description="Spacing of the curve.")
+    energy_kwh: Optional[float] = Field(None, gt=0, example=40.0, description="Energy to deliver; when set, the cheapest charging windows are returned.")
+    charger_kw: float = Field(7.4, gt=0, example=7.4, description="Charging power used to size the windows.")
+    windows: int = Field(3, ge=1, le=20, description="How many non-overlapping windows to return, cheapest first.")
+    include_series: bool = Field(True, description="Return the per-step intensity, class and price arrays.")
+
+    @field_validator("start", "end")
+    @classmethod
+    def aware(cls, value: datetime) -> datetime:
+        # A bound without a timezone is UTC, so naive and aware bounds compare
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    @model_validator(mode="after")
+    def ordered(self) -> "PriceCurveRequest":
+        if self.end <= self.start:
+            raise ValueError("`end` must be after `start`.")
+        return self
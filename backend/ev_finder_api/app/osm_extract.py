@@ -0,0 +1,469 @@
+# app/osm_extract.py
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import shutil
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .elements import ElementStore, ElementStoreBuilder, JSONArrayStream
+from .logs import get_logger
+from .tile_cache import clip_to_circles, tile_keys, tiles_covering
+
+log = get_logger("osm_extract")
+
+# The Overpass filters from analysis.LAYER_QUERIES, as (element kind, tag, regex).
+# Overpass `~` matches anywhere in the value, hence re.search; `=` is anchored.
+LAYER_FILTERS = {
+    "spaces": [("way", "landuse", "commercial|industrial"), ("way", "amenity", "^parking$")],
+    "pois": [("node", "amenity", "restaurant|cafe|fast_food|bar|pub|cinema|marketplace|hospital|clinic|pharmacy|bank|fuel|mall|supermarket"),
+             ("node", "shop", "supermarket|convenience|mall")],
+    "power": [("node", "power", "substation|transformer"), ("way", "power", "substation")],
+    "roads": [("way", "highway", "primary|secondary|tertiary|trunk")],
+}
+OSM_LAYERS = tuple(LAYER_FILTERS)
+_COMPILED = {layer: [(kind, tag, re.compile(pattern)) for kind, tag, pattern in filters] for layer, filters in LAYER_FILTERS.items()}
+
+# Layers whose ways are returned as `out center` points rather than with their nodes
+CENTER_LAYERS = ("power",)
+
+DEFAULT_ZOOM = 14
+MANIFEST = "manifest.json"
+
+
+def layers_for(kind: str, tags: Dict) -> List[str]:
+    """Every layer an element with these tags belongs to."""
+    return [
+        layer for layer, filters in _COMPILED.items()
+        if any(kind == k and tag in tags and pattern.search(str(tags[tag])) for k, tag, pattern in filters)
+    ]
+
+
+def coordinate_ids(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Stable negative node ids for coordinates that come without one (GeoJSON geometry),
+    derived from the position at 1e-7° so the same vertex gets the same id in every
+    ingestion run and never collides with a real (positive) OSM node id.
+    """
+    qlon = np.round((np.asarray(lon) + 180.0) * 1e7).astype(np.int64)
+    qlat = np.round((np.asarray(lat) + 90.0) * 1e7).astype(np.int64)
+    return -(qlon * 1_800_000_001 + qlat) - 1
+
+
+def _bbox_center(coords: List[Tuple[float, float]]) -> Dict:
+    lons = [c[0] for c in coords]
+    lats = [c[1] for c in coords]
+    return {"lat": (min(lats) + max(lats)) / 2, "lon": (min(lons) + max(lons)) / 2}
+
+
+# --- Readers ---
+
+class _LayerBuilders:
+    """One ElementStoreBuilder per layer plus the bounds of everything added."""
+
+    def __init__(self):
+        self.builders = {layer: ElementStoreBuilder() for layer in OSM_LAYERS}
+        self.bounds = [90.0, 180.0, -90.0, -180.0]
+
+    def _extend(self, lon: float, lat: float) -> None:
+        b = self.bounds
+        b[0], b[1], b[2], b[3] = min(b[0], lat), min(b[1], lon), max(b[2], lat), max(b[3], lon)
+
+    def add_node(self, node_id: int, lon: float, lat: float, tags: Dict) -> None:
+        for layer in layers_for("node", tags):
+            self.builders[layer].add_node(node_id, lon, lat)
+            self._extend(lon, lat)
+
+    def add_way(self, way_id: int, node_ids: List[int], coords: List[Tuple[float, float]], tags: Dict) -> None:
+        for layer in layers_for("way", tags):
+            builder = self.builders[layer]
+            if layer in CENTER_LAYERS:
+                center = _bbox_center(coords)
+                builder.add_way(way_id, [], tags, center)
+                self._extend(center["lon"], center["lat"])
+                continue
+            for nid, (lon, lat) in zip(node_ids, coords):
+                builder.add_node(nid, lon, lat)
+                self._extend(lon, lat)
+            builder.add_way(way_id, node_ids, tags)
+
+    def build(self) -> Dict[str, ElementStore]:
+        # Way nodes shared by several ways were added once per way
+        stores = {}
+        for layer, builder in self.builders.items():
+            store = builder.build()
+            _, first = np.unique(store.node_id, return_index=True)
+            node_mask = np.zeros(store.node_count, dtype=bool)
+            node_mask[first] = True
+            stores[layer] = store.subset(node_mask, np.ones(store.way_count, dtype=bool))
+        return stores
+
+
+_ID_PATTERN = re.compile(r"^(node|way|relation|area|n|w|r|a)/?(\d+)$")
+
+
+def _feature_id(feature: Dict, props: Dict) -> Tuple[Optional[str], Optional[int]]:
+    """(kind, id) from the id conventions of osmium export, osmtogeojson and Overpass turbo."""
+    raw = feature.get("id", props.get("@id", props.get("id")))
+    kind = props.get("@type")
+    if isinstance(raw, int):
+        return kind, raw
+    match = _ID_PATTERN.match(str(raw)) if raw is not None else None
+    if not match:
+        return kind, None
+    prefix, value = match.group(1)[0], int(match.group(2))
+    if prefix == "a":
+        # osmium areas: 2 * way id, or 2 * relation id + 1
+        return ("relation", value // 2) if value % 2 else ("way", value // 2)
+    return {"n": "node", "w": "way", "r": "relation"}[prefix], value
+
+
+def _feature_tags(props: Dict) -> Dict:
+    if isinstance(props.get("tags"), dict):
+        return props["tags"]
+    return {k: v for k, v in props.items() if not k.startswith("@") and k != "id" and isinstance(v, (str, int, float))}
+
+
+def _outer_rings(geometry: Dict) -> List[List[Tuple[float, float]]]:
+    kind, coords = geometry.get("type"), geometry.get("coordinates") or []
+    if kind == "LineString":
+        return [coords]
+    if kind == "Polygon":
+        return coords[:1]
+    if kind == "MultiPolygon":
+        return [polygon[0] for polygon in coords if polygon]
+    return []
+
+
+def read_geojson(path: Path, chunk_size: int = 1 << 20) -> _LayerBuilders:
+    """
+    Streams a GeoJSON FeatureCollection (e.g. from `osmium export`) feature by feature.
+    Points become nodes; lines and polygon outer rings become ways whose vertices get
+    coordinate_ids(). Features derived from relations are skipped, as the live queries only
+    ask for nodes and ways.
+    """
+    out = _LayerBuilders()
+    parser = JSONArrayStream("features")
+    with open(path, encoding="utf-8") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            for feature in parser.feed(chunk):
+                props = feature.get("properties") or {}
+                geometry = feature.get("geometry") or {}
+                kind, osm_id = _feature_id(feature, props)
+                tags = _feature_tags(props)
+                if geometry.get("type") == "Point":
+                    lon, lat = geometry["coordinates"][:2]
+                    node_id = osm_id if osm_id is not None else int(coordinate_ids(lon, lat))
+                    out.add_node(node_id, lon, lat, tags)
+                    continue
+                if kind == "relation":
+                    continue
+                for ring in _outer_rings(geometry):
+                    coords = [(c[0], c[1]) for c in ring]
+                    if len(coords) < 2:
+                        continue
+                    way_id = osm_id if osm_id is not None else -(zlib.crc32(json.dumps(coords).encode()) + 1)
+                    out.add_way(way_id, coordinate_ids(*np.array(coords).T).tolist(), coords, tags)
+    if parser.truncated:
+        raise ValueError(f"{path} ended inside the features array")
+    return out
+
+
+def read_pbf(path: Path) -> _LayerBuilders:
+    """Reads an OSM PBF extract with pyosmium (optional dependency), keeping real node and way ids."""
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .pbf extracts needs the 'osmium' package (pip install osmium); "
+                           "alternatively convert the extract with `osmium export -f geojson`.")
+
+    out = _LayerBuilders()
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if len(n.tags):
+                out.add_node(n.id, n.location.lon, n.location.lat, {t.k: t.v for t in n.tags})
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if not layers_for("way", tags):
+                return
+            nodes = [nd for nd in w.nodes if nd.location.valid()]
+            out.add_way(w.id, [nd.ref for nd in nodes], [(nd.lon, nd.lat) for nd in nodes], tags)
+
+    Handler().apply_file(str(path), locations=True)
+    return out
+
+
+def read_extract(path: Path) -> _LayerBuilders:
+    name = path.name.lower()
+    if name.endswith(".pbf"):
+        return read_pbf(path)
+    if name.endswith((".geojson", ".json")):
+        return read_geojson(path)
+    raise ValueError(f"Unsupported extract format: {path.name} (expected .osm.pbf or .geojson)")
+
+
+# --- Tile-partitioned layer arrays ---
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(s, e) for every pair, vectorized."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    shift = starts - np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return np.arange(total, dtype=np.int64) + np.repeat(shift, lengths)
+
+
+def _pointers(counts: np.ndarray) -> np.ndarray:
+    ptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    return ptr
+
+
+class TilePartition(NamedTuple):
+    """
+    One layer as flat arrays grouped by tile: tile i owns nodes node_ptr[i]:node_ptr[i + 1],
+    ways way_ptr[i]:way_ptr[i + 1] and the JSON tag list tags[tag_ptr[i]:tag_ptr[i + 1]].
+    A way crossing tiles is stored in each of them with all of its nodes, so every tile
+    is an ElementStore on its own. Saved as one .npy per field and memory-mapped on read.
+    """
+    tiles: np.ndarray
+    node_ptr: np.ndarray
+    way_ptr: np.ndarray
+    tag_ptr: np.ndarray
+    node_id: np.ndarray
+    node_lon: np.ndarray
+    node_lat: np.ndarray
+    way_id: np.ndarray
+    way_offsets: np.ndarray
+    way_refs: np.ndarray
+    way_center_lon: np.ndarray
+    way_center_lat: np.ndarray
+    tags: np.ndarray
+
+    @classmethod
+    def from_store(cls, store: ElementStore, zoom: int) -> "TilePartition":
+        n_nodes, n_ways = max(store.node_count, 1), max(store.way_count, 1)
+        node_tile = tile_keys(store.node_lat, store.node_lon, zoom)
+        center_tile = tile_keys(store.way_center_lat, store.way_center_lon, zoom)
+        ref_index = store.ref_index
+        resolved = ref_index >= 0
+        centered = np.flatnonzero(center_tile >= 0)
+
+        # (tile, way) for every tile a way has a node (or its center) in, sorted by tile
+        way_pairs = np.unique(np.concatenate([
+            node_tile[ref_index[resolved]] * n_ways + store.way_of_ref[resolved],
+            center_tile[centered] * n_ways + centered,
+        ]))
+        pair_tile, pair_way = np.divmod(way_pairs, n_ways)
+        ref_pos = _ranges(store.way_offsets[pair_way], store.way_offsets[pair_way + 1])
+        ref_tile = np.repeat(pair_tile, np.diff(store.way_offsets)[pair_way])
+
+        # (tile, node): all nodes of the ways in a tile, plus free-standing nodes in their own tile
+        ref_node = ref_index[ref_pos]
+        free = np.flatnonzero(~store.referenced_nodes())
+        node_pairs = np.unique(np.concatenate([
+            ref_tile[ref_node >= 0] * n_nodes + ref_node[ref_node >= 0],
+            node_tile[free] * n_nodes + free,
+        ]))
+        node_tile_sorted, node_idx = np.divmod(node_pairs, n_nodes)
+
+        tiles = np.union1d(pair_tile, node_tile_sorted)
+        way_ptr = np.append(np.searchsorted(pair_tile, tiles), len(pair_tile))
+        node_ptr = np.append(np.searchsorted(node_tile_sorted, tiles), len(node_tile_sorted))
+        blobs = [
+            json.dumps([store.way_tags[w] for w in pair_way[s:e].tolist()], separators=(",", ":")).encode()
+            for s, e in zip(way_ptr[:-1].tolist(), way_ptr[1:].tolist())
+        ]
+        return cls(
+            tiles=tiles, node_ptr=node_ptr, way_ptr=way_ptr,
+            tag_ptr=_pointers(np.array([len(b) for b in blobs], dtype=np.int64)),
+            node_id=store.node_id[node_idx], node_lon=store.node_lon[node_idx], node_lat=store.node_lat[node_idx],
+            way_id=store.way_id[pair_way],
+            way_offsets=_pointers(np.diff(store.way_offsets)[pair_way]),
+            way_refs=store.way_refs[ref_pos],
+            way_center_lon=store.way_center_lon[pair_way], way_center_lat=store.way_center_lat[pair_way],
+            tags=np.frombuffer(b"".join(blobs), dtype=np.uint8),
+        )
+
+    def tile_store(self, pos: int) -> ElementStore:
+        """The elements of one tile; the arrays are views into the (memory-mapped) layer."""
+        ns, ne = self.node_ptr[pos], self.node_ptr[pos + 1]
+        ws, we = self.way_ptr[pos], self.way_ptr[pos + 1]
+        offsets = self.way_offsets[ws:we + 1]
+        return ElementStore(
+            self.node_id[ns:ne], self.node_lon[ns:ne], self.node_lat[ns:ne],
+            self.way_id[ws:we], offsets - offsets[0], self.way_refs[offsets[0]:offsets[-1]],
+            self.way_center_lon[ws:we], self.way_center_lat[ws:we],
+            json.loads(self.tags[self.tag_ptr[pos]:self.tag_ptr[pos + 1]].tobytes() or b"[]"),
+        )
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for field in self._fields:
+            np.save(directory / f"{field}.npy", getattr(self, field))
+
+    @classmethod
+    def load(cls, directory: Path) -> "TilePartition":
+        return cls(**{field: np.load(directory / f"{field}.npy", mmap_mode="r") for field in cls._fields})
+
+
+# --- The on-disk store ---
+
+class ExtractStore:
+    """
+    Local, tile-partitioned copy of the OSM layers the analysis needs.
+
+    Every ingested extract keeps its own set of memory-mapped layer arrays, so
+    re-ingesting one region replaces exactly that region's data, and neighbouring
+    extracts sharing border tiles are merged at query time (duplicates removed by id).
+    A new ingestion is written to a fresh directory before manifest.json is swapped,
+    so readers in other workers never see a half-written store and pick the new data
+    up on their next query. The directory it replaces is only deleted by the ingestion
+    after that, and a lock file serializes the manifest updates of concurrent ingestions.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._manifest_mtime: Optional[float] = None
+        self.manifest: Dict = {}
+        self._sources: List[Dict[str, TilePartition]] = []
+
+    @property
+    def exists(self) -> bool:
+        return (self.root / MANIFEST).exists()
+
+    @property
+    def zoom(self) -> int:
+        return self.manifest.get("zoom", DEFAULT_ZOOM)
+
+    @contextmanager
+    def _lock(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        for attempt in range(2):
+            mtime = (self.root / MANIFEST).stat().st_mtime
+            if mtime == self._manifest_mtime:
+                return
+            manifest = json.loads((self.root / MANIFEST).read_text())
+            try:
+                sources = [
+                    {layer: TilePartition.load(self.root / source["dir"] / layer) for layer in OSM_LAYERS}
+                    for source in manifest["sources"].values()
+                ]
+            except FileNotFoundError:
+                # Two ingestions since the manifest was read retired a directory it named;
+                # the manifest has been replaced since, so read it again
+                if attempt:
+                    raise
+                continue
+            self.manifest, self._sources, self._manifest_mtime = manifest, sources, mtime
+            return
+
+    def query(self, layer: str, centers: List[Tuple[float, float]], radius_m: float) -> ElementStore:
+        """Elements of `layer` within `radius_m` of any center, like the live around: queries."""
+        self._refresh()
+        n = 2 ** self.zoom
+        wanted = np.unique([x * n + y for lat, lon in centers for x, y in tiles_covering(lat, lon, radius_m, self.zoom)])
+        stores = []
+        for source in self._sources:
+            part = source[layer]
+            if not len(part.tiles):
+                continue
+            pos = np.searchsorted(part.tiles, wanted)
+            found = pos[(pos < len(part.tiles)) & (part.tiles[np.minimum(pos, len(part.tiles) - 1)] == wanted)]
+            stores.extend(part.tile_store(int(p)) for p in found)
+        return clip_to_circles(ElementStore.concat(stores), centers, radius_m)
+
+    def ingest(self, path: Path, zoom: int = DEFAULT_ZOOM, force: bool = False) -> Optional[Dict]:
+        """
+        Loads an extract into the store, replacing what an earlier ingestion of the same
+        file contributed. Skipped if the file is unchanged (size and mtime) unless `force`.
+        Returns the per-layer element counts, or None when nothing was done.
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        manifest = json.loads((self.root / MANIFEST).read_text()) if self.exists else {"zoom": zoom, "sources": {}}
+        if manifest["zoom"] != zoom:
+            raise ValueError(f"Store was built at zoom {manifest['zoom']}; re-create it to use zoom {zoom}")
+        previous = manifest["sources"].get(str(path))
+        if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime and not force:
+            log.info("extract unchanged; skipping", extra={"extract": path.name, "ingested_at": previous["ingested_at"]})
+            return None
+
+        started = time.time()
+        log.info("reading extract", extra={"extract": path.name})
+        read = read_extract(path)
+        stores = read.build()
+        if not any(len(store) for store in stores.values()):
+            raise ValueError(f"{path.name} has no elements for any of the layers {OSM_LAYERS}")
+
+        directory = f"{path.stem.split('.')[0]}-{zlib.crc32(str(path).encode()):08x}/{time.time_ns()}"
+        counts = {}
+        for layer in OSM_LAYERS:
+            TilePartition.from_store(stores[layer], zoom).save(self.root / directory / layer)
+            counts[layer] = len(stores[layer])
+
+        with self._lock():
+            # Re-read under the lock: another ingestion may have added its source meanwhile
+            manifest = json.loads((self.root / MANIFEST).read_text()) if self.exists else {"zoom": zoom, "sources": {}}
+            if manifest["zoom"] != zoom:
+                shutil.rmtree(self.root / directory, ignore_errors=True)
+                raise ValueError(f"Store was built at zoom {manifest['zoom']}; re-create it to use zoom {zoom}")
+            previous = manifest["sources"].get(str(path))
+            # What the last ingestion replaced is deleted only now: a worker that read the manifest
+            # before that swap may still have been about to map it (and rereads the manifest if
+            # it finds it gone). Files already mapped stay readable after the delete.
+            for retired in manifest.get("retired", []):
+                shutil.rmtree(self.root / retired, ignore_errors=True)
+            manifest["retired"] = [previous["dir"]] if previous else []
+            manifest["sources"][str(path)] = {
+                "size": stat.st_size, "mtime": stat.st_mtime, "ingested_at": time.time(),
+                "dir": directory, "bounds": read.bounds, "elements": counts,
+            }
+            tmp = self.root / f"{MANIFEST}.tmp"
+            tmp.write_text(json.dumps(manifest, indent=2))
+            os.replace(tmp, self.root / MANIFEST)
+        log.info("extract ingested", extra={"extract": path.name, "elapsed_s": round(time.time() - started, 1), **counts})
+        return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .config import settings
+
+    parser = argparse.ArgumentParser(description="Load an OSM extract into the local store used when OSM_SOURCE=extract.")
+    parser.add_argument("extract", type=Path, help="Regional extract (.osm.pbf or .geojson)")
+    parser.add_argument("--store", type=Path, default=settings.OSM_EXTRACT_DIR, help="Store directory")
+    parser.add_argument("--zoom", type=int, default=DEFAULT_ZOOM, help="Tile zoom level of the partitions")
+    parser.add_argument("--force", action="store_true", help="Re-ingest even if the file is unchanged")
+    args = parser.parse_args(argv)
+    started = time.time()
+    counts = ExtractStore(args.store).ingest(args.extract, zoom=args.zoom, force=args.force)
+    if counts is None:
+        print(f"-> {args.extract.name} is unchanged since the last ingestion; skipping (use --force to re-ingest)")
+    else:
+        print(f"-> Ingested {args.extract.name} in {time.time() - started:.1f}s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
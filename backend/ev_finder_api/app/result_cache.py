@@ -0,0 +1,175 @@
+# app/result_cache.py
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Request, Response
+
+from . import metrics
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_cell(lat: float, lon: float, precision: int) -> Tuple[str, Tuple[float, float]]:
+    """The geohash of a point at `precision` characters, and the center of that cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True  # bits alternate longitude, latitude
+    while len(chars) < precision:
+        interval, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    center = ((lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2)
+    return "".join(chars), center
+
+
+class CachedResult(NamedTuple):
+    """A serialized response: JSON body, extra headers, and when the data behind it goes stale (None: never cached)."""
+    body: bytes
+    headers: Dict[str, str]
+    expires_at: Optional[float]
+
+    @property
+    def etag(self) -> str:
+        return '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+
+
+class ResultCache:
+    """
+    Serialized analysis responses keyed on a geohash cell plus the request and analysis
+    parameters. Requests for the same key while one is being computed wait for it
+    instead of starting another analysis. An entry lives until the data it was built
+    from expires; the least recently used entries are evicted beyond `max_entries` or
+    `max_bytes` of bodies.
+    """
+
+    def __init__(self, precision: int, max_entries: int, max_bytes: int):
+        self.precision = precision
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = self.coalesced = self.misses = self.expired = self.evictions = 0
+
+    def cell(self, lat: float, lon: float) -> Tuple[str, Tuple[float, float]]:
+        return geohash_cell(lat, lon, self.precision)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[CachedResult]]) -> Tuple[CachedResult, str]:
+        """The result for `key` and how it was served: "hit", "coalesced" or "miss"."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at is not None and entry.expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_LOOKUPS.inc(cache="results", result="hit")
+                return entry, "hit"
+            self._drop(key)
+            self.expired += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            status = "coalesced"
+            self.coalesced += 1
+        else:
+            status = "miss"
+            self.misses += 1
+            # A task of its own, so the analysis outlives a caller that disconnects
+            task = self._inflight[key] = asyncio.create_task(self._compute(key, compute))
+        metrics.CACHE_LOOKUPS.inc(cache="results", result=status)
+        return await asyncio.shield(task), status
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[CachedResult]]) -> CachedResult:
+        try:
+            result = await compute()
+        finally:
+            self._inflight.pop(key, None)
+        if result.expires_at is not None and result.expires_at > time.time():
+            self._store(key, result)
+        return result
+
+    def _store(self, key: str, result: CachedResult) -> None:
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = result
+        self._bytes += len(result.body)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        result = self._entries.pop(key)
+        self._bytes -= len(result.body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "geohash_precision": self.precision,
+        }
+
+
+def respond(request: Request, result: CachedResult, status: str) -> Response:
+    """
+    The HTTP response for a result: ETag and Cache-Control (max-age until the data
+    expires), and 304 when the client already has this body.
+    """
+    etag = result.etag
+    remaining = int(result.expires_at - time.time()) if result.expires_at is not None else 0
+    headers = {
+        **result.headers,
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={remaining}" if remaining > 0 else "no-cache",
+        "X-Result-Cache": status,
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags) or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(result.body, media_type="application/json", headers=headers)
+
+
+_cache: Optional[ResultCache] = None
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """The process-wide cache built from settings, or None when it is disabled."""
+    global _cache
+    from .config import settings
+
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResultCache(
+            precision=settings.RESULT_CACHE_GEOHASH_PRECISION,
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+        )
+    return _cache
@@ -0,0 +1,123 @@
+# app/routes.py
+
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+
+from . import analysis, http_clients, metrics, result_cache
+from .config import settings
+from .logs import get_logger
+from .models import CANDIDATE_LIST, BatchSearchRequest, BatchSearchResponse, CandidateLocation, CenterCandidates, Location
+
+log = get_logger("routes")
+
+# The site search and metrics endpoints, shared by main.app and boiler_plate.app
+router = APIRouter()
+
+
+@router.get("/find-locations", response_model=List[CandidateLocation], tags=["Analysis"])
+async def find_ev_locations(
+    request: Request,
+    latitude: float = Query(..., ge=-90, le=90, description="The latitude of the search center.", examples=[9.9816]),
+    longitude: float = Query(..., ge=-180, le=180, description="The longitude of the search center.", examples=[76.2999]),
+    top_n: int = Query(3, ge=1, le=50, description="How many candidates to return.")
+):
+    """
+    Analyze a geographic area to find the top N (3 by default) optimal locations for new EV charging stations.
+    With the result cache on, the search runs from the center of the geohash cell the point
+    falls in (RESULT_CACHE_GEOHASH_PRECISION), so nearby requests share one analysis and answer.
+    """
+    if not settings.is_configured:
+        raise HTTPException(status_code=500, detail="Server is not configured with a valid OpenChargeMap API key.")
+    cache = result_cache.get_result_cache()
+    if cache is not None:
+        cell, (latitude, longitude) = cache.cell(latitude, longitude)
+
+    async def compute() -> result_cache.CachedResult:
+        stage_report = {}
+        all_candidates = await analysis.analyze_locations(latitude, longitude, settings.OCM_API_KEY, top_k=top_n, stage_report=stage_report)
+        with metrics.stage("serialization"):
+            body = CANDIDATE_LIST.dump_json([CandidateLocation.from_candidate(i + 1, candidate) for i, candidate in enumerate(all_candidates[:top_n])])
+        headers = {
+            # How many polygons each filter stage dropped, for tuning thresholds
+            "X-Pipeline-Stages": json.dumps(stage_report, separators=(",", ":")),
+            "X-Search-Center": f"{latitude:.6f},{longitude:.6f}",
+        }
+        # An answer built without some layer is served, but never cached
+        expires_at = None if stage_report.get("failed_layers") else await analysis.data_expires_at([(latitude, longitude)])
+        return result_cache.CachedResult(body, headers, expires_at)
+
+    try:
+        if cache is None:
+            result, status = await compute(), "off"
+        else:
+            result, status = await cache.get_or_compute(f"{cell}:{top_n}:{analysis.parameters_fingerprint()}", compute)
+    except Exception as e:
+        log.exception("/find-locations failed", extra={"lat": latitude, "lon": longitude})
+        raise HTTPException(status_code=503, detail=f"An error occurred during analysis: {e}")
+    return result_cache.respond(request, result, status)
+
+
+@router.post("/find-locations/batch", response_model=BatchSearchResponse, tags=["Analysis"])
+async def find_ev_locations_batch(request: BatchSearchRequest):
+    """
+    Find the best sites around many centers at once (or over a polygon covered by a grid
+    of centers). Data is fetched and indexed once for the whole area, and a site shared
+    by several centers is only listed under its nearest one.
+    """
+    if not settings.is_configured:
+        raise HTTPException(status_code=500, detail="Server is not configured with a valid OpenChargeMap API key.")
+    polygon = [(p.lat, p.lon) for p in request.polygon] if request.polygon else None
+    if request.centers:
+        centers = [(c.lat, c.lon) for c in request.centers]
+    else:
+        try:
+            centers = analysis.centers_covering(polygon, request.grid_spacing_m, max_grid_points=settings.BATCH_MAX_CENTERS * analysis.BATCH_GRID_OVERSHOOT)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    if len(centers) > settings.BATCH_MAX_CENTERS:
+        raise HTTPException(status_code=422, detail=f"{len(centers)} search centers requested; at most {settings.BATCH_MAX_CENTERS} are allowed per batch.")
+
+    try:
+        batch = await analysis.analyze_batch(centers, settings.OCM_API_KEY, top_n=request.top_n, polygon=polygon)
+    except Exception as e:
+        log.exception("/find-locations/batch failed", extra={"centers": len(centers)})
+        raise HTTPException(status_code=503, detail=f"An error occurred during analysis: {e}")
+
+    with metrics.stage("serialization"):
+        body = BatchSearchResponse(
+            centers=[
+                CenterCandidates(
+                    center=Location(lat=entry["center"][0], lon=entry["center"][1]),
+                    candidates=[CandidateLocation.from_candidate(i + 1, c) for i, c in enumerate(entry["candidates"])],
+                )
+                for entry in batch["centers"]
+            ],
+            sites=batch["sites"],
+            shared_sites=batch["shared_sites"],
+        ).model_dump_json()
+    headers = {"X-Pipeline-Stages": json.dumps(batch["stage_report"], separators=(",", ":"))}
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/metrics", tags=["Health Check"], response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage, upstream, cache and LLM metrics in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED).")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/metrics/pools", tags=["Health Check"])
+def http_pool_metrics():
+    """Connection usage of the shared outbound HTTP pools."""
+    return http_clients.pool_stats()
+
+
+@router.get("/metrics/result-cache", tags=["Health Check"])
+def result_cache_metrics():
+    """Size and hit, coalesced and miss counts of the /find-locations result cache."""
+    cache = result_cache.get_result_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
@@ -0,0 +1,234 @@
+# app/scheduler.py
+
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from . import metrics
+from .elements import ElementStore, stream_elements
+from .http_clients import get_client
+from .logs import get_logger
+
+log = get_logger("scheduler")
+
+# Lower numbers run first: a single /find-locations search goes ahead of batch searches
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Priority of the queries a request sends; tasks it starts inherit it
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("overpass_priority", default=PRIORITY_INTERACTIVE)
+
+OVERPASS_TIMEOUT_S = 120.0
+
+
+class TokenBucket:
+    """Async token bucket; `pause` holds every caller back, e.g. after a 429."""
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate = rate_per_s
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    await asyncio.sleep(self.resume_at - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OverpassScheduler:
+    """
+    Owns all outbound Overpass traffic for the process.
+
+    Queries wait in a priority queue (see `priority`) and are sent by a fixed number of workers, each
+    taking a token from a shared bucket first, so the configured rate holds across
+    every concurrent API request. A 429 pauses the bucket and retries after Overpass'
+    Retry-After, or with jittered exponential backoff, never waiting more than
+    `backoff_max_s`. Identical queries already in flight share a single upstream call.
+    """
+
+    def __init__(self, url: str, rate_per_s: float, burst: int, max_concurrency: int, max_retries: int,
+                 backoff_base_s: float = 2.0, backoff_max_s: float = 60.0, client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.client = client
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Best priority each in-flight query is queued at, until a worker takes it
+        self._queued: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_workers(self) -> None:
+        if not self._workers:
+            # A clean context each, so workers don't keep the first request's state (e.g. its timings)
+            self._workers = [asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(self.max_concurrency)]
+
+    async def close(self) -> None:
+        """Stops the workers; queries still queued or in flight fail with CancelledError."""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        while not self._queue.empty():
+            *_, future, _ = self._queue.get_nowait()
+            future.cancel()
+        self._queued.clear()
+
+    async def run(self, query: str, name: str, priority: Optional[int] = None) -> Optional[ElementStore]:
+        """
+        Elements of an Overpass query, or None if it failed after all retries. Queued at
+        `priority`, by default the one set with `priority()` for the calling request.
+        """
+        if priority is None:
+            priority = _priority.get()
+        future = self._inflight.get(query)
+        metrics.CACHE_LOOKUPS.inc(cache="overpass_inflight", result="coalesced" if future is not None else "miss")
+        if future is not None:
+            log.debug("joining in-flight overpass query", extra={"query": name})
+            if priority < self._queued.get(query, priority):
+                # Still waiting behind other work: queue it again at the joining caller's priority
+                self._queued[query] = priority
+                await self._queue.put((priority, next(self._seq), query, name, future, metrics.current_timings()))
+            return await asyncio.shield(future)
+
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[query] = future
+        self._queued[query] = priority
+        future.add_done_callback(lambda _: self._inflight.pop(query, None))
+        await self._queue.put((priority, next(self._seq), query, name, future, metrics.current_timings()))
+        return await asyncio.shield(future)
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, query, name, future, timings = await self._queue.get()
+            if future.done() or self._queued.pop(query, None) is None:
+                # An earlier entry for the same query was taken by another worker
+                self._queue.task_done()
+                continue
+            # The parse time goes to the request that queued the query
+            metrics.use_timings(timings)
+            try:
+                result = await self._execute(query, name)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                log.warning("overpass query failed", extra={"query": name, "error": repr(e)})
+                result = None
+            if not future.done():
+                future.set_result(result)
+            self._queue.task_done()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            wait_s = float(retry_after)
+        else:
+            wait_s = self.backoff_base_s * (2 ** attempt) * random.uniform(0.5, 1.5)
+        # A long Retry-After would hold a worker, and every caller sharing the query, for that long
+        return min(wait_s, self.backoff_max_s)
+
+    async def _execute(self, query: str, name: str) -> Optional[ElementStore]:
+        client = self.client if self.client is not None else get_client("overpass")
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            log.debug("overpass query started", extra={"query": name, "attempt": attempt + 1})
+            started = time.perf_counter()
+            try:
+                # Stream the body into the element store instead of holding the whole JSON document
+                async with client.stream("POST", self.url, data={"data": query}, timeout=OVERPASS_TIMEOUT_S) as response:
+                    if response.status_code == 429:
+                        wait_time = self._backoff(attempt, response)
+                        metrics.UPSTREAM_RATE_LIMITED.inc(upstream="overpass")
+                        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="overpass", outcome="rate_limited")
+                        if attempt < self.max_retries - 1:
+                            metrics.UPSTREAM_RETRIES.inc(upstream="overpass")
+                            log.info("overpass rate limited", extra={"query": name, "wait_s": round(wait_time, 1)})
+                            self.bucket.pause(wait_time)
+                            continue
+                        break
+
+                    if response.is_error:
+                        log.warning("overpass query failed", extra={"query": name, "status": response.status_code})
+                        metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="overpass", outcome="http_error")
+                        return None
+                    store = await metrics.parse_stream(stream_elements, response.aiter_text())
+            except httpx.RequestError as e:
+                log.warning("overpass query failed", extra={"query": name, "error": repr(e)})
+                metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="overpass", outcome="network_error")
+                return None
+            metrics.UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="overpass", outcome="ok")
+            log.debug("overpass query finished", extra={"query": name, "elements": len(store)})
+            return store
+
+        log.warning("overpass query failed", extra={"query": name, "attempts": self.max_retries})
+        return None
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Queues the Overpass queries sent inside the block, and by tasks started in it, at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+_scheduler: Optional[OverpassScheduler] = None
+
+
+def get_scheduler() -> OverpassScheduler:
+    """The scheduler for the running event loop, built from settings on first use."""
+    global _scheduler
+    from .analysis import overpass_url
+    from .config import settings
+
+    loop = asyncio.get_running_loop()
+    if _scheduler is None or _scheduler.loop is not loop:
+        _scheduler = OverpassScheduler(
+            overpass_url,
+            rate_per_s=settings.OVERPASS_RATE_PER_S,
+            burst=settings.OVERPASS_BURST,
+            max_concurrency=settings.OVERPASS_MAX_CONCURRENCY,
+            max_retries=settings.OVERPASS_MAX_RETRIES,
+            backoff_max_s=settings.OVERPASS_MAX_BACKOFF_S,
+        )
+        _scheduler.loop = loop
+    return _scheduler
+
+
+async def shutdown() -> None:
+    """Stops the scheduler's workers; called from the app lifespan before the HTTP clients close."""
+    global _scheduler
+    if _scheduler is not None and _scheduler.loop is asyncio.get_running_loop():
+        await _scheduler.close()
+    _scheduler = None
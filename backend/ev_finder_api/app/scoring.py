@@ -0,0 +1,227 @@
+# app/scoring.py
+
+import asyncio
+import heapq
+import multiprocessing
+import pickle
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .spatial import LatLon, LocalProjection, PointIndex, SegmentIndex
+
+
+class ScoringParams(NamedTuple):
+    """The analysis thresholds, passed along with each job so worker processes need no settings."""
+    max_distance_to_power_m: float
+    max_distance_to_road_m: float
+    min_pois_nearby: int
+    poi_search_radius_m: float
+    min_distance_from_existing_station_m: float
+    nearest_index_cell_m: float
+
+
+class ScoringJob(NamedTuple):
+    """
+    Everything needed to score a batch of candidate spaces, as plain picklable data.
+    `spaces` holds (center (lat, lon), area in m², OSM tags) for polygons that already
+    passed the area filter; `road_lines` are lists of (lon, lat).
+    """
+    origin: LatLon
+    params: ScoringParams
+    station_coords: List[LatLon]
+    poi_coords: List[LatLon]
+    power_coords: List[LatLon]
+    road_lines: List[List[Tuple[float, float]]]
+    spaces: List[Tuple[LatLon, float, Dict]]
+    top_k: Optional[int] = None
+
+
+def candidate_sort_key(x: Dict):
+    """Most POIs first, then the biggest market gap, then closest road and power."""
+    return (-x['pois_nearby'], -(x['distance_from_existing_m'] or -1), (x['distance_to_road_m'] or sys.maxsize), (x['distance_to_power_m'] or sys.maxsize))
+
+
+# Filter stages in the order they run, cheapest and most selective first.
+# "area" is applied before scoring, as a vectorized mask over all polygons.
+STAGES = ("area", "market_gap", "pois", "power", "road")
+
+
+def empty_stage_report() -> Dict:
+    return {"polygons": 0, "dropped": dict.fromkeys(STAGES, 0), "viable": 0}
+
+
+def merge_stage_reports(reports: List[Dict]) -> Dict:
+    merged = empty_stage_report()
+    for report in reports:
+        merged["polygons"] += report["polygons"]
+        merged["viable"] += report["viable"]
+        for stage, count in report["dropped"].items():
+            merged["dropped"][stage] += count
+    return merged
+
+
+class _Indexes(NamedTuple):
+    """The spatial indexes a job's spaces are scored against."""
+    stations: PointIndex
+    pois: PointIndex
+    power: PointIndex
+    roads: SegmentIndex
+
+
+def build_indexes(job: ScoringJob) -> _Indexes:
+    """Spatial indexes are built once so each candidate only looks at nearby points."""
+    p = job.params
+    projection = LocalProjection(job.origin)
+    return _Indexes(
+        stations=PointIndex(job.station_coords, projection, p.nearest_index_cell_m),
+        pois=PointIndex(job.poi_coords, projection, p.poi_search_radius_m),
+        power=PointIndex(job.power_coords, projection, p.nearest_index_cell_m),
+        roads=SegmentIndex(job.road_lines, projection),
+    )
+
+
+def score_spaces(job: ScoringJob) -> Tuple[List[Dict], Dict]:
+    """
+    Runs every space in the job through the filter pipeline and returns the viable
+    ones best first (at most job.top_k), plus how many spaces each stage dropped.
+    """
+    return _score_with(job.params, build_indexes(job), job.spaces, job.top_k)
+
+
+def _score_with(p: ScoringParams, indexes: _Indexes, spaces: List[Tuple[LatLon, float, Dict]], top_k: Optional[int]) -> Tuple[List[Dict], Dict]:
+    """
+    Each stage only asks the cheapest question that decides it (is any station
+    closer than the market gap, are there at least MIN_POIS_NEARBY POIs, ...) and
+    drops the space on the first failure. Exact distances and the full POI count are
+    only computed for survivors, which go straight into a bounded top-k heap.
+    """
+    report = empty_stage_report()
+    report["polygons"] = len(spaces)
+    dropped = report["dropped"]
+    station_index, poi_index, power_index, road_index = indexes
+
+    def survivors():
+        for space_center, surface_area, tags in spaces:
+            if station_index.count_within(space_center, p.min_distance_from_existing_station_m, limit=1, inclusive=False):
+                dropped["market_gap"] += 1
+                continue
+            if poi_index.count_within(space_center, p.poi_search_radius_m, limit=p.min_pois_nearby) < p.min_pois_nearby:
+                dropped["pois"] += 1
+                continue
+            # An area without any mapped power assets does not rule a site out
+            if len(power_index) and not power_index.count_within(space_center, p.max_distance_to_power_m, limit=1):
+                dropped["power"] += 1
+                continue
+            # inf when no road segment lies within max_distance_to_road_m
+            min_dist_to_road = road_index.nearest_within(space_center, p.max_distance_to_road_m)
+            if min_dist_to_road is not None and min_dist_to_road > p.max_distance_to_road_m:
+                dropped["road"] += 1
+                continue
+
+            report["viable"] += 1
+            yield {
+                "center": space_center,
+                "area": surface_area,
+                "pois_nearby": poi_index.count_within(space_center, p.poi_search_radius_m),
+                "distance_to_power_m": power_index.nearest(space_center),
+                "distance_to_road_m": min_dist_to_road,
+                "distance_from_existing_m": station_index.nearest(space_center),
+                "tags": tags,
+            }
+
+    if top_k is not None:
+        top_candidates = heapq.nsmallest(top_k, survivors(), key=candidate_sort_key)
+    else:
+        top_candidates = sorted(survivors(), key=candidate_sort_key)
+    return top_candidates, report
+
+
+def merge_top_k(parts: List[List[Dict]], top_k: Optional[int]) -> List[Dict]:
+    """Merges already sorted partial results into one ranking."""
+    merged = heapq.merge(*parts, key=candidate_sort_key)
+    return list(merged)[:top_k] if top_k is not None else list(merged)
+
+
+# --- Execution off the event loop ---
+#
+# A job's coordinates and road lines are the bulk of its size and the same for every
+# chunk, so they are pickled once into shared memory. Tasks carry only the name of that
+# block and a slice of spaces; each worker builds the indexes the first time it sees a
+# job and keeps the last few around for the job's remaining chunks.
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+# Per worker process: indexes of recently seen jobs, keyed by shared memory block name
+_worker_jobs: "OrderedDict[str, Tuple[ScoringParams, _Indexes]]" = OrderedDict()
+_WORKER_JOBS_KEPT = 4
+
+
+def _init_worker() -> None:
+    _worker_jobs.clear()
+
+
+def _job_indexes(block_name: str) -> Tuple[ScoringParams, _Indexes]:
+    entry = _worker_jobs.get(block_name)
+    if entry is not None:
+        _worker_jobs.move_to_end(block_name)
+        return entry
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        job = pickle.loads(block.buf)
+    finally:
+        block.close()
+    entry = _worker_jobs[block_name] = (job.params, build_indexes(job))
+    while len(_worker_jobs) > _WORKER_JOBS_KEPT:
+        _worker_jobs.popitem(last=False)
+    return entry
+
+
+def _score_chunk(block_name: str, spaces: List[Tuple[LatLon, float, Dict]], top_k: Optional[int]) -> Tuple[List[Dict], Dict]:
+    params, indexes = _job_indexes(block_name)
+    return _score_with(params, indexes, spaces, top_k)
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the parent is a running event loop with threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def score_candidates(job: ScoringJob, workers: int, chunk_size: int) -> Tuple[List[Dict], Dict]:
+    """
+    Scores a job without blocking the event loop.
+
+    With workers == 0 the job runs in the default thread pool. Otherwise the spaces are
+    split into chunks of `chunk_size`, scored in parallel in a process pool of `workers`
+    processes, and the partial top-k lists and stage reports are merged. The rest of the
+    job reaches each worker once, through shared memory, rather than with every chunk.
+    """
+    loop = asyncio.get_running_loop()
+    if workers <= 0:
+        return await loop.run_in_executor(None, score_spaces, job)
+
+    pool = get_process_pool(workers)
+    data = pickle.dumps(job._replace(spaces=[]), protocol=pickle.HIGHEST_PROTOCOL)
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        block.buf[:len(data)] = data
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, _score_chunk, block.name, job.spaces[i:i + chunk_size], job.top_k)
+            for i in range(0, max(len(job.spaces), 1), chunk_size)
+        ))
+    finally:
+        block.close()
+        block.unlink()
+    return merge_top_k([c for c, _ in parts], job.top_k), merge_stage_reports([r for _, r in parts])
@@ -0,0 +1,355 @@
+# app/station_store.py
+
+import argparse
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+from .elements import ElementStore, ElementStoreBuilder
+from .http_clients import get_client
+from .logs import get_logger
+from .tile_cache import circle_bounds, clip_to_circles
+
+log = get_logger("station_store")
+
+Bounds = Tuple[float, float, float, float]  # south, west, north, east
+
+# OCM submission states at or above this are delisted/removed and drop out of the store
+OCM_DELISTED_STATUS = 1000
+
+
+class StationStore:
+    """
+    Local copy of OpenChargeMap stations for the configured sync regions, in SQLite with
+    an R*Tree index on position so a radius lookup never goes upstream and is never
+    capped by OCM's maxresults. Shared by every worker on the host, like the tile cache.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS stations ("
+            " id INTEGER PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, modified TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS regions ("
+            " name TEXT PRIMARY KEY, south REAL, west REAL, north REAL, east REAL,"
+            " last_modified TEXT, synced_at REAL, full_synced_at REAL, lease_until REAL NOT NULL DEFAULT 0)"
+        )
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS stations_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)")
+            self.rtree = True
+        except sqlite3.OperationalError:
+            # SQLite built without R*Tree: a B-tree on latitude still narrows the scan
+            conn.execute("CREATE INDEX IF NOT EXISTS stations_lat ON stations (lat, lon)")
+            self.rtree = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; calls arrive through asyncio.to_thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Reads ---
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM stations").fetchone()[0]
+
+    def covers(self, bounds: Bounds) -> bool:
+        """True when a region that has completed at least one sync contains the whole box."""
+        south, west, north, east = bounds
+        row = self._connect().execute(
+            "SELECT 1 FROM regions WHERE synced_at IS NOT NULL AND south <= ? AND west <= ? AND north >= ? AND east >= ? LIMIT 1",
+            (south, west, north, east),
+        ).fetchone()
+        return row is not None
+
+    def within(self, centers: Sequence[Tuple[float, float]], radius_m: float) -> ElementStore:
+        """Stations within `radius_m` of any center, as a point store keyed by OCM ID."""
+        conn = self._connect()
+        builder = ElementStoreBuilder()
+        seen = set()
+        for lat, lon in centers:
+            south, west, north, east = circle_bounds(lat, lon, radius_m)
+            if self.rtree:
+                rows = conn.execute(
+                    "SELECT s.id, s.lat, s.lon FROM stations_rtree r JOIN stations s ON s.id = r.id"
+                    " WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?",
+                    (north, south, east, west),
+                )
+            else:
+                rows = conn.execute(
+                    "SELECT id, lat, lon FROM stations WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ?",
+                    (south, north, west, east),
+                )
+            for station_id, s_lat, s_lon in rows:
+                if station_id not in seen:
+                    seen.add(station_id)
+                    builder.add_node(station_id, s_lon, s_lat)
+        return clip_to_circles(builder.build(), centers, radius_m)
+
+    # --- Writes (sync job) ---
+
+    def apply(self, pois: Iterable[Dict]) -> Tuple[int, int]:
+        """Upserts OCM POIs and deletes delisted ones. Returns (upserted, deleted)."""
+        upserts, deletes = [], []
+        for poi in pois:
+            address = poi.get("AddressInfo") or {}
+            if (poi.get("SubmissionStatusTypeID") or 0) >= OCM_DELISTED_STATUS or address.get("Latitude") is None:
+                deletes.append((poi["ID"],))
+            else:
+                upserts.append((poi["ID"], address["Latitude"], address["Longitude"], poi.get("DateLastStatusUpdate") or poi.get("DateCreated")))
+        conn = self._connect()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO stations VALUES (?, ?, ?, ?)", upserts)
+            conn.executemany("DELETE FROM stations WHERE id = ?", deletes)
+            if self.rtree:
+                conn.executemany("INSERT OR REPLACE INTO stations_rtree VALUES (?, ?, ?, ?, ?)", [(i, la, la, lo, lo) for i, la, lo, _ in upserts])
+                conn.executemany("DELETE FROM stations_rtree WHERE id = ?", deletes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(upserts), len(deletes)
+
+    def region(self, name: str) -> Optional[Dict]:
+        row = self._connect().execute("SELECT south, west, north, east, last_modified, synced_at, full_synced_at FROM regions WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return {"bounds": row[:4], "last_modified": row[4], "synced_at": row[5], "full_synced_at": row[6]}
+
+    def acquire_lease(self, name: str, bounds: Bounds, seconds: float) -> bool:
+        """Claims a region for syncing so only one worker on the host pages through OCM for it."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO regions (name, south, west, north, east) VALUES (?, ?, ?, ?, ?)", (name, *bounds))
+            old = conn.execute("SELECT south, west, north, east FROM regions WHERE name = ?", (name,)).fetchone()
+            if tuple(old) != tuple(bounds):
+                # A region whose bounds changed in the config starts over with a full sync, and
+                # stations it leaves behind that no other region covers are dropped with it
+                conn.execute(
+                    "UPDATE regions SET south = ?, west = ?, north = ?, east = ?, last_modified = NULL, synced_at = NULL, full_synced_at = NULL"
+                    " WHERE name = ?",
+                    (*bounds, name),
+                )
+                old_south, old_west, old_north, old_east = old
+                gone = [(row[0],) for row in conn.execute(
+                    "SELECT id FROM stations s WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? AND NOT EXISTS"
+                    " (SELECT 1 FROM regions r WHERE s.lat BETWEEN r.south AND r.north AND s.lon BETWEEN r.west AND r.east)",
+                    (old_south, old_north, old_west, old_east),
+                )]
+                conn.executemany("DELETE FROM stations WHERE id = ?", gone)
+                if self.rtree:
+                    conn.executemany("DELETE FROM stations_rtree WHERE id = ?", gone)
+                log.info("station region bounds changed", extra={"region": name, "dropped": len(gone)})
+            cursor = conn.execute("UPDATE regions SET lease_until = ? WHERE name = ? AND lease_until < ?", (now + seconds, name, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def retain_regions(self, names: Iterable[str]) -> int:
+        """
+        Forgets every region not in `names` (no longer configured, so never synced again),
+        with the stations only it covered. Returns how many stations were dropped.
+        """
+        names = set(names)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = [row for row in conn.execute("SELECT name, south, west, north, east FROM regions") if row[0] not in names]
+            conn.executemany("DELETE FROM regions WHERE name = ?", [(row[0],) for row in removed])
+            gone = set()
+            for _, south, west, north, east in removed:
+                gone.update(row[0] for row in conn.execute(
+                    "SELECT id FROM stations s WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? AND NOT EXISTS"
+                    " (SELECT 1 FROM regions r WHERE s.lat BETWEEN r.south AND r.north AND s.lon BETWEEN r.west AND r.east)",
+                    (south, north, west, east),
+                ))
+            conn.executemany("DELETE FROM stations WHERE id = ?", [(i,) for i in gone])
+            if self.rtree:
+                conn.executemany("DELETE FROM stations_rtree WHERE id = ?", [(i,) for i in gone])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if removed:
+            log.info("station regions no longer configured", extra={"regions": [row[0] for row in removed], "dropped": len(gone)})
+        return len(gone)
+
+    def prune(self, bounds: Bounds, seen_ids: Iterable[int]) -> int:
+        """After a full sync: deletes stations in the region that OCM no longer returned."""
+        south, west, north, east = bounds
+        conn = self._connect()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM seen")
+        conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((i,) for i in seen_ids))
+        gone = [row[0] for row in conn.execute(
+            "SELECT id FROM stations WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? AND id NOT IN (SELECT id FROM seen)",
+            (south, north, west, east),
+        )]
+        self.apply({"ID": i, "SubmissionStatusTypeID": OCM_DELISTED_STATUS} for i in gone)
+        return len(gone)
+
+    def finish_sync(self, name: str, last_modified: str, full: bool) -> None:
+        now = time.time()
+        self._connect().execute(
+            "UPDATE regions SET last_modified = ?, synced_at = ?, full_synced_at = CASE WHEN ? THEN ? ELSE full_synced_at END,"
+            " lease_until = 0 WHERE name = ?",
+            (last_modified, now, full, now, name),
+        )
+
+    def release_lease(self, name: str) -> None:
+        self._connect().execute("UPDATE regions SET lease_until = 0 WHERE name = ?", (name,))
+
+
+# --- Sync from OpenChargeMap ---
+
+async def sync_region(store: StationStore, name: str, bounds: Bounds, api_key: str, page_size: int, full_interval_s: float) -> Optional[Dict]:
+    """
+    Pages through every OCM POI in the region that changed since the last sync, in ID
+    order so a page boundary never skips or repeats a record. Every `full_interval_s` (and
+    the first time) all POIs are fetched instead, and stations OCM no longer returns are
+    pruned, since a modified-since query does not report removals.
+    Returns counts, or None if another worker holds the region's lease.
+    """
+    from .analysis import ocm_api_url
+
+    if not await asyncio.to_thread(store.acquire_lease, name, bounds, 15 * 60):
+        return None
+    state = await asyncio.to_thread(store.region, name)
+    full = not state["last_modified"] or not state["full_synced_at"] or time.time() - state["full_synced_at"] > full_interval_s
+    started = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    south, west, north, east = bounds
+    params = {
+        'output': 'json', 'compact': 'true', 'verbose': 'false', 'key': api_key,
+        'boundingbox': f"({north},{west}),({south},{east})", 'sortby': 'id_asc', 'maxresults': page_size,
+    }
+    if not full:
+        params['modifiedsince'] = state["last_modified"]
+
+    upserted = deleted = pages = 0
+    last_id = 0
+    seen = set()
+    try:
+        while True:
+            response = await get_client("ocm").get(ocm_api_url, params={**params, 'greaterthanid': last_id}, timeout=60.0)
+            response.raise_for_status()
+            page = response.json()
+            pages += 1
+            if not page:
+                break
+            u, d = await asyncio.to_thread(store.apply, page)
+            upserted, deleted = upserted + u, deleted + d
+            seen.update(poi["ID"] for poi in page)
+            last_id = max(poi["ID"] for poi in page)
+            if len(page) < page_size:
+                break
+        if full:
+            deleted += await asyncio.to_thread(store.prune, bounds, seen)
+    except BaseException:
+        await asyncio.to_thread(store.release_lease, name)
+        raise
+    # Next time only ask for what changed after this run started
+    await asyncio.to_thread(store.finish_sync, name, started, full)
+    result = {"region": name, "full": full, "pages": pages, "upserted": upserted, "deleted": deleted}
+    log.info("station sync finished", extra=result)
+    return result
+
+
+async def sync_all(store: StationStore, regions: Dict[str, Sequence[float]], api_key: str, page_size: int, full_interval_s: float) -> List[Dict]:
+    await asyncio.to_thread(store.retain_regions, regions)
+    results = []
+    for name, bounds in regions.items():
+        try:
+            result = await sync_region(store, name, tuple(bounds), api_key, page_size, full_interval_s)
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning("station sync failed", extra={"region": name, "error": repr(e)})
+            continue
+        if result is not None:
+            results.append(result)
+    return results
+
+
+async def run_periodic_sync(store: StationStore, regions: Dict[str, Sequence[float]], api_key: str, page_size: int,
+                            interval_s: float, full_interval_s: float) -> None:
+    while True:
+        try:
+            await sync_all(store, regions, api_key, page_size, full_interval_s)
+        except Exception:
+            log.exception("station sync crashed")
+        await asyncio.sleep(interval_s)
+
+
+_store: Optional[StationStore] = None
+
+
+def get_station_store() -> Optional[StationStore]:
+    """The process-wide store built from settings, or None when no sync regions are configured."""
+    global _store
+    from .config import settings
+
+    if not settings.STATION_SYNC_REGIONS:
+        return None
+    if _store is None:
+        _store = StationStore(settings.STATION_STORE_PATH)
+    return _store
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Runs the periodic station sync in the background while the app is up."""
+    from .config import settings
+
+    store = get_station_store()
+    task = None
+    if store is not None:
+        # Even when syncing is left to the CLI, a region dropped from the config stops covering searches
+        await asyncio.to_thread(store.retain_regions, settings.STATION_SYNC_REGIONS)
+    if store is not None and settings.STATION_SYNC_INTERVAL_S > 0:
+        task = asyncio.create_task(run_periodic_sync(
+            store, settings.STATION_SYNC_REGIONS, settings.OCM_API_KEY,
+            settings.STATION_SYNC_PAGE_SIZE, settings.STATION_SYNC_INTERVAL_S, settings.STATION_SYNC_FULL_INTERVAL_S,
+        ))
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .config import settings
+    from .logs import configure
+
+    configure(settings.LOG_LEVEL, settings.LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Sync OpenChargeMap stations for STATION_SYNC_REGIONS into the local store once (e.g. from cron).")
+    parser.add_argument("--full", action="store_true", help="Fetch every station again and prune the ones OCM no longer lists")
+    args = parser.parse_args(argv)
+    store = get_station_store()
+    if store is None:
+        raise SystemExit("STATION_SYNC_REGIONS is empty; nothing to sync")
+    full_interval_s = 0 if args.full else settings.STATION_SYNC_FULL_INTERVAL_S
+    asyncio.run(sync_all(store, settings.STATION_SYNC_REGIONS, settings.OCM_API_KEY, settings.STATION_SYNC_PAGE_SIZE, full_interval_s))
+
+
+if __name__ == "__main__":
+    main()
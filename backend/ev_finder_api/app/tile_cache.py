@@ -0,0 +1,244 @@
+# app/tile_cache.py
+
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .elements import ElementStore
+
+Tile = Tuple[int, int]
+
+# Bumped whenever the payload encoding changes; older databases are dropped on open
+SCHEMA_VERSION = 2
+
+# --- Slippy-map tile math ---
+
+def tile_of(lat: float, lon: float, zoom: int) -> Tile:
+    n = 2 ** zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(tile: Tile, zoom: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a tile, in the order Overpass bbox filters expect."""
+    n = 2 ** zoom
+    x, y = tile
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def circle_bounds(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of the bounding box of a search circle."""
+    dlat = radius_m / 111320.0
+    dlon = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def tiles_covering(lat: float, lon: float, radius_m: float, zoom: int) -> List[Tile]:
+    """Every tile touching the bounding box of the search circle."""
+    south, west, north, east = circle_bounds(lat, lon, radius_m)
+    x0, y0 = tile_of(north, west, zoom)
+    x1, y1 = tile_of(south, east, zoom)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def union_bounds(tiles: Iterable[Tile], zoom: int) -> Tuple[float, float, float, float]:
+    bounds = [tile_bounds(t, zoom) for t in tiles]
+    return min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds)
+
+
+def tile_keys(lat: np.ndarray, lon: np.ndarray, zoom: int) -> np.ndarray:
+    """Vectorized tile_of, packed as x * 2**zoom + y; -1 where the coordinate is missing (nan)."""
+    n = 2 ** zoom
+    valid = ~np.isnan(lat)
+    lat = np.clip(np.where(valid, lat, 0.0), -85.0511, 85.0511)
+    x = np.clip(((np.where(valid, lon, 0.0) + 180.0) / 360.0 * n).astype(np.int64), 0, n - 1)
+    y = np.clip(((1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0 * n).astype(np.int64), 0, n - 1)
+    return np.where(valid, x * n + y, -1)
+
+
+# --- Splitting responses into tiles and putting them back together ---
+
+def split_by_tile(store: ElementStore, tiles: Iterable[Tile], zoom: int) -> Dict[Tile, ElementStore]:
+    """
+    Buckets a response into the given tiles. Free-standing nodes and `out center` ways
+    go to the tile their point sits in. A way also goes to every tile one of its nodes
+    sits in, together with all of its nodes, so each tile can be served on its own.
+    Elements outside `tiles` are dropped.
+    """
+    n = 2 ** zoom
+    node_tile = tile_keys(store.node_lat, store.node_lon, zoom)
+    center_tile = tile_keys(store.way_center_lat, store.way_center_lon, zoom)
+    ref_index = store.ref_index
+    resolved = ref_index >= 0
+    ref_tile = node_tile[ref_index[resolved]]
+    ref_way = store.way_of_ref[resolved]
+    free_nodes = ~store.referenced_nodes()
+
+    buckets: Dict[Tile, ElementStore] = {}
+    for x, y in tiles:
+        key = x * n + y
+        way_mask = center_tile == key
+        way_mask[ref_way[ref_tile == key]] = True
+        node_mask = store.nodes_of_ways(way_mask) | (free_nodes & (node_tile == key))
+        buckets[(x, y)] = store.subset(node_mask, way_mask)
+    return buckets
+
+
+def merge_tiles(payloads: Iterable[ElementStore]) -> ElementStore:
+    """Concatenates tile payloads, dropping ways/nodes/stations that appear in several tiles."""
+    return ElementStore.concat(list(payloads))
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; broadcasts over numpy arrays."""
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(np.radians(lon2 - lon1) / 2) ** 2
+    return 2 * 6371008.8 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def clip_to_circles(store: ElementStore, centers: Iterable[Tuple[float, float]], radius_m: float) -> ElementStore:
+    """
+    Approximates Overpass `around:` filters on assembled tiles: points must be inside
+    one of the circles, ways need a node (or their center) inside one and keep all of
+    their nodes.
+    """
+    node_inside = np.zeros(store.node_count, dtype=bool)
+    way_mask = np.zeros(store.way_count, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        for lat, lon in centers:
+            node_inside |= haversine_m(lat, lon, store.node_lat, store.node_lon) <= radius_m
+            way_mask |= haversine_m(lat, lon, store.way_center_lat, store.way_center_lon) <= radius_m
+    ref_index = store.ref_index
+    resolved = ref_index >= 0
+    way_mask[store.way_of_ref[resolved][node_inside[ref_index[resolved]]]] = True
+    node_mask = store.nodes_of_ways(way_mask) | (node_inside & ~store.referenced_nodes())
+    return store.subset(node_mask, way_mask)
+
+
+# --- On-disk store ---
+
+class TileCache:
+    """
+    Parsed upstream elements per (layer key, tile), stored in SQLite so every uvicorn
+    worker on the host shares one cache. Payloads are ElementStore arrays, so a hit
+    is decoded without going through JSON. Entries expire after `ttl_s` and the least
+    recently used ones are evicted once the payloads exceed `max_bytes`.
+    """
+
+    def __init__(self, path: Path, ttl_s: float, max_bytes: int, zoom: int):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.zoom = zoom
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS tiles")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tiles ("
+                " layer TEXT NOT NULL, z INTEGER NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL, payload BLOB NOT NULL,"
+                " PRIMARY KEY (layer, z, x, y))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; calls arrive through asyncio.to_thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, layer: str, tiles: List[Tile]) -> Dict[Tile, ElementStore]:
+        """Fresh cached payloads for whichever of `tiles` are present."""
+        if not tiles:
+            return {}
+        conn = self._connect()
+        now = time.time()
+        found: Dict[Tile, ElementStore] = {}
+        rows = conn.execute(
+            f"SELECT x, y, payload FROM tiles WHERE layer = ? AND z = ? AND fetched_at >= ? AND (x, y) IN ({','.join('(?, ?)' for _ in tiles)})",
+            [layer, self.zoom, now - self.ttl_s, *[c for t in tiles for c in t]],
+        ).fetchall()
+        for x, y, payload in rows:
+            found[(x, y)] = ElementStore.from_bytes(payload)
+        if found:
+            conn.executemany(
+                "UPDATE tiles SET accessed_at = ? WHERE layer = ? AND z = ? AND x = ? AND y = ?",
+                [(now, layer, self.zoom, x, y) for x, y in found],
+            )
+        return found
+
+    def expires_at(self, layer: str, tiles: List[Tile]) -> Optional[float]:
+        """When the first of `tiles` expires, or None if any of them is not (freshly) cached."""
+        if not tiles:
+            return None
+        now = time.time()
+        count, oldest = self._connect().execute(
+            f"SELECT COUNT(*), MIN(fetched_at) FROM tiles WHERE layer = ? AND z = ? AND fetched_at >= ? AND (x, y) IN ({','.join('(?, ?)' for _ in tiles)})",
+            [layer, self.zoom, now - self.ttl_s, *[c for t in tiles for c in t]],
+        ).fetchone()
+        return oldest + self.ttl_s if count == len(set(tiles)) else None
+
+    def put_many(self, layer: str, payloads: Dict[Tile, ElementStore]) -> None:
+        if not payloads:
+            return
+        conn = self._connect()
+        now = time.time()
+        rows = []
+        for (x, y), store in payloads.items():
+            blob = store.to_bytes()
+            rows.append((layer, self.zoom, x, y, now, now, len(blob), blob))
+        conn.executemany("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM tiles WHERE fetched_at < ?", (now - self.ttl_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for rowid, size in conn.execute("SELECT rowid, size FROM tiles ORDER BY accessed_at"):
+            victims.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM tiles WHERE rowid = ?", victims)
+
+
+_cache: Optional[TileCache] = None
+
+
+def get_tile_cache() -> Optional[TileCache]:
+    """The process-wide cache built from settings, or None when it is disabled."""
+    global _cache
+    from .config import settings
+
+    if not settings.TILE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = TileCache(
+            settings.TILE_CACHE_PATH,
+            ttl_s=settings.TILE_CACHE_TTL_S,
+            max_bytes=settings.TILE_CACHE_MAX_MB * 1024 * 1024,
+            zoom=settings.TILE_CACHE_ZOOM,
+        )
+    return _cache
@@ -0,0 +1,220 @@
+# app/triage.py
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .logs import get_logger
+
+log = get_logger("triage")
+
+# Bumped whenever the artifact layout changes; older artifacts are rebuilt
+ARTIFACT_VERSION = 1
+
+# The session features the LLM prompt shows, in model order
+FEATURES = ("El_kWh", "Duration_hours", "is_frequent_connect_disconnect", "is_low_kwh", "is_short_duration")
+FLAG_REASONS = {
+    "is_frequent_connect_disconnect": "Connection issues",
+    "is_low_kwh": "Low energy delivered",
+    "is_short_duration": "Short sessions",
+}
+
+
+class TriageResult(NamedTuple):
+    """Per-session verdicts; `confident` marks the ones that need no LLM call."""
+    needs_maintenance: np.ndarray
+    confidence: np.ndarray
+    confident: np.ndarray
+    seconds: float
+
+    def report(self) -> Dict:
+        sessions = len(self.confidence)
+        decided = int(self.confident.sum())
+        return {
+            "sessions": sessions,
+            "decided_locally": decided,
+            "escalated": sessions - decided,
+            "seconds": round(self.seconds, 6),
+            "sessions_per_s": round(sessions / self.seconds) if self.seconds > 0 else None,
+        }
+
+
+def feature_matrix(sessions) -> np.ndarray:
+    """(n, 5) float array from a DataFrame or a list of session dicts."""
+    if isinstance(sessions, list):
+        return np.array([[s[f] for f in FEATURES] for s in sessions], dtype=float).reshape(-1, len(FEATURES))
+    return sessions.loc[:, list(FEATURES)].to_numpy(dtype=float)
+
+
+class MaintenanceTriage:
+    """
+    Logistic regression over the session features, fitted on the labelled charging log.
+    Scores a whole batch with one matrix product, so thousands of sessions take
+    milliseconds; sessions it is unsure about (confidence below `min_confidence`) are left
+    for the LLM.
+    """
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, weights: np.ndarray, bias: float,
+                 min_confidence: float, accuracy: Optional[float] = None):
+        self.mean = mean
+        self.scale = scale
+        self.weights = weights
+        self.bias = bias
+        self.min_confidence = min_confidence
+        self.accuracy = accuracy
+
+    @classmethod
+    def fit(cls, df, min_confidence: float = 0.9, l2: float = 1.0, iterations: int = 25) -> "MaintenanceTriage":
+        """
+        Fits on a DataFrame with the FEATURES and an `is_healthy` label by Newton's method;
+        the L2 penalty keeps the weights finite when the log is perfectly separable.
+        """
+        x = feature_matrix(df)
+        y = (df["is_healthy"].to_numpy() == 0).astype(float)  # 1 = needs maintenance
+        mean = x.mean(axis=0)
+        scale = x.std(axis=0)
+        scale[scale == 0] = 1.0
+        z = np.hstack([(x - mean) / scale, np.ones((len(x), 1))])
+
+        beta = np.zeros(z.shape[1])
+        penalty = np.full(z.shape[1], l2)
+        penalty[-1] = 0.0  # no shrinkage on the intercept
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-(z @ beta)))
+            gradient = z.T @ (p - y) + penalty * beta
+            hessian = (z * (p * (1 - p))[:, None]).T @ z + np.diag(penalty) + 1e-9 * np.eye(z.shape[1])
+            step = np.linalg.solve(hessian, gradient)
+            beta -= step
+            if np.abs(step).max() < 1e-8:
+                break
+
+        model = cls(mean, scale, beta[:-1], float(beta[-1]), min_confidence)
+        model.accuracy = float(((model.probability(x) >= 0.5) == (y == 1)).mean()) if len(y) else None
+        return model
+
+    def to_dict(self) -> Dict:
+        return {
+            "mean": self.mean.tolist(), "scale": self.scale.tolist(), "weights": self.weights.tolist(),
+            "bias": self.bias, "accuracy": self.accuracy,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, min_confidence: float) -> "MaintenanceTriage":
+        return cls(np.array(data["mean"]), np.array(data["scale"]), np.array(data["weights"]), float(data["bias"]),
+                   min_confidence, data.get("accuracy"))
+
+    def probability(self, x: np.ndarray) -> np.ndarray:
+        """P(needs maintenance) per row of a feature matrix."""
+        logits = ((x - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-np.clip(logits, -50, 50)))
+
+    def classify(self, sessions) -> TriageResult:
+        started = time.perf_counter()
+        p = self.probability(feature_matrix(sessions))
+        needs_maintenance = p >= 0.5
+        confidence = np.where(needs_maintenance, p, 1.0 - p)
+        return TriageResult(needs_maintenance, confidence, confidence >= self.min_confidence, time.perf_counter() - started)
+
+
+def local_verdict(session: Dict, needs_maintenance: bool) -> Dict:
+    """The LLM's response fields for a session decided locally."""
+    if not needs_maintenance:
+        return {"needs_maintenance": False, "reason": "Operating normally", "estimated_life_months": None}
+    reasons: List[str] = [text for flag, text in FLAG_REASONS.items() if session.get(flag)]
+    return {
+        "needs_maintenance": True,
+        "reason": ", ".join(reasons) or "Performance degradation",
+        "estimated_life_months": None,
+    }
+
+
+# --- Precomputed artifact: the fitted model and the two few-shot examples ---
+
+class MaintenanceModel(NamedTuple):
+    triage: MaintenanceTriage
+    healthy_example: Dict
+    faulty_example: Dict
+    sessions: int
+    from_artifact: bool
+
+
+def default_artifact_path(log_path: Path) -> Path:
+    return Path(log_path).with_suffix(".triage.json")
+
+
+def _source_signature(log_path: Path) -> Optional[Dict]:
+    try:
+        stat = Path(log_path).stat()
+    except FileNotFoundError:
+        return None
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_artifact(log_path: Path) -> Dict:
+    """Fits the model on the labelled log, reading only the model's columns, and keeps the first healthy and faulty rows."""
+    import pandas as pd  # heavy; only needed when the artifact is (re)built
+
+    df = pd.read_csv(log_path, usecols=[*FEATURES, "is_healthy"])
+    examples = {}
+    for name, label in (("healthy_example", 1), ("faulty_example", 0)):
+        rows = df[df["is_healthy"] == label]
+        if rows.empty:
+            raise ValueError(f"{log_path} has no rows with is_healthy == {label}")
+        examples[name] = {k: (v.item() if hasattr(v, "item") else v) for k, v in rows.iloc[0].items()}
+    return {
+        "version": ARTIFACT_VERSION,
+        "source": _source_signature(log_path),
+        "sessions": len(df),
+        "model": MaintenanceTriage.fit(df).to_dict(),
+        **examples,
+    }
+
+
+def load_maintenance_model(log_path: Path, artifact_path: Optional[Path], min_confidence: float) -> MaintenanceModel:
+    """
+    The triage model and few-shot examples, from the artifact when it matches the log
+    (or the log is absent, e.g. a slim deploy that ships only the artifact); otherwise
+    rebuilt from the log and written back.
+    """
+    artifact_path = Path(artifact_path) if artifact_path else default_artifact_path(log_path)
+    source = _source_signature(log_path)
+    data = None
+    if artifact_path.exists():
+        data = json.loads(artifact_path.read_text())
+        if data.get("version") != ARTIFACT_VERSION or (source is not None and data.get("source") != source):
+            data = None
+    from_artifact = data is not None
+    if data is None:
+        if source is None:
+            raise FileNotFoundError(f"Neither {log_path} nor a usable {artifact_path} exists")
+        data = build_artifact(log_path)
+        try:
+            tmp = artifact_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, artifact_path)
+        except OSError as e:
+            log.warning("could not write the triage artifact", extra={"path": str(artifact_path), "error": str(e)})
+    return MaintenanceModel(
+        MaintenanceTriage.from_dict(data["model"], min_confidence),
+        data["healthy_example"], data["faulty_example"], data["sessions"], from_artifact,
+    )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute the maintenance triage artifact from the labelled session log.")
+    parser.add_argument("log", help="Labelled log, e.g. smart_charging_log.csv")
+    parser.add_argument("--out", help="Artifact path (default: next to the log, .triage.json)")
+    args = parser.parse_args(argv)
+    out = Path(args.out) if args.out else default_artifact_path(args.log)
+    data = build_artifact(args.log)
+    out.write_text(json.dumps(data))
+    print(f"-> Wrote {out}: {data['sessions']} sessions, training accuracy {data['model']['accuracy']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# app/verdict_cache.py
+
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+FLAGS = ("is_frequent_connect_disconnect", "is_low_kwh", "is_short_duration")
+
+
+def verdict_key(session: Dict, kwh_bin: float, hours_bin: float) -> str:
+    """
+    The bucket a session falls in: binned energy and duration plus the three flags.
+    Sessions in the same bucket look the same to the model, so they share a verdict.
+    """
+    kwh = math.floor(float(session["El_kWh"]) / kwh_bin)
+    hours = math.floor(float(session["Duration_hours"]) / hours_bin)
+    flags = "".join("1" if session.get(flag) else "0" for flag in FLAGS)
+    return f"{kwh}:{hours}:{flags}"
+
+
+class _Remembered(NamedTuple):
+    """An in-memory entry: the verdict and when it expires."""
+    expires_at: float
+    verdict: Dict
+
+
+class VerdictCache:
+    """
+    LLM maintenance verdicts per feature bucket. An in-process LRU answers repeat buckets
+    without leaving the worker; with a `path`, entries are also written to SQLite so they
+    survive restarts and are shared by every worker on the host (the LRU then sits in
+    front of it). Entries expire after `ttl_s`; each tier keeps at most `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float, kwh_bin: float, hours_bin: float, path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.kwh_bin = kwh_bin
+        self.hours_bin = hours_bin
+        self.path = Path(path) if path else None
+        self._memory: "OrderedDict[str, _Remembered]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = self.disk_hits = self.misses = self.expired = self.evictions = 0
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " key TEXT PRIMARY KEY, verdict TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connect().execute("CREATE INDEX IF NOT EXISTS verdicts_accessed ON verdicts (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; calls arrive through asyncio.to_thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def key(self, session: Dict) -> str:
+        return verdict_key(session, self.kwh_bin, self.hours_bin)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict]:
+        """Fresh verdicts for whichever keys are cached, from memory first, then disk."""
+        now = time.time()
+        found: Dict[str, Dict] = {}
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                if entry.expires_at < now:
+                    del self._memory[key]
+                    self.expired += 1
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = entry.verdict
+
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing and self.path is not None:
+            conn = self._connect()
+            rows = conn.execute(
+                f"SELECT key, verdict, expires_at FROM verdicts WHERE expires_at >= ? AND key IN ({','.join('?' for _ in missing)})",
+                [now, *missing],
+            ).fetchall()
+            if rows:
+                conn.executemany("UPDATE verdicts SET accessed_at = ? WHERE key = ?", [(now, key) for key, _, _ in rows])
+                with self._lock:
+                    for key, verdict, expires_at in rows:
+                        found[key] = json.loads(verdict)
+                        self._remember(key, expires_at, found[key])
+                    self.disk_hits += len(rows)
+
+        with self._lock:
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, verdicts: Dict[str, Dict]) -> None:
+        if not verdicts:
+            return
+        now = time.time()
+        expires_at = now + self.ttl_s
+        with self._lock:
+            for key, verdict in verdicts.items():
+                self._remember(key, expires_at, verdict)
+        if self.path is not None:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(verdict), expires_at, now) for key, verdict in verdicts.items()],
+            )
+            conn.execute("DELETE FROM verdicts WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM verdicts WHERE key IN (SELECT key FROM verdicts ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _remember(self, key: str, expires_at: float, verdict: Dict) -> None:
+        # Caller holds the lock
+        self._memory[key] = _Remembered(expires_at, verdict)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "backend": "sqlite" if self.path is not None else "memory",
+        }
+
+
+_cache: Optional[VerdictCache] = None
+
+
+def get_verdict_cache() -> Optional[VerdictCache]:
+    """The process-wide cache built from settings, or None when it is disabled."""
+    global _cache
+    from .config import settings
+
+    if not settings.VERDICT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = VerdictCache(
+            max_entries=settings.VERDICT_CACHE_MAX_ENTRIES,
+            ttl_s=settings.VERDICT_CACHE_TTL_S,
+            kwh_bin=settings.VERDICT_CACHE_KWH_BIN,
+            hours_bin=settings.VERDICT_CACHE_HOURS_BIN,
+            path=settings.VERDICT_CACHE_PATH,
+        )
+    return _cache
@@ -0,0 +1,27 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# The app packages live next to this directory; settings need an OCM key to load
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OCM_API_KEY", "test")
+
+
+class Clock:
+    """A settable stand-in for time.time."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock.time)
+    return clock
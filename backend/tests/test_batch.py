@@ -0,0 +1,48 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ev_finder_api.app import analysis, routes
+from ev_finder_api.app.config import settings
+
+# About 20 x 20 km around Kochi, and a square 20 degrees wide
+KOCHI = [(9.9, 76.2), (9.9, 76.4), (10.1, 76.4), (10.1, 76.2)]
+HUGE = [(0.0, 60.0), (0.0, 80.0), (20.0, 80.0), (20.0, 60.0)]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def batch(client, polygon, **body):
+    return client.post("/find-locations/batch", json={"polygon": [{"lat": lat, "lon": lon} for lat, lon in polygon], **body})
+
+
+def test_grid_covers_polygon():
+    centers = analysis.centers_covering(KOCHI, max_grid_points=settings.BATCH_MAX_CENTERS)
+    assert 4 <= len(centers) <= settings.BATCH_MAX_CENTERS
+    assert all(9.8 < lat < 10.2 and 76.1 < lon < 76.5 for lat, lon in centers)
+
+
+def test_grid_over_limit_is_refused_unbuilt(monkeypatch):
+    def meshgrid(*args):
+        raise AssertionError("grid built")
+
+    monkeypatch.setattr(analysis.np, "meshgrid", meshgrid)
+    with pytest.raises(ValueError, match="points; at most 100 are allowed"):
+        analysis.centers_covering(HUGE, max_grid_points=100)
+
+
+def test_huge_polygon_is_rejected(client):
+    response = batch(client, HUGE)
+    assert response.status_code == 422
+    assert "grid over this polygon" in response.json()["detail"]
+
+
+def test_tiny_grid_spacing_is_rejected(client):
+    response = batch(client, KOCHI, grid_spacing_m=0.001)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "grid_spacing_m"]
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from benchmarks import fixtures
+from benchmarks.site_finder import NOISE_FLOOR, compare
+from benchmarks.standin import StandInTransport
+from ev_finder_api.app import analysis, http_clients, scheduler
+from ev_finder_api.app.config import settings
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    # The settings benchmarks.site_finder runs under, undone after the test
+    for name, value in (("TILE_CACHE_ENABLED", False), ("RESULT_CACHE_ENABLED", False), ("OSM_SOURCE", "overpass"),
+                        ("STATION_SYNC_REGIONS", {}), ("OVERPASS_RATE_PER_S", 1e6), ("OVERPASS_BURST", 1_000_000)):
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(http_clients, "_clients", {})
+    transport = StandInTransport(fixtures.encode(fixtures.synthetic(spaces=20, pois=50, power=10, roads=10, stations=5)))
+    http_clients.use_transport(transport)
+    yield transport
+    http_clients.use_transport(None)
+
+
+def test_standin_answers_every_layer_the_app_fetches(standin):
+    async def main():
+        try:
+            return await analysis.fetch_layers([fixtures.DEFAULT_CENTER], "key")
+        finally:
+            await scheduler.shutdown()
+            await http_clients.shutdown()
+
+    layers = asyncio.run(main())
+    assert set(standin.requests) == set(fixtures.LAYERS)
+    assert all(len(layers[layer]) for layer in fixtures.LAYERS)
+
+
+def test_scaled_fixture_repeats_every_element():
+    base = fixtures.synthetic(spaces=20, pois=50, power=10, roads=10, stations=5)
+    tripled = fixtures.scaled(base, 3)
+    for layer in fixtures.LAYERS:
+        assert len(tripled.layers[layer]) == 3 * len(base.layers[layer])
+        ids = [e.get("ID") if layer == "stations" else (e["type"], e["id"]) for e in tripled.layers[layer]]
+        assert len(set(ids)) == len(ids)
+
+
+def test_fixture_round_trips_through_disk(tmp_path):
+    fixture = fixtures.synthetic(spaces=5, pois=5, power=2, roads=2, stations=2)
+    fixtures.save(fixture, tmp_path)
+    assert fixtures.load(tmp_path).layers == fixture.layers
+
+
+def results(**latency_ms):
+    return {"scales": {"1": {"elements": {"pois": 10}, "latency_ms": latency_ms}}}
+
+
+def test_compare_flags_regressions_past_threshold_and_noise():
+    rows = compare(results(p50=100.0, p90=2.0, p99=200.0), results(p50=105.0, p90=2.0 + NOISE_FLOOR / 2, p99=300.0), 0.1)
+    flagged = {row["metric"]: row["regressed"] for row in rows}
+    # p50 is within the threshold; p90 is 25% worse but by less than the noise floor
+    assert flagged == {"latency_ms.p50": False, "latency_ms.p90": False, "latency_ms.p99": True}
+    assert all(row["same_data"] for row in rows)
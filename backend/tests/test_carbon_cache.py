@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from ev_finder_api.app.carbon_cache import CarbonIntensityCache, CarbonUpstreamError
+
+
+class Upstream:
+    """Answers with an increasing reading per call; zones in `failing` answer 502."""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+
+    async def __call__(self, zone):
+        self.calls.append(zone)
+        await asyncio.sleep(0.01)
+        if zone in self.failing:
+            raise CarbonUpstreamError(502, f"{zone} unavailable")
+        return {"zone": zone, "carbonIntensity": len(self.calls)}
+
+
+def make_cache(upstream, **options):
+    return CarbonIntensityCache(upstream, ["IN-SO"], max_age_s=60, max_stale_s=600, refresh_interval_s=0, **options)
+
+
+def test_concurrent_misses_share_one_call(clock):
+    upstream = Upstream()
+    cache = make_cache(upstream)
+
+    async def main():
+        return await asyncio.gather(*(cache.get("IN-SO") for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert upstream.calls == ["IN-SO"]
+    assert all(data["carbonIntensity"] == 1 and not meta["stale"] for data, meta in results)
+
+
+def test_stale_value_is_served_while_it_refreshes(clock):
+    upstream = Upstream()
+    cache = make_cache(upstream)
+
+    async def main():
+        await cache.get("IN-SO")
+        clock.now += 120
+        data, meta = await cache.get("IN-SO")
+        assert data["carbonIntensity"] == 1 and meta["stale"] and meta["age_s"] == 120
+        await asyncio.sleep(0.05)
+        return await cache.get("IN-SO")
+
+    data, meta = asyncio.run(main())
+    assert data["carbonIntensity"] == 2 and not meta["stale"]
+
+
+def test_failed_refresh_keeps_the_stale_value(clock):
+    upstream = Upstream()
+    cache = make_cache(upstream)
+
+    async def main():
+        await cache.get("IN-SO")
+        upstream.failing.add("IN-SO")
+        clock.now += 120
+        await cache.get("IN-SO")
+        await asyncio.sleep(0.05)
+        served = await cache.get("IN-SO")
+        clock.now += 600
+        with pytest.raises(CarbonUpstreamError):
+            await cache.get("IN-SO")
+        return served
+
+    data, meta = asyncio.run(main())
+    assert data["carbonIntensity"] == 1 and meta["stale"] and meta["refresh_error"] == "IN-SO unavailable"
+
+
+def test_requested_zones_are_bounded(clock):
+    upstream = Upstream()
+    upstream.failing.add("XX")
+    cache = make_cache(upstream, max_requested_zones=2)
+
+    async def main():
+        for zone in ("DE", "FR", "DE", "ES"):
+            clock.now += 1
+            await cache.get(zone)
+        with pytest.raises(CarbonUpstreamError):
+            await cache.get("XX")
+        await cache.refresh_all()
+
+    asyncio.run(main())
+    # FR was requested least recently; an unknown zone is never kept
+    assert sorted(cache.snapshot()) == ["DE", "ES", "IN-SO"]
+    assert upstream.calls.count("XX") == 1
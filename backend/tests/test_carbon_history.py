@@ -0,0 +1,58 @@
+import math
+from datetime import timezone
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from ev_finder_api.app.carbon_history import CarbonHistoryStore, cheapest_windows
+from ev_finder_api.app.models import PriceCurveRequest
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = CarbonHistoryStore(tmp_path)
+    store.append("IN-SO", [100, 200, 300], [400.0, 500.0, 600.0])
+    return store
+
+
+def test_append_keeps_only_newer_readings(history):
+    assert history.append("IN-SO", [300, 250, 400, 400], [1.0, 2.0, 700.0, 3.0]) == 1
+    times, values = history.series("IN-SO")
+    assert times.tolist() == [100, 200, 300, 400]
+    assert values.tolist() == [400.0, 500.0, 600.0, 700.0]
+
+
+def test_lookup_takes_the_reading_in_effect(history):
+    result = history.lookup("IN-SO", [50, 100, 150, 300, 350, 361], max_gap_s=60)
+    assert np.isnan(result[0])
+    assert result[1:5].tolist() == [400.0, 400.0, 600.0, 600.0]
+    # More than max_gap_s after the last reading
+    assert np.isnan(result[5])
+    assert np.isnan(history.lookup("DE", [100], 60)).all()
+
+
+def test_cheapest_windows_skip_unknown_steps_and_overlaps():
+    prices = np.array([5.0, 5.0, np.nan, 5.0, 6.5, 14.0, 8.5, 8.5])
+    # Two 1 kW steps of an hour each deliver 2 kWh
+    windows = cheapest_windows(prices, 3600, 2.0, 1.0, 3)
+    assert windows == [
+        {"start_step": 0, "steps": 2, "cost": 10.0},
+        {"start_step": 3, "steps": 2, "cost": 11.5},
+        {"start_step": 6, "steps": 2, "cost": 17.0},
+    ]
+
+
+def test_cheapest_windows_price_the_last_step_partially():
+    # 1 kWh at 14.0 then half a kWh at 6.5 is dearer than 1 kWh at 5.0 then half at 14.0
+    [window] = cheapest_windows(np.array([5.0, 14.0, 6.5]), 3600, 1.5, 1.0, 1)
+    assert window == {"start_step": 0, "steps": 2, "cost": 12.0}
+    assert cheapest_windows(np.array([5.0]), 3600, 2.0, 1.0, 1) == []
+
+
+def test_price_curve_request_mixes_naive_and_aware_bounds():
+    request = PriceCurveRequest(start="2026-10-10T00:00:00", end="2026-10-17T00:00:00Z")
+    assert request.start.tzinfo == timezone.utc
+    assert math.isclose((request.end - request.start).total_seconds(), 7 * 86400)
+    with pytest.raises(ValidationError, match="must be after"):
+        PriceCurveRequest(start="2026-10-17T00:00:00", end="2026-10-17T00:00:00Z")
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from benchmarks import fixtures
+from ev_finder_api.app.elements import ElementStoreBuilder, JSONArrayStream, stream_elements, stream_ocm_stations
+
+SAMPLE = (Path(__file__).parent / "data" / "overpass_parking.json").read_text(encoding="utf-8")
+
+
+def parse(text, chunks, key="elements"):
+    """Objects the stream yields for `text` cut at the given offsets, and the finished parser."""
+    parser = JSONArrayStream(key)
+    objects = []
+    cuts = [0, *chunks, len(text)]
+    for start, end in zip(cuts, cuts[1:]):
+        objects.extend(parser.feed(text[start:end]))
+    return objects, parser
+
+
+async def chunked(text, size):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def build_from_json(elements):
+    builder = ElementStoreBuilder()
+    for el in elements:
+        builder.add(el)
+    return builder.build()
+
+
+def assert_same_store(a, b):
+    for name in ("node_id", "node_lon", "node_lat", "way_id", "way_offsets", "way_refs", "way_center_lon", "way_center_lat"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name), err_msg=name)
+    assert a.way_tags == b.way_tags
+
+
+def test_whole_body_matches_json_loads():
+    objects, parser = parse(SAMPLE, [])
+    assert objects == json.loads(SAMPLE)["elements"]
+    assert parser.done and not parser.truncated
+
+
+def test_every_split_point_matches_json_loads():
+    # One cut anywhere: inside keys, strings, escapes, non-ASCII text, numbers and exponents
+    expected = json.loads(SAMPLE)["elements"]
+    for cut in range(1, len(SAMPLE)):
+        objects, parser = parse(SAMPLE, [cut])
+        assert objects == expected, f"cut at {cut}: {SAMPLE[max(cut - 10, 0):cut]!r}|{SAMPLE[cut:cut + 10]!r}"
+        assert parser.done
+
+
+def test_one_character_chunks():
+    objects, parser = parse(SAMPLE, list(range(1, len(SAMPLE))))
+    assert objects == json.loads(SAMPLE)["elements"]
+    assert parser.done
+
+
+@pytest.mark.parametrize("body,key", [
+    ('{"version":0.6,"elements":[]}', "elements"),
+    ('{"version": 0.6, "elements": [ \n ], "remark": "timeout"}', "elements"),
+    ("[]", None),
+    (" [ ] ", None),
+])
+def test_empty_array(body, key):
+    for cut in range(len(body) + 1):
+        objects, parser = parse(body, [cut], key)
+        assert objects == []
+        assert parser.done and not parser.truncated
+
+
+def test_truncated_body():
+    cut = SAMPLE.index('"type": "relation"')
+    objects, parser = parse(SAMPLE[:cut], [])
+    assert len(objects) == 6
+    assert parser.truncated
+    with pytest.raises(ValueError):
+        asyncio.run(stream_elements(chunked(SAMPLE[:cut], 64)))
+
+
+def test_no_array_at_all():
+    objects, parser = parse('{"remark": "runtime error: query timed out"}', [7])
+    assert objects == [] and not parser.done and not parser.truncated
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 4096])
+def test_stream_elements_matches_json_loads(size):
+    store = asyncio.run(stream_elements(chunked(SAMPLE, size)))
+    assert_same_store(store, build_from_json(json.loads(SAMPLE)["elements"]))
+    assert store.node_count == 4 and store.way_count == 2
+
+
+def test_fixture_bodies_match_json_loads():
+    """The stand-in bodies of the benchmark fixture, cut into random chunk sizes."""
+    rng = random.Random(9)
+    bodies = fixtures.encode(fixtures.synthetic(spaces=60, pois=200, power=20, roads=30, stations=15))
+    for layer, body in bodies.items():
+        text = body.decode()
+        cuts = sorted(rng.sample(range(1, len(text)), 200))
+        if layer == "stations":
+            objects, _ = parse(text, cuts, None)
+            assert objects == json.loads(text)
+            store = asyncio.run(stream_ocm_stations(chunked(text, 333)))
+            assert store.node_id.tolist() == [poi["ID"] for poi in json.loads(text)]
+        else:
+            objects, _ = parse(text, cuts)
+            assert objects == json.loads(text)["elements"]
+            assert_same_store(asyncio.run(stream_elements(chunked(text, 333))), build_from_json(json.loads(text)["elements"]))
@@ -0,0 +1,50 @@
+import io
+
+import pandas as pd
+import pytest
+
+from ev_finder_api.app.fleet_scan import scan_log
+
+
+def session_log(path):
+    rows = []
+    for i in range(30):
+        rows.append({"station_id": "A", "El_kWh": 20.0, "Duration_hours": 3.0, "disconnects": 0})
+        # B: every third session is tiny
+        rows.append({"station_id": "B", "El_kWh": 0.2 if i % 3 == 0 else 15.0, "Duration_hours": 2.0, "disconnects": 0})
+        # C: every session reconnects a lot
+        rows.append({"station_id": "C", "El_kWh": 12.0, "Duration_hours": 2.5, "disconnects": 3})
+    rows.append({"station_id": None, "El_kWh": 1.0, "Duration_hours": 1.0, "disconnects": 0})
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def test_stations_are_ranked_by_flagged_share(tmp_path):
+    report = scan_log(session_log(tmp_path / "log.csv"), "station_id", chunksize=1000)
+    assert report["rows_scanned"] == 90 and report["stations_seen"] == 3 and report["chunks"] == 1
+    assert [(s["station"], s["flagged_sessions"]) for s in report["stations"]] == [("C", 30), ("B", 10), ("A", 0)]
+    b = report["stations"][1]
+    assert b["low_kwh_rate"] == pytest.approx(1 / 3, abs=1e-4) and b["frequent_disconnect_rate"] == 0
+
+
+def test_chunked_scan_matches_one_pass(tmp_path):
+    path = session_log(tmp_path / "log.csv")
+    whole = scan_log(path, "station_id", chunksize=1000)
+    chunked = scan_log(path, "station_id", chunksize=7)
+    assert chunked["chunks"] == 13
+    assert chunked["stations"] == whole["stations"]
+
+
+def test_uploaded_file_object_and_top(tmp_path):
+    data = session_log(tmp_path / "log.csv").read_bytes()
+    report = scan_log(io.BytesIO(data), "station_id", top=1)
+    assert [s["station"] for s in report["stations"]] == ["C"]
+
+
+def test_missing_columns_are_reported(tmp_path):
+    path = session_log(tmp_path / "log.csv")
+    with pytest.raises(ValueError, match="Station column 'charger'"):
+        scan_log(path, "charger")
+    pd.DataFrame({"station_id": ["A"], "El_kWh": [1.0]}).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="Duration_hours"):
+        scan_log(path, "station_id")
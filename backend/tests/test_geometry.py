@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+from ev_finder_api.app.geometry import pack_rings, ring_areas, ring_centroids, turf_area_and_centroid
+
+
+def closed(ring):
+    return list(ring) + [ring[0]]
+
+
+# (lon, lat) rings, closed
+SQUARE = closed([(76.30, 9.98), (76.301, 9.98), (76.301, 9.981), (76.30, 9.981)])
+# An L-shaped (concave) lot
+CONCAVE = closed([(76.30, 9.98), (76.302, 9.98), (76.302, 9.9805), (76.3005, 9.9805), (76.3005, 9.982), (76.30, 9.982)])
+# Outer ring and the courtyard cut out of it
+OUTER = closed([(10.0, 50.0), (10.003, 50.0), (10.003, 50.002), (10.0, 50.002)])
+HOLE = closed([(10.001, 50.0005), (10.002, 50.0005), (10.002, 50.0015), (10.001, 50.0015)])
+# Straddling the antimeridian, written with continuous longitudes as geojson expects
+ANTIMERIDIAN = closed([(179.998, -16.5), (180.002, -16.5), (180.002, -16.497), (179.998, -16.497)])
+SMALL = closed([(76.3, 9.98), (76.30005, 9.98), (76.30005, 9.98004), (76.3, 9.98004)])
+
+
+@pytest.mark.parametrize("ring", [SQUARE, CONCAVE, OUTER, HOLE, ANTIMERIDIAN, SMALL], ids=["square", "concave", "outer", "hole", "antimeridian", "small"])
+def test_ring_matches_turfpy(ring):
+    expected_area, (expected_lon, expected_lat) = turf_area_and_centroid(ring)
+    rings = pack_rings([ring])
+    lon, lat = ring_centroids(rings)
+    # geojson rounds coordinates to 6 decimals, so allow ~0.1 m of slack per edge
+    assert ring_areas(rings)[0] == pytest.approx(expected_area, rel=1e-3, abs=0.5)
+    assert lon[0] == pytest.approx(expected_lon, abs=1e-6)
+    assert lat[0] == pytest.approx(expected_lat, abs=1e-6)
+
+
+def test_batch_matches_one_at_a_time():
+    rings = [SQUARE, CONCAVE, OUTER, HOLE, ANTIMERIDIAN, SMALL]
+    areas = ring_areas(pack_rings(rings))
+    for ring, area in zip(rings, areas):
+        assert area == pytest.approx(ring_areas(pack_rings([ring]))[0])
+
+
+def test_polygon_with_hole_matches_turfpy():
+    from geojson import Feature, Polygon
+    from turfpy.measurement import area
+
+    expected = area(Feature(geometry=Polygon([OUTER, HOLE])))
+    outer, hole = ring_areas(pack_rings([OUTER, HOLE]))
+    assert outer - hole == pytest.approx(expected, rel=1e-3)
+
+
+def test_degenerate_rings():
+    rings = pack_rings([[], [(1.0, 1.0)], [(1.0, 1.0), (2.0, 2.0)], SQUARE])
+    areas = ring_areas(rings)
+    lon, lat = ring_centroids(rings)
+    assert areas[:3].tolist() == [0.0, 0.0, 0.0]
+    assert areas[3] > 0
+    assert math.isnan(lon[0]) and math.isnan(lat[0])
+    assert (lon[1], lat[1]) == (1.0, 1.0)
+    assert ring_areas(pack_rings([])).shape == (0,)
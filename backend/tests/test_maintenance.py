@@ -0,0 +1,181 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import boiler_plate
+from ev_finder_api.app.config import settings
+from ev_finder_api.app.triage import MaintenanceModel, MaintenanceTriage
+from ev_finder_api.app.verdict_cache import VerdictCache
+
+
+class FakeCompletions:
+    """Chat completions answered by `answer(prompt)`, which returns the reply text or raises."""
+
+    def __init__(self, answer, delay_s=0.01):
+        self.answer = answer
+        self.delay_s = delay_s
+        self.prompts = []
+        self.in_flight = self.peak = 0
+
+    async def create(self, model, messages, temperature):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay_s)
+            content = self.answer(prompt)
+        finally:
+            self.in_flight -= 1
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+
+
+def verdict(station=None, needs=False):
+    item = {"needs_maintenance": needs, "reason": "Component wear" if needs else "Fine", "estimated_life_months": 6 if needs else None}
+    return item if station is None else {"station": station, **item}
+
+
+def answer_all(prompt):
+    stations = [int(n) for n in re.findall(r"^Station (\d+):", prompt, re.M)]
+    if stations:
+        return json.dumps([verdict(i) for i in stations])
+    return json.dumps(verdict())
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    def install(answer, **options):
+        completions = FakeCompletions(answer, **options)
+        monkeypatch.setattr(boiler_plate, "get_openai_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+        return completions
+
+    monkeypatch.setattr(boiler_plate, "llm_slots", None)
+    monkeypatch.setattr(boiler_plate, "few_shot_prompt", lambda: "")
+    monkeypatch.setattr(settings, "MAINTENANCE_LLM_BACKOFF_S", 0.001)
+    monkeypatch.setattr(settings, "VERDICT_CACHE_ENABLED", False)
+    return install
+
+
+def test_llm_calls_stay_within_the_concurrency_limit(llm, monkeypatch):
+    monkeypatch.setattr(settings, "MAINTENANCE_LLM_CONCURRENCY", 3)
+    completions = llm(answer_all)
+
+    async def main():
+        return await asyncio.gather(*(boiler_plate.complete_with_retry(f"prompt {i}") for i in range(10)))
+
+    assert len(asyncio.run(main())) == 10
+    assert completions.peak == 3
+
+
+def test_timeouts_are_retried_and_other_errors_are_not(llm):
+    failures = iter([asyncio.TimeoutError(), asyncio.TimeoutError()])
+
+    def flaky(prompt):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return answer_all(prompt)
+
+    completions = llm(flaky)
+    asyncio.run(boiler_plate.complete_with_retry("p"))
+    assert len(completions.prompts) == 3
+
+    def broken(prompt):
+        raise RuntimeError("bad request")
+
+    completions = llm(broken)
+    with pytest.raises(RuntimeError):
+        asyncio.run(boiler_plate.complete_with_retry("p"))
+    assert len(completions.prompts) == 1
+
+
+def test_nearby_prompts_run_concurrently(llm, monkeypatch):
+    # A classifier that is never sure sends every station to the LLM
+    unsure = MaintenanceTriage(np.zeros(5), np.ones(5), np.zeros(5), 0.0, min_confidence=0.9)
+    monkeypatch.setattr(boiler_plate, "maintenance_model", MaintenanceModel(unsure, {}, {}, 0, True))
+    completions = llm(answer_all, delay_s=0.05)
+
+    async def main():
+        usage = boiler_plate.LLMUsage()
+        results = [item async for item in boiler_plate.predict_nearby(15, 5.0, 28.6, 77.2, 5, usage)]
+        return results, usage
+
+    results, usage = asyncio.run(main())
+    assert sorted(i for i, _ in results) == list(range(15))
+    assert all(r["source"] == "llm" and r["needs_maintenance"] is False for _, r in results)
+    assert usage.calls == 3 and usage.local["escalated"] == 15
+    assert completions.peak == 3
+
+
+def test_batch_reply_is_split_per_station():
+    reply = "Here you go:\n" + json.dumps([verdict(2, True), verdict(0), verdict(1), verdict(1, True), {"station": 7, **verdict()}, {"station": 3}])
+    verdicts = boiler_plate.safe_parse_json_batch_response(reply, 4)
+    # Station 1 was answered twice and station 3 without fields: both need asking again
+    assert verdicts == [verdict(), None, verdict(needs=True), None]
+    assert boiler_plate.safe_parse_json_batch_response("no json here", 2) == [None, None]
+
+
+def test_stations_missing_from_a_batch_reply_are_asked_alone(llm):
+    def answer(prompt):
+        if "Station 0:" in prompt:
+            return json.dumps([verdict(0), verdict(2, True)])
+        return json.dumps(verdict(needs=True))
+
+    completions = llm(answer)
+    stations = [(boiler_plate.generate_fake_session(), 28.6 + i / 100, 77.2) for i in range(3)]
+    usage = boiler_plate.LLMUsage()
+    results = asyncio.run(boiler_plate.predict_for_batch(stations, usage))
+    assert [r["lat"] for r in results] == [s[1] for s in stations]
+    assert [r["needs_maintenance"] for r in results] == [False, True, True]
+    assert usage.calls == 2 and usage.fallbacks == 1
+    assert "Now analyze this station" in completions.prompts[1]
+
+
+@pytest.fixture
+def one_bucket(monkeypatch):
+    """Every station gets the same session, so all of them fall in one verdict-cache bucket."""
+    session = boiler_plate.generate_fake_session()
+    unsure = MaintenanceTriage(np.zeros(5), np.ones(5), np.zeros(5), 0.0, min_confidence=0.9)
+    monkeypatch.setattr(boiler_plate, "maintenance_model", MaintenanceModel(unsure, {}, {}, 0, True))
+    monkeypatch.setattr(boiler_plate, "generate_fake_session", lambda: dict(session))
+    cache = VerdictCache(max_entries=100, ttl_s=60.0, kwh_bin=0.5, hours_bin=0.25)
+    monkeypatch.setattr(boiler_plate, "get_verdict_cache", lambda: cache)
+
+
+def nearby(count=15):
+    async def main():
+        usage = boiler_plate.LLMUsage()
+        results = dict([item async for item in boiler_plate.predict_nearby(count, 5.0, 28.6, 77.2, 5, usage)])
+        return [results[i] for i in range(count)], usage
+
+    return asyncio.run(main())
+
+
+def test_stations_in_one_bucket_follow_a_clean_verdict(llm, one_bucket):
+    completions = llm(answer_all)
+    results, usage = nearby()
+    assert len(completions.prompts) == 1
+    assert [r["cached"] for r in results].count(True) == 14
+    assert usage.bucket_followers == 14 and usage.cache_hits == 0
+
+
+def test_a_failed_verdict_is_not_shared_with_its_bucket(llm, one_bucket):
+    calls = iter(range(100))
+
+    def first_fails(prompt):
+        if next(calls) == 0:
+            raise RuntimeError("bad request")
+        return answer_all(prompt)
+
+    completions = llm(first_fails)
+    results, usage = nearby()
+    assert len(completions.prompts) == 15
+    failed = [r for r in results if r["reason"].startswith("LLM error")]
+    assert len(failed) == 1
+    assert all(r["needs_maintenance"] is False and not r["cached"] for r in results if r not in failed)
+    assert usage.bucket_followers == 0
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ev_finder_api.app import metrics
+
+
+def test_counter_exposition():
+    counter = metrics.Counter("test_events_total", "Events seen", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2.5, kind='quo"te')
+    assert counter.render() == [
+        "# HELP test_events_total Events seen",
+        "# TYPE test_events_total counter",
+        'test_events_total{kind="a"} 1',
+        'test_events_total{kind="quo\\"te"} 2.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Durations", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="parse")
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{stage="parse",le="0.1"} 2',
+        'test_seconds_bucket{stage="parse",le="1"} 3',
+        'test_seconds_bucket{stage="parse",le="+Inf"} 4',
+        'test_seconds_sum{stage="parse"} 3.65',
+        'test_seconds_count{stage="parse"} 4',
+    ]
+
+
+def test_gauge_skips_unknown_values():
+    gauge = metrics.Gauge("test_ratio", "Ratio", ("cache",), lambda: [(("a",), 0.5), (("b",), None)])
+    assert gauge.render()[2:] == ['test_ratio{cache="a"} 0.5']
+
+
+def test_metric_without_samples_fails_on_creation():
+    class NoSamples(metrics._Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError, match="samples"):
+        NoSamples("test_broken", "Broken")
+
+
+def test_server_timing_header_carries_the_request_stages():
+    app = FastAPI()
+    metrics.install(app, timing_header=True)
+
+    @app.get("/work")
+    async def work():
+        with metrics.stage("geometry"):
+            # Timings reach the request from tasks it starts too
+            await asyncio.create_task(asyncio.sleep(0))
+        return {}
+
+    response = TestClient(app).get("/work")
+    names = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert names == ["geometry", "total"]
+    assert 'route="/work",status="200"' in metrics.render()
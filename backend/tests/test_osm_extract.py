@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+import pytest
+
+from ev_finder_api.app.osm_extract import MANIFEST, ExtractStore
+
+KOCHI = (10.0, 76.3)
+DELHI = (28.6, 77.2)
+
+
+def write_extract(path, center, node_id, mtime=None):
+    lat, lon = center
+    square = [[lon, lat], [lon + 0.001, lat], [lon + 0.001, lat + 0.001], [lon, lat + 0.001], [lon, lat]]
+    features = [
+        {"type": "Feature", "id": f"node/{node_id}", "properties": {"amenity": "cafe"}, "geometry": {"type": "Point", "coordinates": [lon, lat]}},
+        {"type": "Feature", "id": f"way/{node_id}", "properties": {"amenity": "parking"}, "geometry": {"type": "Polygon", "coordinates": [square]}},
+    ]
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def poi_ids(store, center):
+    return store.query("pois", [center], 1000).node_id.tolist()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ExtractStore(tmp_path / "store")
+
+
+def test_query_returns_ingested_layers(store, tmp_path):
+    counts = store.ingest(write_extract(tmp_path / "kochi.geojson", KOCHI, 1))
+    assert counts["pois"] == 1 and counts["spaces"] == 5
+    assert poi_ids(store, KOCHI) == [1]
+    assert store.query("spaces", [KOCHI], 1000).way_id.tolist() == [1]
+    assert poi_ids(store, DELHI) == []
+
+
+def test_unchanged_file_is_skipped(store, tmp_path, capsys):
+    path = write_extract(tmp_path / "kochi.geojson", KOCHI, 1)
+    assert store.ingest(path) is not None
+    assert store.ingest(path) is None
+    assert store.ingest(path, force=True) is not None
+    # Progress goes to the log; only the CLI prints
+    assert capsys.readouterr().out == ""
+
+
+def test_reingest_replaces_data_and_deletes_old_directory_one_ingest_later(store, tmp_path):
+    path = write_extract(tmp_path / "kochi.geojson", KOCHI, 1, mtime=1_000_000)
+    store.ingest(path)
+    first_dir = store.root / json.loads((store.root / MANIFEST).read_text())["sources"][str(path)]["dir"]
+    assert poi_ids(store, KOCHI) == [1]
+
+    store.ingest(write_extract(path, KOCHI, 2, mtime=2_000_000))
+    # A reader that had loaded the first manifest can still map the old partition
+    assert first_dir.exists()
+    assert poi_ids(store, KOCHI) == [2]
+
+    store.ingest(write_extract(tmp_path / "delhi.geojson", DELHI, 3))
+    assert not first_dir.exists()
+    assert poi_ids(store, KOCHI) == [2] and poi_ids(store, DELHI) == [3]
+
+
+def test_reader_rereads_manifest_when_a_partition_is_gone(store, tmp_path):
+    path = write_extract(tmp_path / "kochi.geojson", KOCHI, 1)
+    store.ingest(path)
+    manifest = json.loads((store.root / MANIFEST).read_text())
+    # A manifest read just before two ingestions retired the directory it names
+    stale = json.dumps({**manifest, "sources": {str(path): {**manifest["sources"][str(path)], "dir": "gone/0"}}})
+    reads = iter([stale])
+    original = type(store.root / MANIFEST).read_text
+
+    def read_text(self, *args, **kwargs):
+        return next(reads, None) or original(self, *args, **kwargs)
+
+    reader = ExtractStore(store.root)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(type(store.root / MANIFEST), "read_text", read_text)
+        assert poi_ids(reader, KOCHI) == [1]
+
+
+def test_concurrent_ingests_keep_every_source(store, tmp_path):
+    paths = [write_extract(tmp_path / f"region{i}.geojson", (10.0 + i, 76.3), i + 1) for i in range(4)]
+    threads = [threading.Thread(target=store.ingest, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sources = json.loads((store.root / MANIFEST).read_text())["sources"]
+    assert sorted(sources) == sorted(str(path) for path in paths)
+    assert [poi_ids(store, (10.0 + i, 76.3)) for i in range(4)] == [[1], [2], [3], [4]]
+
+
+def test_layer_provider_without_fetch_fails_on_creation():
+    from ev_finder_api.app.analysis import LayerProvider
+
+    class NoFetch(LayerProvider):
+        layers = ("pois",)
+
+    with pytest.raises(TypeError, match="fetch"):
+        NoFetch()
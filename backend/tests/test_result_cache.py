@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ev_finder_api.app import analysis, result_cache, routes
+from ev_finder_api.app.result_cache import CachedResult, ResultCache, geohash_cell
+
+
+def result(body=b"[]", ttl_s=60.0):
+    return CachedResult(body, {}, time.time() + ttl_s if ttl_s is not None else None)
+
+
+def test_geohash_cell():
+    cell, (lat, lon) = geohash_cell(57.64911, 10.40744, 11)
+    assert cell == "u4pruydqqvj"
+    assert abs(lat - 57.64911) < 1e-5 and abs(lon - 10.40744) < 1e-5
+    # Points in the same cell snap to the same center
+    assert geohash_cell(9.98160, 76.29990, 7) == geohash_cell(9.98165, 76.29995, 7)
+
+
+def test_identical_requests_share_one_computation():
+    cache = ResultCache(precision=7, max_entries=10, max_bytes=1 << 20)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return result(b"[1]")
+
+    async def main():
+        first = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(3)))
+        return first, await cache.get_or_compute("k", compute)
+
+    first, again = asyncio.run(main())
+    assert len(calls) == 1
+    assert [status for _, status in first] == ["miss", "coalesced", "coalesced"]
+    assert again[1] == "hit" and again[0].body == b"[1]"
+
+
+def test_failures_and_uncacheable_results_are_not_kept():
+    cache = ResultCache(precision=7, max_entries=10, max_bytes=1 << 20)
+
+    async def fail():
+        raise RuntimeError("upstream down")
+
+    async def uncacheable():
+        return result(ttl_s=None)
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute("k", fail)
+        assert (await cache.get_or_compute("k", uncacheable))[1] == "miss"
+        return await cache.get_or_compute("k", uncacheable)
+
+    assert asyncio.run(main())[1] == "miss"
+    assert cache.stats()["entries"] == 0 and cache.stats()["in_flight"] == 0
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(precision=7, max_entries=2, max_bytes=10)
+
+    async def main():
+        for key, body in (("a", b"aaaa"), ("b", b"bbbb")):
+            await cache.get_or_compute(key, lambda body=body: asyncio.sleep(0, result(body)))
+        await cache.get_or_compute("a", None)  # a hit; "b" is now the oldest
+        await cache.get_or_compute("c", lambda: asyncio.sleep(0, result(b"cccc")))
+
+    asyncio.run(main())
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 8
+
+
+@pytest.fixture
+def client(monkeypatch):
+    searched = []
+
+    async def analyze_locations(lat, lon, api_key, top_k=None, stage_report=None):
+        searched.append((lat, lon))
+        if stage_report is not None:
+            stage_report.update({"viable": 0, **({"failed_layers": ["roads"]} if lat < 0 else {})})
+        return []
+
+    async def data_expires_at(centers):
+        return time.time() + 60
+
+    monkeypatch.setattr(analysis, "analyze_locations", analyze_locations)
+    monkeypatch.setattr(analysis, "data_expires_at", data_expires_at)
+    monkeypatch.setattr(result_cache, "_cache", None)
+    app = FastAPI()
+    app.include_router(routes.router)
+    client = TestClient(app)
+    client.searched = searched
+    return client
+
+
+def find(client, lat, lon, **headers):
+    return client.get("/find-locations", params={"latitude": lat, "longitude": lon}, headers=headers)
+
+
+def test_nearby_requests_share_one_cached_answer(client):
+    first = find(client, 9.98160, 76.29990)
+    second = find(client, 9.98165, 76.29995)
+    assert (first.headers["X-Result-Cache"], second.headers["X-Result-Cache"]) == ("miss", "hit")
+    assert len(client.searched) == 1
+    center = geohash_cell(9.98160, 76.29990, 7)[1]
+    assert first.headers["X-Search-Center"] == f"{center[0]:.6f},{center[1]:.6f}"
+    assert first.headers["Cache-Control"].startswith("public, max-age=")
+
+
+def test_matching_etag_gets_304(client):
+    etag = find(client, 9.9816, 76.2999).headers["ETag"]
+    assert find(client, 9.9816, 76.2999, **{"If-None-Match": etag}).status_code == 304
+    assert find(client, 9.9816, 76.2999, **{"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    response = find(client, 9.9816, 76.2999, **{"If-None-Match": '"other"'})
+    assert response.status_code == 200 and response.json() == []
+
+
+def test_answer_with_a_failed_layer_is_not_cached(client):
+    statuses = [find(client, -9.9816, 76.2999).headers["X-Result-Cache"] for _ in range(2)]
+    assert statuses == ["miss", "miss"]
+    assert find(client, -9.9816, 76.2999).headers["Cache-Control"] == "no-cache"
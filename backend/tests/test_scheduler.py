@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import httpx
+
+from ev_finder_api.app.scheduler import PRIORITY_BATCH, OverpassScheduler, priority
+
+URL = "https://overpass.test/api/interpreter"
+
+
+def overpass_answer(*node_ids):
+    elements = [{"type": "node", "id": i, "lat": 10.0, "lon": 76.0} for i in node_ids]
+    return httpx.Response(200, text=json.dumps({"elements": elements}))
+
+
+def scheduler(handler, **options):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    options = {"rate_per_s": 1000.0, "burst": 10, "max_concurrency": 2, "max_retries": 3, "backoff_base_s": 0.01, **options}
+    return OverpassScheduler(URL, client=client, **options)
+
+
+async def run(scheduler, *queries):
+    try:
+        return await asyncio.gather(*(scheduler.run(query, query) for query in queries))
+    finally:
+        await scheduler.close()
+
+
+def test_identical_queries_share_one_call():
+    sent = []
+
+    async def handler(request):
+        sent.append(request.content)
+        await asyncio.sleep(0.05)
+        return overpass_answer(1, 2)
+
+    a, b, c = asyncio.run(run(scheduler(handler), "q1", "q1", "q2"))
+    assert len(sent) == 2
+    assert a is b and len(a) == 2
+    assert c is not a
+
+
+def test_rate_limited_query_is_retried():
+    answers = iter([httpx.Response(429), httpx.Response(429), overpass_answer(7)])
+    [store] = asyncio.run(run(scheduler(lambda request: next(answers)), "q"))
+    assert store.node_id.tolist() == [7]
+
+
+def test_query_fails_after_all_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(429)
+
+    assert asyncio.run(run(scheduler(handler), "q")) == [None]
+    assert len(calls) == 3
+
+
+def test_retry_after_is_capped():
+    s = scheduler(lambda request: overpass_answer(), backoff_max_s=5.0)
+    assert s._backoff(0, httpx.Response(429, headers={"Retry-After": "3600"})) == 5.0
+    assert s._backoff(0, httpx.Response(429, headers={"Retry-After": "2"})) == 2.0
+    assert s._backoff(20, None) == 5.0
+
+
+def test_long_retry_after_does_not_hold_the_query():
+    answers = iter([httpx.Response(429, headers={"Retry-After": "3600"}), overpass_answer(3)])
+    s = scheduler(lambda request: next(answers), backoff_max_s=0.05)
+
+    async def main():
+        return await asyncio.wait_for(run(s, "q"), timeout=5)
+
+    [store] = asyncio.run(main())
+    assert store.node_id.tolist() == [3]
+
+
+def ordered_run(submit):
+    """Queries in the order they reach Overpass, with one worker held on a first query while `submit` queues more."""
+    sent = []
+    release = asyncio.Event()
+
+    async def handler(request):
+        sent.append(request.content.decode())
+        if len(sent) == 1:
+            await release.wait()
+        return overpass_answer()
+
+    async def main():
+        s = scheduler(handler, max_concurrency=1)
+        first = asyncio.create_task(s.run("first", "first"))
+        await asyncio.sleep(0.01)
+        tasks = submit(s)
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, *tasks)
+        await s.close()
+        return [content.split("=", 1)[1] for content in sent]
+
+    return asyncio.run(main())
+
+
+def test_interactive_queries_go_ahead_of_batch_ones():
+    def submit(s):
+        with priority(PRIORITY_BATCH):
+            batch = [asyncio.create_task(s.run(q, q)) for q in ("batch1", "batch2")]
+        return batch + [asyncio.create_task(s.run("single", "single"))]
+
+    assert ordered_run(submit) == ["first", "single", "batch1", "batch2"]
+
+
+def test_interactive_caller_promotes_a_queued_batch_query():
+    def submit(s):
+        with priority(PRIORITY_BATCH):
+            batch = [asyncio.create_task(s.run(q, q)) for q in ("batch1", "batch2")]
+        return batch + [asyncio.create_task(s.run("batch2", "batch2"))]
+
+    # Sent once, ahead of batch1
+    assert ordered_run(submit) == ["first", "batch2", "batch1"]
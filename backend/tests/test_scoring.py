@@ -0,0 +1,53 @@
+import asyncio
+import random
+from pathlib import Path
+
+import pytest
+
+from ev_finder_api.app import scoring
+from ev_finder_api.app.scoring import ScoringJob, ScoringParams
+
+
+def random_job(seed, spaces, top_k):
+    rng = random.Random(seed)
+
+    def point():
+        return (10 + rng.random() * 0.1, 76 + rng.random() * 0.1)
+
+    return ScoringJob(
+        origin=(10.05, 76.05),
+        params=ScoringParams(300, 200, 2, 500, 400, 250),
+        station_coords=[point() for _ in range(40)],
+        poi_coords=[point() for _ in range(1500)],
+        power_coords=[point() for _ in range(300)],
+        road_lines=[[(lon, lat) for lat, lon in (point(), point())] for _ in range(400)],
+        spaces=[(point(), 900.0, {"id": i}) for i in range(spaces)],
+        top_k=top_k,
+    )
+
+
+@pytest.fixture(scope="module")
+def pool():
+    yield
+    scoring.shutdown_process_pool()
+
+
+def shared_memory_blocks():
+    # multiprocessing.shared_memory names its blocks psm_*
+    return set(Path("/dev/shm").glob("psm_*"))
+
+
+@pytest.mark.parametrize("top_k", [5, None])
+def test_process_pool_matches_one_pass(pool, top_k):
+    before = shared_memory_blocks()
+    for seed in range(2):
+        job = random_job(seed, 1200, top_k)
+        # Chunks that do not divide the spaces evenly, and more chunks than workers
+        assert asyncio.run(scoring.score_candidates(job, 2, 250)) == scoring.score_spaces(job)
+    assert shared_memory_blocks() == before
+
+
+def test_process_pool_without_spaces(pool):
+    candidates, report = asyncio.run(scoring.score_candidates(random_job(0, 0, 5), 2, 250))
+    assert candidates == []
+    assert report == scoring.empty_stage_report()
@@ -0,0 +1,90 @@
+import math
+import random
+
+import pytest
+from geopy.distance import geodesic
+
+from ev_finder_api.app.spatial import LocalProjection, PointIndex, SegmentIndex, turf_segment_distance_m
+
+
+def random_points(rng, center, spread_deg, count):
+    return [(center[0] + rng.uniform(-spread_deg, spread_deg), center[1] + rng.uniform(-spread_deg, spread_deg)) for _ in range(count)]
+
+
+def random_lines(rng, center, spread_deg, count):
+    lines = []
+    for _ in range(count):
+        lat, lon = center[0] + rng.uniform(-spread_deg, spread_deg), center[1] + rng.uniform(-spread_deg, spread_deg)
+        line = [(lon, lat)]
+        for _ in range(rng.randint(1, 6)):
+            lon, lat = lon + rng.uniform(-0.003, 0.003), lat + rng.uniform(-0.003, 0.003)
+            line.append((lon, lat))
+        lines.append(line)
+    return lines
+
+
+# A search area near the equator, one at high latitude, and one across the antimeridian
+CENTERS = [(9.98, 76.30), (60.17, 24.94), (-16.5, 179.99)]
+
+
+@pytest.fixture(params=CENTERS, ids=["kochi", "helsinki", "antimeridian"])
+def center(request):
+    return request.param
+
+
+def queries(rng, center):
+    """Queries inside the data, around its edge, and far away from it."""
+    near = random_points(rng, center, 0.05, 20)
+    far = [(center[0] + 0.4, center[1]), (center[0] - 0.3, center[1] + 0.35), (center[0], center[1] - 0.45)]
+    return near + far
+
+
+def test_nearest_matches_brute_force(center):
+    rng = random.Random(1)
+    points = random_points(rng, center, 0.04, 150)
+    index = PointIndex(points, LocalProjection(center), cell_size_m=500)
+    for query in queries(rng, center):
+        expected = min(geodesic(query, p).meters for p in points)
+        assert index.nearest(query) == pytest.approx(expected, abs=1e-6)
+
+
+@pytest.mark.parametrize("radius_m", [0, 250, 1000, 2500])
+def test_count_within_matches_brute_force(center, radius_m):
+    rng = random.Random(2)
+    points = random_points(rng, center, 0.04, 150)
+    # Include exact duplicates and a point sitting exactly on a query
+    points += points[:5] + [center]
+    index = PointIndex(points, LocalProjection(center), cell_size_m=250)
+    for query in queries(rng, center) + [center]:
+        distances = [geodesic(query, p).meters for p in points]
+        assert index.count_within(query, radius_m) == sum(d <= radius_m for d in distances)
+        assert index.count_within(query, radius_m, inclusive=False) == sum(d < radius_m for d in distances)
+        expected = sum(d <= radius_m for d in distances)
+        assert index.count_within(query, radius_m, limit=3) == min(expected, 3)
+
+
+def test_empty_point_index():
+    index = PointIndex([], LocalProjection(CENTERS[0]), cell_size_m=500)
+    assert index.nearest(CENTERS[0]) is None
+    assert index.count_within(CENTERS[0], 1000) == 0
+
+
+@pytest.mark.parametrize("max_distance_m", [50, 100, 1000])
+def test_segment_distance_matches_brute_force(center, max_distance_m):
+    rng = random.Random(3)
+    lines = random_lines(rng, center, 0.04, 150)
+    index = SegmentIndex(lines, LocalProjection(center))
+    for lat, lon in queries(rng, center):
+        expected = min(turf_segment_distance_m((lon, lat), a, b) for line in lines for a, b in zip(line, line[1:]))
+        got = index.nearest_within((lat, lon), max_distance_m)
+        if expected <= max_distance_m:
+            assert got == pytest.approx(expected, abs=1e-6)
+        else:
+            assert got == math.inf
+
+
+def test_segment_index_without_segments():
+    projection = LocalProjection(CENTERS[0])
+    assert SegmentIndex([], projection).nearest_within(CENTERS[0], 100) is None
+    # Single-node ways have no segments, but there were roads
+    assert SegmentIndex([[(76.3, 9.98)]], projection).nearest_within(CENTERS[0], 100) == math.inf
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_importing_the_app_leaves_pandas_and_openai_unloaded():
+    # A fresh interpreter: this test session has imported both already
+    probe = "import sys, boiler_plate; print('pandas' in sys.modules, 'openai' in sys.modules)"
+    done = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND_DIR, capture_output=True, text=True,
+                          env={**os.environ, "OCM_API_KEY": "test"})
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.split() == ["False", "False"]
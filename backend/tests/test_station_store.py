@@ -0,0 +1,65 @@
+import pytest
+
+from ev_finder_api.app.station_store import StationStore
+
+KOCHI = (9.9, 76.2, 10.1, 76.4)
+KOCHI_NORTH = (10.0, 76.2, 10.1, 76.4)
+DELHI = (28.5, 77.1, 28.7, 77.3)
+
+
+def poi(station_id, lat, lon):
+    return {"ID": station_id, "AddressInfo": {"Latitude": lat, "Longitude": lon}, "DateCreated": "2024-01-01T00:00:00Z"}
+
+
+def ids(store, center, radius_m=30_000):
+    return sorted(store.within([center], radius_m).node_id.tolist())
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = StationStore(tmp_path / "stations.sqlite3")
+    store.acquire_lease("kochi", KOCHI, 60)
+    store.acquire_lease("delhi", DELHI, 60)
+    store.apply([poi(1, 9.95, 76.3), poi(2, 10.05, 76.3), poi(3, 28.6, 77.2)])
+    store.finish_sync("kochi", "2024-01-01T00:00:00", full=True)
+    store.finish_sync("delhi", "2024-01-01T00:00:00", full=True)
+    return store
+
+
+def test_unchanged_bounds_keep_stations_and_state(store):
+    assert store.acquire_lease("kochi", KOCHI, 60)
+    assert store.count() == 3
+    assert store.region("kochi")["last_modified"] == "2024-01-01T00:00:00"
+
+
+def test_shrunk_bounds_drop_stations_left_outside(store):
+    assert store.acquire_lease("kochi", KOCHI_NORTH, 60)
+    assert ids(store, (10.0, 76.3)) == [2]
+    assert ids(store, (28.6, 77.2)) == [3]
+    region = store.region("kochi")
+    assert tuple(region["bounds"]) == KOCHI_NORTH
+    assert region["last_modified"] is None and region["synced_at"] is None
+    assert not store.covers(KOCHI_NORTH)
+
+
+def test_moved_bounds_keep_stations_another_region_covers(store):
+    # Kochi moves onto Delhi: its own stations go, Delhi's station stays
+    assert store.acquire_lease("kochi", DELHI, 60)
+    assert store.count() == 1
+    assert ids(store, (28.6, 77.2)) == [3]
+
+
+def test_held_lease_still_records_the_new_bounds(store):
+    assert store.acquire_lease("kochi", KOCHI, 60)
+    # Another worker still holds the lease, but the old area is dropped all the same
+    assert not store.acquire_lease("kochi", KOCHI_NORTH, 60)
+    assert store.count() == 2
+
+
+def test_unconfigured_region_stops_covering(store):
+    assert store.covers(DELHI)
+    assert store.retain_regions(["kochi"]) == 1
+    assert store.region("delhi") is None
+    assert not store.covers(DELHI)
+    assert ids(store, (28.6, 77.2)) == []
+    assert store.covers(KOCHI) and store.count() == 2
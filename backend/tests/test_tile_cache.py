@@ -0,0 +1,75 @@
+from ev_finder_api.app import analysis
+from ev_finder_api.app.elements import ElementStoreBuilder
+from ev_finder_api.app.tile_cache import TileCache, merge_tiles, split_by_tile, tile_bounds, tile_of
+
+ZOOM = 14
+KOCHI = (9.98, 76.28)
+
+
+def points(*coords):
+    builder = ElementStoreBuilder()
+    for i, (lat, lon) in enumerate(coords, 1):
+        builder.add_node(i, lon, lat)
+    return builder.build()
+
+
+def make_cache(tmp_path, ttl_s=100.0, max_bytes=1 << 20):
+    return TileCache(tmp_path / "tiles.sqlite3", ttl_s=ttl_s, max_bytes=max_bytes, zoom=ZOOM)
+
+
+def test_round_trip_and_expiry(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    tile = tile_of(*KOCHI, ZOOM)
+    cache.put_many("pois:x", {tile: points(KOCHI)})
+    assert cache.get_many("pois:x", [tile])[tile].node_id.tolist() == [1]
+    assert cache.get_many("pois:y", [tile]) == {}
+    assert cache.expires_at("pois:x", [tile]) == clock.now + 100.0
+
+    clock.now += 101.0
+    assert cache.get_many("pois:x", [tile]) == {}
+    assert cache.expires_at("pois:x", [tile]) is None
+
+
+def test_least_recently_used_tiles_are_evicted(tmp_path, clock):
+    x, y = tile_of(*KOCHI, ZOOM)
+    tiles = [(x + i, y) for i in range(3)]
+    payload = points(*[KOCHI] * 50)
+    size = len(payload.to_bytes())
+    cache = make_cache(tmp_path, max_bytes=int(size * 2.5))
+
+    cache.put_many("pois", {tiles[0]: payload, tiles[1]: payload})
+    clock.now += 1
+    cache.get_many("pois", [tiles[0]])
+    clock.now += 1
+    cache.put_many("pois", {tiles[2]: payload})
+    # tiles[1] was used least recently
+    assert sorted(cache.get_many("pois", tiles)) == [tiles[0], tiles[2]]
+
+
+def test_split_by_tile_keeps_ways_whole():
+    x, y = tile_of(*KOCHI, ZOOM)
+    south, west, north, east = tile_bounds((x, y), ZOOM)
+    inside = ((south + north) / 2, (west + east) / 2)
+    outside = ((south + north) / 2, east + (east - west) / 2)
+    builder = ElementStoreBuilder()
+    builder.add_node(1, inside[1], inside[0])
+    builder.add_node(2, outside[1], outside[0])
+    builder.add_node(3, outside[1], outside[0] + 0.001)
+    builder.add_way(10, [1, 2], {"highway": "primary"})
+    store = builder.build()
+
+    parts = split_by_tile(store, [(x, y), (x + 1, y)], ZOOM)
+    # The road crossing the border is in both tiles with both of its nodes; node 3 only east
+    assert sorted(parts[(x, y)].node_id.tolist()) == [1, 2]
+    assert parts[(x, y)].way_id.tolist() == [10]
+    assert sorted(parts[(x + 1, y)].node_id.tolist()) == [1, 2, 3]
+    merged = merge_tiles(parts.values())
+    assert sorted(merged.node_id.tolist()) == [1, 2, 3] and merged.way_id.tolist() == [10]
+
+
+def test_cache_key_follows_the_layer_query(monkeypatch):
+    key = analysis.TILE_CACHE_KEYS["roads"]
+    assert key.startswith("roads:") and key == analysis._tile_cache_key("roads")
+    assert len(set(analysis.TILE_CACHE_KEYS.values())) == len(analysis.LAYER_NAMES)
+    monkeypatch.setitem(analysis.LAYER_QUERIES, "roads", analysis.LAYER_QUERIES["roads"].replace("trunk", "trunk|motorway"))
+    assert analysis._tile_cache_key("roads") != key
@@ -0,0 +1,89 @@
+import json
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ev_finder_api.app.triage import FEATURES, MaintenanceTriage, default_artifact_path, load_maintenance_model, local_verdict
+
+
+def labelled_log(n=400, seed=0):
+    """Healthy sessions deliver energy over hours; faulty ones are short, small and flaky."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        healthy = i % 2 == 0
+        kwh = rng.uniform(5, 40) if healthy else rng.uniform(0.05, 0.6)
+        hours = rng.uniform(1, 8) if healthy else rng.uniform(0.05, 0.4)
+        rows.append({
+            "El_kWh": kwh,
+            "Duration_hours": hours,
+            "is_frequent_connect_disconnect": int(not healthy and rng.random() < 0.7),
+            "is_low_kwh": int(kwh < 0.5),
+            "is_short_duration": int(hours < 0.2),
+            "is_healthy": int(healthy),
+        })
+    return pd.DataFrame(rows)
+
+
+def session(kwh, hours, disconnect=0):
+    return {"El_kWh": kwh, "Duration_hours": hours, "is_frequent_connect_disconnect": disconnect,
+            "is_low_kwh": int(kwh < 0.5), "is_short_duration": int(hours < 0.2)}
+
+
+def test_fitted_model_separates_the_log():
+    model = MaintenanceTriage.fit(labelled_log())
+    assert model.accuracy > 0.98
+    result = model.classify([session(30.0, 5.0), session(0.1, 0.1, 1)])
+    assert result.needs_maintenance.tolist() == [False, True]
+    assert result.confident.all()
+    assert result.report()["decided_locally"] == 2
+
+
+def test_unsure_sessions_are_escalated():
+    model = MaintenanceTriage.fit(labelled_log(), min_confidence=0.999999)
+    # Between the two clusters the model is not sure either way
+    result = model.classify([session(2.0, 0.6)])
+    assert not result.confident[0]
+    assert result.report()["escalated"] == 1
+
+
+def test_dataframe_and_dicts_score_the_same():
+    df = labelled_log(20)
+    model = MaintenanceTriage.fit(labelled_log())
+    from_frame = model.classify(df).confidence
+    from_dicts = model.classify(df[list(FEATURES)].to_dict("records")).confidence
+    assert np.allclose(from_frame, from_dicts)
+
+
+def test_local_verdict_names_the_raised_flags():
+    assert local_verdict(session(0.1, 0.1, 1), True)["reason"] == "Connection issues, Low energy delivered, Short sessions"
+    assert local_verdict(session(30.0, 5.0), False) == {"needs_maintenance": False, "reason": "Operating normally", "estimated_life_months": None}
+
+
+def test_artifact_is_built_once_and_rebuilt_when_the_log_changes(tmp_path):
+    log_path = tmp_path / "log.csv"
+    labelled_log().to_csv(log_path, index=False)
+    built = load_maintenance_model(log_path, None, 0.9)
+    assert not built.from_artifact and built.sessions == 400
+    assert built.healthy_example["is_healthy"] == 1 and built.faulty_example["is_healthy"] == 0
+
+    loaded = load_maintenance_model(log_path, None, 0.9)
+    assert loaded.from_artifact
+    assert np.allclose(loaded.triage.weights, built.triage.weights)
+
+    labelled_log(600, seed=1).to_csv(log_path, index=False)
+    rebuilt = load_maintenance_model(log_path, None, 0.9)
+    assert not rebuilt.from_artifact and rebuilt.sessions == 600
+    assert json.loads(default_artifact_path(log_path).read_text())["sessions"] == 600
+
+
+def test_artifact_alone_is_enough(tmp_path):
+    log_path = tmp_path / "log.csv"
+    labelled_log().to_csv(log_path, index=False)
+    load_maintenance_model(log_path, None, 0.9)
+    log_path.unlink()
+    assert load_maintenance_model(log_path, None, 0.9).from_artifact
+    with pytest.raises(FileNotFoundError):
+        load_maintenance_model(tmp_path / "missing.csv", None, 0.9)
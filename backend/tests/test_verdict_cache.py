@@ -0,0 +1,57 @@
+from ev_finder_api.app.verdict_cache import VerdictCache, verdict_key
+
+HEALTHY = {"needs_maintenance": False, "reason": "Operating normally", "estimated_life_months": None}
+FAULTY = {"needs_maintenance": True, "reason": "Short sessions", "estimated_life_months": 6}
+
+
+def session(kwh, hours, short=False):
+    return {"El_kWh": kwh, "Duration_hours": hours, "is_frequent_connect_disconnect": False, "is_low_kwh": False, "is_short_duration": short}
+
+
+def make_cache(path=None, max_entries=10):
+    return VerdictCache(max_entries=max_entries, ttl_s=100.0, kwh_bin=0.5, hours_bin=0.25, path=path)
+
+
+def test_sessions_in_one_bucket_share_a_key():
+    assert verdict_key(session(7.1, 2.05), 0.5, 0.25) == verdict_key(session(7.4, 2.2), 0.5, 0.25) == "14:8:000"
+    assert verdict_key(session(7.6, 2.05), 0.5, 0.25) != "14:8:000"
+    assert verdict_key(session(7.1, 2.05, short=True), 0.5, 0.25) == "14:8:001"
+
+
+def test_verdicts_expire(clock):
+    cache = make_cache()
+    cache.put_many({"a": HEALTHY})
+    assert cache.get_many(["a", "b"]) == {"a": HEALTHY}
+    clock.now += 101
+    assert cache.get_many(["a"]) == {}
+    assert cache.stats()["expired"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_verdicts_are_evicted(clock):
+    cache = make_cache(max_entries=2)
+    cache.put_many({"a": HEALTHY, "b": FAULTY})
+    cache.get_many(["a"])
+    cache.put_many({"c": HEALTHY})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sqlite_tier_is_shared_between_workers(tmp_path, clock):
+    path = tmp_path / "verdicts.sqlite3"
+    make_cache(path).put_many({"a": HEALTHY, "b": FAULTY})
+    other = make_cache(path)
+    assert other.get_many(["a", "b", "c"]) == {"a": HEALTHY, "b": FAULTY}
+    assert other.stats()["disk_hits"] == 2
+    clock.now += 101
+    assert make_cache(path).get_many(["a"]) == {}
+
+
+def test_sqlite_tier_keeps_most_recently_used(tmp_path, clock):
+    path = tmp_path / "verdicts.sqlite3"
+    cache = make_cache(path, max_entries=2)
+    cache.put_many({"a": HEALTHY})
+    clock.now += 1
+    cache.put_many({"b": FAULTY})
+    clock.now += 1
+    cache.put_many({"c": HEALTHY})
+    assert set(make_cache(path).get_many(["a", "b", "c"])) == {"b", "c"}